@@ -10,13 +10,12 @@
 # os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mbp_project.settings') 
 # django.setup()
 
-from utils import gl_logger
+from utils import gl_logger, json_codec
 # from threading import Thread
 import threading
 import uuid
-from time import sleep, time
+from time import sleep
 # from json import loads, dumps, JSONDecodeError
-import json
 from queue import Queue, Empty
 import socket
 # import time
@@ -25,9 +24,9 @@ import socket
 import redis
 from django.conf import settings
 
-from django.db import models
-from terminal_management.models import TerminalReport   # 引入django生成的端站上报表
 from terminal_management import services
+from acu.report_mapping import map_report   # 上报消息到端站上报表的预编译转换表
+from acu.pending_requests import PendingRequestTable, DEFAULT_EXPIRY_INTERVAL
 
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -37,50 +36,6 @@ config = get_config()
 DEFAULT_IP = config.get('udp_server_config.udp_host', "127.0.0.1")      # UDP服务监听IP
 DEFAULT_PORT = config.get('udp_server_config.udp_port', 59999)          # UDP服务监听端口
 
-# 定义映射字典（消息字段：数据库字段）
-JSON_TO_MODEL_MAP = {
-    # 复合唯一约束字段 (Compound Unique Fields)
-    'type': 'type',
-    'sn': 'sn',
-    'date': 'report_date',
-    'time': 'report_time',
-
-    # 操作信息 (Operation Info)
-    'op': 'op',
-    'op_sub': 'op_sub',
-
-    # 端站状态信息 (Terminal Status)
-    'system_state': 'system_stat',
-    'wireless_network_state': 'wireless_network_stat',
-    'long': 'long',
-    'lat': 'lat',
-    'theory_yaw': 'theory_yaw',
-    'yaw': 'yaw',
-    'pitch': 'pitch',
-    'roll': 'roll',
-    'yao_limit_state': 'yao_limit_state',
-    'temp': 'temp',
-    'humi': 'humi',
-
-    # 基站相关信息 (Base Station Info)
-    'bts_name': 'bts_name',
-    'bts_long': 'bts_long',
-    'bts_lat': 'bts_lat',
-    'bts_no': 'bts_number',
-    'bts_group_no': 'bts_group_number',
-    'bts_r': 'bts_r',
-
-    # 通信质量信息 (Communication Quality)
-    'upstream_rate': 'upstream_rate',
-    'downstream_rate': 'downstream_rate',
-    'standard': 'standard',
-    'plmn': 'plmn',
-    'cellid': 'cellid',
-    'pci': 'pci',
-    'rsrp': 'rsrp',
-    'sinr': 'sinr',
-    'rssi': 'rssi',
-}
 
 class NM_Service():
     # 缓存区大小
@@ -102,9 +57,11 @@ class NM_Service():
         self.__redis_loop_active = False
         self.__redis_loop_thread = threading.Thread(target=self.__redis_loop, name="Redis_Listener_Thread")
         
-        # 用于存储请求和响应的队列
-        self.__pending_requests = {}
+        # 等待端站应答的控制请求，按截止时间排序，超时后由超时线程通知前端
+        self.__pending_requests = PendingRequestTable()
         self.__lock = threading.Lock()
+        self.__expiry_loop_active = False
+        self.__expiry_loop_thread = threading.Thread(target=self.__expiry_loop, name="Request_Expiry_Thread")
 
     #
     # 启动ACU服务
@@ -126,6 +83,10 @@ class NM_Service():
         self.__udp_loop_thread.start()
         gl_logger.debug("NM_Service UDP监听服务启动")
 
+        # 启动控制请求超时检查线程
+        self.__expiry_loop_active = True
+        self.__expiry_loop_thread.start()
+
         # --- 启动 Redis 监听 ---
         try:
             redis_settings = settings.CHANNEL_LAYERS['default']['CONFIG']['hosts'][0]
@@ -154,6 +115,11 @@ class NM_Service():
         # 关闭事件循环
         # self.__event_manage.stop()
 
+        # 关闭超时检查线程
+        self.__expiry_loop_active = False
+        if self.__expiry_loop_thread.is_alive():
+            self.__expiry_loop_thread.join(1.0)
+
         # --- 关闭 Redis ---
         self.__redis_loop_active = False
         if self.__redis_pubsub:
@@ -214,6 +180,23 @@ class NM_Service():
                     # 如果发生意外错误，暂停一下避免刷屏
                     sleep(5)
 
+    #
+    # 超时检查线程的核心循环，定期取出超时未应答的控制请求，并通知等待中的前端
+    # 输入：无
+    # 输出：无
+    #
+    def __expiry_loop(self):
+        while self.__expiry_loop_active:
+            try:
+                sleep(DEFAULT_EXPIRY_INTERVAL)
+                with self.__lock:
+                    expired = self.__pending_requests.pop_expired()
+                for request_id, request_info in expired:
+                    self.__handle_control_timeout(request_id, request_info)
+            except Exception as e:
+                if self.__expiry_loop_active:
+                    gl_logger.error(f"清理超时控制请求时出错: {e}")
+
     #
     # 判断收到的消息是上报还是响应，并分发给不同处理器
     # 输入：raw_data, addr（ip+port)
@@ -222,15 +205,11 @@ class NM_Service():
     def route_message(self, raw_data, addr):
         decoded_data = None
         try:
-            # 优先尝试UTF-8解码
-            decoded_data = json.loads(raw_data.decode('utf-8'))
-        except (UnicodeDecodeError, json.JSONDecodeError):
-            try:
-                # 解码失败则尝试GBK (主要针对上报数据)
-                decoded_data = json.loads(raw_data.decode('gbk'))
-            except Exception as e:
-                gl_logger.warning(f"解码失败，无法解析来自 {addr} 的消息: {e}")
-                return
+            # 优先尝试UTF-8解码，失败则尝试GBK (主要针对上报数据)
+            decoded_data = json_codec.decode_terminal_message(raw_data)
+        except Exception as e:
+            gl_logger.warning(f"解码失败，无法解析来自 {addr} 的消息: {e}")
+            return
 
         request_id = decoded_data.get('request_id')
         
@@ -238,13 +217,8 @@ class NM_Service():
         if request_id:
             # 仅在需要访问共享资源 __pending_requests 时才加锁
             with self.__lock:
-                # 再次检查，确保在等待锁的过程中，该请求没有被其他线程处理
-                if request_id in self.__pending_requests:
-                    # 从等待字典中弹出请求信息，这意味着这个响应只会被处理一次
-                    request_info = self.__pending_requests.pop(request_id, None)
-                    # 立即释放锁
-                else:
-                    request_info = None
+                # 弹出请求信息，这意味着这个响应只会被处理一次；未登记或已超时时为 None
+                request_info = self.__pending_requests.pop(request_id, None)
             
             # 在锁已经释放的情况下，安全地调用处理函数
             if request_info:
@@ -279,18 +253,8 @@ class NM_Service():
                     gl_logger.warning(f"已忽略 long={long}, lat={lat} 的消息（异常的地理坐标）。")
                     return
 
-                model_data = {}
-                _sentinel = object()
-
-                for msg_key, model_field in JSON_TO_MODEL_MAP.items():
-                    value = msg_dict.get(msg_key, _sentinel) # 采用get方法避免读None发生错误
-                    if value is not _sentinel:
-                        if value == 'N/A':  # 将N/A手动转换为None
-                            value = None
-                        if value is not None and isinstance(TerminalReport._meta.get_field(model_field), (models.CharField, models.TextField)):
-                            # 如果models中对应字段类型为CharField，将消息中的值转换为字符串
-                            value = str(value)
-                        model_data[model_field] = value
+                # 使用预编译的转换表，将消息字段转换为模型字段
+                model_data = map_report(msg_dict)
 
                 success, result = services.create_terminal_report(**model_data)
                 if not success:
@@ -339,14 +303,29 @@ class NM_Service():
             reply_channel_group,
             {
                 "type": "udp.reply",
-                "message": json.dumps(response_data)
+                "message": json_codec.dumps(response_data)
             }
         )
 
+    def __handle_control_timeout(self, request_id, request_info):
+        """向 reply_channel 组推送请求超时通知"""
+        reply_channel_group = request_info['reply_channel']
+        gl_logger.warning(f"控制请求 {request_id} 超时未收到端站应答，通知组: {reply_channel_group}")
+
+        channel_layer = get_channel_layer()
+        if channel_layer and reply_channel_group:
+            async_to_sync(channel_layer.group_send)(
+                reply_channel_group,
+                {
+                    "type": "udp.timeout",
+                    "request_id": request_id
+                }
+            )
+
     def __handle_redis_command(self, message):
         """处理从Redis收到的控制指令，发送UDP并等待响应"""
         try:
-            command_data = json.loads(message['data'])
+            command_data = json_codec.loads(message['data'])
             ip = command_data.get('ip')
             port = command_data.get('port')
             reply_channel = command_data.get('reply_channel')
@@ -359,16 +338,15 @@ class NM_Service():
 
             gl_logger.debug(f"收到Redis指令, 生成请求, ID: {request_id}, 发往 {ip}:{port}")
             
-            request_to_send = json.dumps(payload).encode('utf-8')
+            request_to_send = json_codec.encode_terminal_message(payload)
             
             # with self.__response_lock:
             #     self.__pending_requests[(ip, port)] = {'reply_channel': reply_channel}
 
-            with self.__lock:
-                self.__pending_requests[request_id] = {
-                    'reply_channel': reply_channel,
-                    'timestamp': time() # todo记录时间戳，可用于清理超时请求
-                }
+            # 登记待响应请求和超时时间，超时后由 __expiry_loop 通知前端
+            if command_data.get('expect_reply', True):
+                with self.__lock:
+                    self.__pending_requests.add(request_id, reply_channel, command_data.get('timeout'))
 
             self.__udp_socket.sendto(request_to_send, (ip, port))
 
@@ -4,11 +4,11 @@
 # 第一阶段：基础设施准备 - 保持UDP协议，使用异步架构
 
 import asyncio
-import json
 import logging
 import uuid
+import zlib
 from time import time
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
 # Django异步支持
 from channels.db import database_sync_to_async
@@ -19,58 +19,42 @@ import socket
 
 # Django相关
 from django.conf import settings
-from django.db import models
 
 # 项目内部
-from utils import gl_logger
-from terminal_management.models import TerminalReport
+from utils import gl_logger, json_codec
 from terminal_management import services
 from channels.layers import get_channel_layer
+from acu.report_mapping import map_report
+from acu.report_writer import ReportBatchWriter
+from acu.terminal_network_cache import TerminalNetworkCache
+from acu.ingest_pipeline import IngestPipeline, is_heartbeat
+from acu.pending_requests import PendingRequestTable, DEFAULT_EXPIRY_INTERVAL, DEFAULT_REQUEST_TIMEOUT
+from config import get_config
+
+config = get_config()
+DEFAULT_IP = config.get('udp_server_config.udp_host', "127.0.0.1")      # UDP服务监听IP
+DEFAULT_PORT = config.get('udp_server_config.udp_port', 59999)          # UDP服务监听端口
+
+# 多进程模式下，控制请求在 Redis 中的登记键前缀（任一工作进程收到应答都能找到 reply_channel）
+PENDING_REQUEST_KEY_PREFIX = "nm:pending:"
+
+
+def recv_datagram_batch(sock: socket.socket, max_batch: int, bufsize: int) -> List[Tuple[bytes, Any]]:
+    """
+    从非阻塞UDP socket中连续读取数据报，直到读空或达到 max_batch 条。
+    Python 没有 recvmmsg，这里用一次唤醒内多次 recvfrom 来摊薄事件循环的调度开销。
+    """
+    batch = []
+    recvfrom = sock.recvfrom
+    for _ in range(max_batch):
+        try:
+            data, addr = recvfrom(bufsize)
+        except (BlockingIOError, InterruptedError):
+            break
+        if data:
+            batch.append((data, addr))
+    return batch
 
-# 定义映射字典（消息字段：数据库字段）- 与原版本保持一致
-JSON_TO_MODEL_MAP = {
-    # 复合唯一约束字段 (Compound Unique Fields)
-    'type': 'type',
-    'sn': 'sn',
-    'date': 'report_date',
-    'time': 'report_time',
-
-    # 操作信息 (Operation Info)
-    'op': 'op',
-    'op_sub': 'op_sub',
-
-    # 端站状态信息 (Terminal Status)
-    'system_state': 'system_stat',
-    'wireless_network_state': 'wireless_network_stat',
-    'long': 'long',
-    'lat': 'lat',
-    'theory_yaw': 'theory_yaw',
-    'yaw': 'yaw',
-    'pitch': 'pitch',
-    'roll': 'roll',
-    'yao_limit_state': 'yao_limit_state',
-    'temp': 'temp',
-    'humi': 'humi',
-
-    # 基站相关信息 (Base Station Info)
-    'bts_name': 'bts_name',
-    'bts_long': 'bts_long',
-    'bts_lat': 'bts_lat',
-    'bts_no': 'bts_number',
-    'bts_group_no': 'bts_group_number',
-    'bts_r': 'bts_r',
-
-    # 通信质量信息 (Communication Quality)
-    'upstream_rate': 'upstream_rate',
-    'downstream_rate': 'downstream_rate',
-    'standard': 'standard',
-    'plmn': 'plmn',
-    'cellid': 'cellid',
-    'pci': 'pci',
-    'rsrp': 'rsrp',
-    'sinr': 'sinr',
-    'rssi': 'rssi',
-}
 
 class NM_ServiceAsync:
     """
@@ -80,15 +64,24 @@ class NM_ServiceAsync:
     
     # 缓存区大小
     MAX_BUFFER_LENGTH = 4096
+    # 每次socket可读时最多连续读取的数据报数量，避免单次唤醒长时间占用事件循环
+    MAX_RECV_BATCH = 256
 
-    def __init__(self):
+    def __init__(self, host=DEFAULT_IP, port=DEFAULT_PORT, reuse_port=False, worker_index=0, worker_count=1):
         self.udp_socket: Optional[socket.socket] = None
         # 绑定端口
-        self.udp_addr = ("127.0.0.1", 59999)
+        self.udp_addr = (host, port)
+
+        # 多进程模式：各工作进程以 SO_REUSEPORT 绑定同一端口，由内核分发数据报
+        self.reuse_port = reuse_port
+        self.worker_index = worker_index
+        self.worker_count = max(1, worker_count)
+        self.worker_name = f"UDP_Worker_{worker_index}" if self.worker_count > 1 else "UDP"
         
         # 异步任务管理
         self.udp_task: Optional[asyncio.Task] = None
         self.redis_task: Optional[asyncio.Task] = None
+        self.expiry_task: Optional[asyncio.Task] = None
         self.is_running = False
         
         # 异步Redis连接
@@ -96,12 +89,17 @@ class NM_ServiceAsync:
         self.redis_pubsub: Optional[aioredis.client.PubSub] = None
         
         # 异步锁和请求缓存
-        self.pending_requests: Dict[str, Dict[str, Any]] = {}
+        self.pending_requests = PendingRequestTable()     # 按截止时间排序，超时后主动通知前端
         self.lock = asyncio.Lock()
         
-        # 异步数据库操作
-        self.create_terminal_report_async = database_sync_to_async(services.create_terminal_report)
-        self.update_terminal_network_info_async = database_sync_to_async(services.update_terminal_network_info)
+        # 上报数据批量写入器
+        self.report_writer = ReportBatchWriter(name=f"{self.worker_name}_ReportWriter")
+
+        # 有界接收流水线：按SN分区，由固定数量的工作协程处理消息
+        self.ingest = IngestPipeline(self.dispatch_message, name=f"{self.worker_name}_Ingest")
+
+        # 端站网络信息缓存：心跳和上报只在地址变化时访问数据库，最后在线时间定期批量写入
+        self.network_cache = TerminalNetworkCache(name=f"{self.worker_name}_NetworkCache")
 
     async def start(self):
         """启动异步NM_Service服务"""
@@ -111,15 +109,25 @@ class NM_ServiceAsync:
             # 创建异步UDP socket
             self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.udp_socket.setblocking(False)
+            if self.reuse_port:
+                if not hasattr(socket, 'SO_REUSEPORT'):
+                    raise RuntimeError("当前平台不支持 SO_REUSEPORT，无法以多进程模式启动")
+                self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             self.udp_socket.bind(self.udp_addr)
-            gl_logger.info("NM_Service Async UDP监听服务启动")
+            gl_logger.info(f"NM_Service Async UDP监听服务启动 ({self.worker_name}, {self.udp_addr[0]}:{self.udp_addr[1]})")
 
             # 启动异步Redis连接
             await self._start_redis_connection()
 
+            # 预热端站网络信息缓存，启动上报数据批量写入器和接收流水线
+            await self.network_cache.start()
+            await self.report_writer.start()
+            await self.ingest.start()
+
             # 启动异步任务
             self.udp_task = asyncio.create_task(self._udp_loop(), name="UDP_Receiver_Task")
             self.redis_task = asyncio.create_task(self._redis_loop(), name="Redis_Listener_Task")
+            self.expiry_task = asyncio.create_task(self._expiry_loop(), name="Request_Expiry_Task")
             
             gl_logger.info("NM_Service Async 所有服务已启动")
             
@@ -147,7 +155,19 @@ class NM_ServiceAsync:
                     await self.redis_task
                 except asyncio.CancelledError:
                     pass
+
+            if self.expiry_task and not self.expiry_task.done():
+                self.expiry_task.cancel()
+                try:
+                    await self.expiry_task
+                except asyncio.CancelledError:
+                    pass
             
+            # 处理完已入队的消息，再写入缓冲区中剩余的上报数据
+            await self.ingest.stop()
+            await self.report_writer.stop()
+            await self.network_cache.stop()
+
             # 关闭UDP socket
             if self.udp_socket:
                 self.udp_socket.close()
@@ -170,7 +190,7 @@ class NM_ServiceAsync:
                 decode_responses=True
             )
             self.redis_pubsub = self.redis_conn.pubsub()
-            await self.redis_pubsub.subscribe(udp_command=self._handle_redis_command)
+            await self.redis_pubsub.subscribe('udp-command')
             gl_logger.info(f"NM_Service Async 已连接到 Redis 并监听 'udp-command' 频道")
         except Exception as e:
             gl_logger.error(f"NM_Service Async 连接 Redis 失败: {e}")
@@ -187,21 +207,37 @@ class NM_ServiceAsync:
             gl_logger.error(f"NM_Service Async 关闭Redis连接时出错: {e}")
 
     async def _udp_loop(self):
-        """异步UDP监听循环"""
-        while self.is_running:
-            try:
-                # 使用asyncio进行异步socket操作
-                data, addr = await asyncio.get_event_loop().sock_recvfrom(
-                    self.udp_socket, self.MAX_BUFFER_LENGTH
-                )
-                if data:
-                    asyncio.create_task(self.route_message(data, addr))
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                if self.is_running:
-                    gl_logger.error(f"异步UDP接收错误: {e}")
-                    await asyncio.sleep(0.01)
+        """异步UDP监听循环：每次可读时一次性取空socket，整批交给接收流水线"""
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        fd = self.udp_socket.fileno()
+        loop.add_reader(fd, readable.set)
+        try:
+            while self.is_running:
+                try:
+                    await readable.wait()
+                    readable.clear()
+                    batch = recv_datagram_batch(self.udp_socket, self.MAX_RECV_BATCH, self.MAX_BUFFER_LENGTH)
+                    if batch:
+                        await self._ingest_batch(batch)
+                except asyncio.CancelledError:
+                    break
+                except Exception as e:
+                    if self.is_running:
+                        gl_logger.error(f"异步UDP接收错误: {e}")
+                        await asyncio.sleep(0.01)
+        finally:
+            loop.remove_reader(fd)
+
+    async def _ingest_batch(self, batch):
+        """解码一批数据报，并整批放入有界队列（block 策略下队列满时会暂停接收）"""
+        items = []
+        for data, addr in batch:
+            msg_dict = self.decode_message(data, addr)
+            if msg_dict is not None:
+                items.append((msg_dict.get('sn') or addr, (msg_dict, addr), is_heartbeat(msg_dict)))
+        if items:
+            await self.ingest.put_batch(items)
 
     async def _redis_loop(self):
         """异步Redis监听循环"""
@@ -226,27 +262,37 @@ class NM_ServiceAsync:
         if message['type'] == 'message':
             await self._handle_redis_command(message)
 
+    def decode_message(self, raw_data, addr):
+        """解码UDP消息，失败时返回None"""
+        try:
+            # 优先尝试UTF-8解码，失败则尝试GBK
+            return json_codec.decode_terminal_message(raw_data)
+        except Exception as e:
+            gl_logger.warning(f"异步解码失败，无法解析来自 {addr} 的消息: {e}")
+            return None
+
     async def route_message(self, raw_data, addr):
         """异步消息路由分发"""
-        decoded_data = None
-        try:
-            # 优先尝试UTF-8解码
-            decoded_data = json.loads(raw_data.decode('utf-8'))
-        except (UnicodeDecodeError, json.JSONDecodeError):
-            try:
-                # 解码失败则尝试GBK
-                decoded_data = json.loads(raw_data.decode('gbk'))
-            except Exception as e:
-                gl_logger.warning(f"异步解码失败，无法解析来自 {addr} 的消息: {e}")
-                return
+        decoded_data = self.decode_message(raw_data, addr)
+        if decoded_data is not None:
+            await self.dispatch_message(decoded_data, addr)
 
+    async def dispatch_message(self, decoded_data, addr):
+        """判断已解码的消息是控制响应还是上报，并分发给不同处理器"""
         request_id = decoded_data.get('request_id')
         
         # 异步检查是否为控制响应
         if request_id:
             async with self.lock:
-                if request_id in self.pending_requests:
-                    request_info = self.pending_requests.pop(request_id, None)
+                request_info = self.pending_requests.pop(request_id, None)
+
+            if self.worker_count > 1:
+                # 多进程模式下应答可能被分发到其他工作进程，以 Redis 中的登记为准（只会被取走一次）
+                reply_channel = await self._take_shared_request(request_id)
+                if reply_channel and not request_info:
+                    request_info = {'reply_channel': reply_channel}
+                elif not reply_channel:
+                    request_info = None
             
             if request_info:
                 await self._handle_control_response(decoded_data, request_info)
@@ -275,40 +321,30 @@ class NM_ServiceAsync:
                     gl_logger.warning(f"异步已忽略 long={long}, lat={lat} 的消息（异常的地理坐标）。")
                     return
 
-                model_data = {}
-                _sentinel = object()
-
-                for msg_key, model_field in JSON_TO_MODEL_MAP.items():
-                    value = msg_dict.get(msg_key, _sentinel)
-                    if value is not _sentinel:
-                        if value == 'N/A':
-                            value = None
-                        if value is not None and isinstance(TerminalReport._meta.get_field(model_field), (models.CharField, models.TextField)):
-                            value = str(value)
-                        model_data[model_field] = value
-
-                # 异步数据库操作
-                success, result = await self.create_terminal_report_async(**model_data)
-                if not success:
-                    gl_logger.error(f"异步存储上报数据失败 (SN: {msg_dict.get('sn')}): {result}")
-                    return
-                
+                # 使用预编译的转换表，将消息字段转换为模型字段
+                model_data = map_report(msg_dict)
+
+                # 交给批量写入器，由其按批写入数据库
+                await self.report_writer.submit(model_data)
+
                 sn = msg_dict.get('sn')
                 if sn:
-                    update_success, update_result = await self.update_terminal_network_info_async(sn, peer_ip, peer_port)
+                    update_success, update_result = await self.network_cache.touch(sn, peer_ip, peer_port)
                     if not update_success:
                         gl_logger.warning(f"异步更新端站网络信息失败 (SN: {sn}): {update_result}")
-                    else:
+                    elif update_result:
                         gl_logger.info(f"异步成功更新 SN: {sn} 的网络信息为 {peer_ip}:{peer_port}。")
 
-                gl_logger.info(f"异步成功将来自SN: {msg_dict.get('sn')} 的上报存入数据库。")
+                gl_logger.info(f"异步已将来自SN: {msg_dict.get('sn')} 的上报提交至批量写入队列。")
                 
             elif (sn and not op and not op_sub):
-                update_success, update_result = await self.update_terminal_network_info_async(sn, peer_ip, peer_port)
+                update_success, update_result = await self.network_cache.touch(sn, peer_ip, peer_port)
                 if not update_success:
                     gl_logger.warning(f"异步更新端站网络信息失败 (SN: {sn}): {update_result}")
-                else:
+                elif update_result:
                     gl_logger.info(f"异步收到心跳包，成功更新 SN: {sn} 的网络信息为 {peer_ip}:{peer_port}。")
+                else:
+                    gl_logger.debug(f"异步收到心跳包 (SN: {sn})，网络信息未变化。")
             else:
                 gl_logger.warning(f"异步已忽略 op={op}, op_sub={op_sub} 的消息（非上报消息）。")
 
@@ -327,14 +363,47 @@ class NM_ServiceAsync:
                 reply_channel_group,
                 {
                     "type": "udp.reply",
-                    "message": json.dumps(response_data)
+                    "message": json_codec.dumps(response_data)
+                }
+            )
+
+    async def _expiry_loop(self):
+        """定期取出超时未应答的控制请求，并通知等待中的前端"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(DEFAULT_EXPIRY_INTERVAL)
+                async with self.lock:
+                    expired = self.pending_requests.pop_expired()
+                for request_id, request_info in expired:
+                    # 多进程模式下，登记已被其他工作进程取走说明应答已经转发，无需通知超时
+                    if self.worker_count > 1 and not await self._take_shared_request(request_id):
+                        continue
+                    await self._handle_control_timeout(request_id, request_info)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.is_running:
+                    gl_logger.error(f"异步清理超时控制请求时出错: {e}")
+
+    async def _handle_control_timeout(self, request_id: str, request_info: Dict[str, Any]):
+        """向 reply_channel 组推送请求超时通知"""
+        reply_channel_group = request_info['reply_channel']
+        gl_logger.warning(f"异步控制请求 {request_id} 超时未收到端站应答，通知组: {reply_channel_group}")
+
+        channel_layer = get_channel_layer()
+        if channel_layer and reply_channel_group:
+            await channel_layer.group_send(
+                reply_channel_group,
+                {
+                    "type": "udp.timeout",
+                    "request_id": request_id
                 }
             )
 
     async def _handle_redis_command(self, message):
         """异步处理Redis控制指令"""
         try:
-            command_data = json.loads(message['data'])
+            command_data = json_codec.loads(message['data'])
             ip = command_data.get('ip')
             port = command_data.get('port')
             reply_channel = command_data.get('reply_channel')
@@ -345,16 +414,21 @@ class NM_ServiceAsync:
                 gl_logger.error("异步收到的控制指令缺少 'request_id'，予以忽略。")
                 return
 
+            # 多进程模式下所有工作进程都订阅了同一频道，按 request_id 选出唯一一个进程负责下发
+            if not self._owns_request(request_id):
+                return
+
             gl_logger.info(f"异步收到Redis指令, 生成请求, ID: {request_id}, 发往 {ip}:{port}")
             
-            request_to_send = json.dumps(payload).encode('utf-8')
+            request_to_send = json_codec.encode_terminal_message(payload)
             
-            # 异步存储待处理请求
-            async with self.lock:
-                self.pending_requests[request_id] = {
-                    'reply_channel': reply_channel,
-                    'timestamp': time()
-                }
+            # 异步存储待处理请求，登记超时时间，超时后由 _expiry_loop 通知前端
+            if command_data.get('expect_reply', True):
+                timeout = command_data.get('timeout')
+                async with self.lock:
+                    self.pending_requests.add(request_id, reply_channel, timeout)
+                if self.worker_count > 1:
+                    await self._put_shared_request(request_id, reply_channel, timeout)
 
             # 异步发送UDP消息
             await asyncio.get_event_loop().sock_sendto(
@@ -364,6 +438,29 @@ class NM_ServiceAsync:
         except Exception as e:
             gl_logger.error(f"异步处理Redis命令时出错: {e}")
 
+    def _owns_request(self, request_id: str) -> bool:
+        """多进程模式下判断该控制指令是否由本进程下发（各进程对同一 request_id 的计算结果一致）"""
+        if self.worker_count <= 1:
+            return True
+        return zlib.crc32(request_id.encode('utf-8')) % self.worker_count == self.worker_index
+
+    async def _put_shared_request(self, request_id: str, reply_channel: str, timeout: Optional[float]):
+        """在 Redis 中登记控制请求，过期时间比本地超时稍长，供其他工作进程匹配应答"""
+        if timeout is None:
+            timeout = DEFAULT_REQUEST_TIMEOUT
+        await self.redis_conn.set(
+            PENDING_REQUEST_KEY_PREFIX + request_id, reply_channel, ex=max(1, int(timeout) + 5)
+        )
+
+    async def _take_shared_request(self, request_id: str) -> Optional[str]:
+        """原子地取出并删除 Redis 中的控制请求登记，返回 reply_channel；不存在时返回 None"""
+        key = PENDING_REQUEST_KEY_PREFIX + request_id
+        async with self.redis_conn.pipeline(transaction=True) as pipe:
+            pipe.get(key)
+            pipe.delete(key)
+            reply_channel, _ = await pipe.execute()
+        return reply_channel
+
     def set_udp_addr_port(self, ip: str, port: int):
         """设置UDP地址和端口（保持API兼容）"""
         self.udp_addr = (ip, port)
@@ -4,7 +4,6 @@
 # 第二阶段：协议切换（UDP → QUIC）- 保持异步架构，使用QUIC替代UDP
 
 import asyncio
-import json
 import logging
 import uuid
 import os
@@ -18,18 +17,24 @@ from channels.db import database_sync_to_async
 import redis.asyncio as aioredis
 from aioquic.asyncio import serve
 from aioquic.quic.configuration import QuicConfiguration
-from aioquic.quic.events import StreamDataReceived, ConnectionTerminated
+from aioquic.quic.events import StreamDataReceived, StreamReset, ConnectionTerminated, ProtocolNegotiated
+from aioquic.quic.packet import QuicErrorCode
 from aioquic.asyncio.protocol import QuicConnectionProtocol
 
 # Django相关
 from django.conf import settings
-from django.db import models
 
 # 项目内部
-from utils import gl_logger
-from terminal_management.models import TerminalReport
+from utils import gl_logger, json_codec
 from terminal_management import services
 from channels.layers import get_channel_layer
+from acu.report_mapping import map_report
+from acu.report_writer import ReportBatchWriter
+from acu.ingest_pipeline import IngestPipeline, is_heartbeat
+from acu.pending_requests import PendingRequestTable, DEFAULT_EXPIRY_INTERVAL
+from acu.stream_framing import StreamFrameDecoder, FrameTooLarge, FRAMING_LENGTH_PREFIX, encode_frame
+from acu import compact_codec
+from acu.compact_codec import DEFAULT_BINARY_ALPN_PROTOCOL
 from config import get_config
 
 config = get_config()
@@ -42,51 +47,6 @@ DEFAULT_PORT = config.get('quic_server_config.quic_port', 39999)
 DEFAULT_ALPN_PROTOCOL = config.get('quic_server_config.quic_alpn_protocol', "comdi-nm-protocol")  # QUIC ALPN协议
 DEFAULT_IDLE_TIMEOUT = config.get('quic_server_config.quic_idle_timeout', 180.0)    # QUIC连接空闲超时时间（秒）
 
-# 定义映射字典（消息字段：数据库字段）
-JSON_TO_MODEL_MAP = {
-    # 复合唯一约束字段 (Compound Unique Fields)
-    'type': 'type',
-    'sn': 'sn',
-    'date': 'report_date',
-    'time': 'report_time',
-
-    # 操作信息 (Operation Info)
-    'op': 'op',
-    'op_sub': 'op_sub',
-
-    # 端站状态信息 (Terminal Status)
-    'system_state': 'system_stat',
-    'wireless_network_state': 'wireless_network_stat',
-    'long': 'long',
-    'lat': 'lat',
-    'theory_yaw': 'theory_yaw',
-    'yaw': 'yaw',
-    'pitch': 'pitch',
-    'roll': 'roll',
-    'yao_limit_state': 'yao_limit_state',
-    'temp': 'temp',
-    'humi': 'humi',
-
-    # 基站相关信息 (Base Station Info)
-    'bts_name': 'bts_name',
-    'bts_long': 'bts_long',
-    'bts_lat': 'bts_lat',
-    'bts_no': 'bts_number',
-    'bts_group_no': 'bts_group_number',
-    'bts_r': 'bts_r',
-
-    # 通信质量信息 (Communication Quality)
-    'upstream_rate': 'upstream_rate',
-    'downstream_rate': 'downstream_rate',
-    'standard': 'standard',
-    'plmn': 'plmn',
-    'cellid': 'cellid',
-    'pci': 'pci',
-    'rsrp': 'rsrp',
-    'sinr': 'sinr',
-    'rssi': 'rssi',
-}
-
 
 class NM_QUICProtocol(QuicConnectionProtocol):
     """QUIC协议处理类"""
@@ -95,7 +55,8 @@ class NM_QUICProtocol(QuicConnectionProtocol):
         self.service_instance = kwargs.pop('service_instance')
         super().__init__(*args, **kwargs)
         self.client_id = self._quic.host_cid.hex()[:8]
-        self._stream_buffers = {}   # 缓存每个流的分片数据：{stream_id: 累积的字节数据}
+        self._stream_decoders: Dict[int, StreamFrameDecoder] = {}   # 每个流的增量分帧解析器：{stream_id: StreamFrameDecoder}
+        self.binary = False     # 是否协商了紧凑二进制编码（ALPN握手完成后确定）
         
         if self.service_instance:
             self.service_instance.register_connection(self.client_id, self)
@@ -103,43 +64,83 @@ class NM_QUICProtocol(QuicConnectionProtocol):
 
     def quic_event_received(self, event):
         """处理QUIC事件"""
-        if isinstance(event, StreamDataReceived):
+        if isinstance(event, ProtocolNegotiated):
+            # 按协商结果选择该连接的编解码方式
+            self.binary = event.alpn_protocol == DEFAULT_BINARY_ALPN_PROTOCOL
+            gl_logger.debug(f"QUIC客户端 {self.client_id} 协商的ALPN: {event.alpn_protocol}")
+
+        elif isinstance(event, StreamDataReceived):
             stream_id = event.stream_id
-            # 累加当前流的分片数据
-            if stream_id not in self._stream_buffers:
-                self._stream_buffers[stream_id] = b""
-            self._stream_buffers[stream_id] += event.data
+            decoder = self._stream_decoders.get(stream_id)
+            if decoder is None:
+                # 二进制编码的流固定使用长度前缀分帧，JSON流自动识别
+                decoder = self._stream_decoders[stream_id] = StreamFrameDecoder(
+                    framing=FRAMING_LENGTH_PREFIX if self.binary else None
+                )
+
+            # 增量分帧：长期不关闭的流上每收到一条完整消息就处理一条，一条流一条消息的旧模式在流结束时处理
+            try:
+                frames = decoder.feed(event.data, event.end_stream)
+            except FrameTooLarge as e:
+                gl_logger.error(f"客户端 {self.client_id} 流 {stream_id} 的消息超过大小上限，停止接收该流: {e}")
+                self._stream_decoders.pop(stream_id, None)
+                self._stop_stream(stream_id)
+                return
+            except ValueError as e:
+                gl_logger.error(f"客户端 {self.client_id} 流 {stream_id} 分帧错误: {e}")
+                frames = []
 
-            # 只有当流结束（end_stream=True）时，才解析完整消息
             if event.end_stream:
-                try:
-                    msg_str = self._stream_buffers[stream_id].decode('utf-8')
-                    msg = json.loads(msg_str)
-                    gl_logger.debug(f"QUIC收到客户端 {self.client_id} 消息: {msg}")
-
-                    # 使用NM_Service的消息路由逻辑
-                    if self.service_instance:
-                        asyncio.create_task(
-                            self.service_instance.route_message_quic(msg, self.client_id)
-                        )
-
-                except json.JSONDecodeError:
-                    gl_logger.error(f"客户端 {self.client_id} 发送非JSON数据")
-                except Exception as e:
-                    gl_logger.error(f"处理客户端 {self.client_id} 消息异常: {e}")
-                finally:
-                    # 处理完消息后，清空该流的缓存
-                    del self._stream_buffers[stream_id]
+                # 流已结束，释放该流的解析器
+                self._stream_decoders.pop(stream_id, None)
+
+            for frame in frames:
+                self._handle_frame(frame)
+
+        elif isinstance(event, StreamReset):
+            self._stream_decoders.pop(event.stream_id, None)
 
         elif isinstance(event, ConnectionTerminated):
+            self._stream_decoders.clear()
             if self.service_instance:
                 self.service_instance.unregister_connection(self.client_id)
             gl_logger.info(f"客户端 {self.client_id} 断开连接: {event.reason_phrase}")
 
+    def _handle_frame(self, frame: bytes):
+        """解析一条完整的消息并放入接收队列"""
+        try:
+            if self.binary:
+                msg = compact_codec.decode(frame)
+            else:
+                msg = json_codec.decode_terminal_message(frame)
+            gl_logger.debug(f"QUIC收到客户端 {self.client_id} 消息: {msg}")
+
+            # 放入NM_Service的有界接收队列，由其工作协程调用消息路由逻辑
+            if self.service_instance:
+                self.service_instance.ingest.put_nowait(
+                    msg.get('sn') or self.client_id, (msg, self.client_id), heartbeat=is_heartbeat(msg)
+                )
+
+        except ValueError:
+            gl_logger.error(f"客户端 {self.client_id} 发送的数据无法解析 (binary={self.binary})")
+        except Exception as e:
+            gl_logger.error(f"处理客户端 {self.client_id} 消息异常: {e}")
+
+    def _stop_stream(self, stream_id: int):
+        """通知客户端停止在该流上发送数据（STOP_SENDING）"""
+        try:
+            self._quic.stop_stream(stream_id, QuicErrorCode.APPLICATION_ERROR)
+            self.transmit()
+        except Exception as e:
+            gl_logger.debug(f"QUIC停止客户端 {self.client_id} 流 {stream_id} 失败: {e}")
+
     def send_message(self, msg_dict):
         """通过QUIC向该客户端发送消息"""
         try:
-            data = json.dumps(msg_dict).encode('utf-8')
+            if self.binary:
+                data = encode_frame(compact_codec.encode(msg_dict), FRAMING_LENGTH_PREFIX)
+            else:
+                data = json_codec.encode_terminal_message(msg_dict)
             stream_id = self._quic.get_next_available_stream_id()
             self._quic.send_stream_data(stream_id, data, end_stream=True)
             self.transmit()
@@ -166,6 +167,7 @@ class NM_ServiceQUIC:
         # 异步任务管理
         self.quic_server_task: Optional[asyncio.Task] = None
         self.redis_task: Optional[asyncio.Task] = None
+        self.expiry_task: Optional[asyncio.Task] = None
         self.is_running = False
         
         # QUIC连接管理
@@ -178,11 +180,16 @@ class NM_ServiceQUIC:
         self.redis_pubsub: Optional[aioredis.client.PubSub] = None
         
         # 异步锁和请求缓存
-        self.pending_requests: Dict[str, Dict[str, Any]] = {}
+        self.pending_requests = PendingRequestTable()     # 按截止时间排序，超时后主动通知前端
         self.lock = asyncio.Lock()
         
+        # 上报数据批量写入器
+        self.report_writer = ReportBatchWriter(name="QUIC_ReportWriter")
+
+        # 有界接收流水线：按SN分区，由固定数量的工作协程处理消息
+        self.ingest = IngestPipeline(self.route_message_quic, name="QUIC_Ingest")
+
         # 异步数据库操作
-        self.create_terminal_report_async = database_sync_to_async(services.create_terminal_report)
         # self.update_terminal_network_info_async = database_sync_to_async(services.update_terminal_network_info)
         
         # QUIC配置
@@ -195,6 +202,12 @@ class NM_ServiceQUIC:
             alpn_protocols=[DEFAULT_ALPN_PROTOCOL],
             idle_timeout=DEFAULT_IDLE_TIMEOUT,
         )
+
+        # 安装了 msgpack 时额外声明紧凑二进制编码的ALPN，由客户端选择
+        if compact_codec.is_available():
+            configuration.alpn_protocols.append(DEFAULT_BINARY_ALPN_PROTOCOL)
+        else:
+            gl_logger.warning(f"未安装 msgpack，QUIC不支持二进制编码协议 {DEFAULT_BINARY_ALPN_PROTOCOL}")
         
         # 检查证书文件
         if self.cert_file and self.key_file and os.path.exists(self.cert_file) and os.path.exists(self.key_file):
@@ -237,11 +250,16 @@ class NM_ServiceQUIC:
             # 启动异步Redis连接
             await self._start_redis_connection()
 
+            # 启动上报数据批量写入器和接收流水线
+            await self.report_writer.start()
+            await self.ingest.start()
+
             # 启动QUIC服务器
             await self._start_quic_server()
 
             # 启动Redis监听任务
             self.redis_task = asyncio.create_task(self._redis_loop(), name="Redis_Listener_Task")
+            self.expiry_task = asyncio.create_task(self._expiry_loop(), name="Request_Expiry_Task")
             
             gl_logger.info("NM_Service QUIC 所有服务已启动")
             
@@ -270,9 +288,20 @@ class NM_ServiceQUIC:
                     await self.redis_task
                 except asyncio.CancelledError:
                     pass
+
+            if self.expiry_task and not self.expiry_task.done():
+                self.expiry_task.cancel()
+                try:
+                    await self.expiry_task
+                except asyncio.CancelledError:
+                    pass
             
             # 关闭Redis连接
             await self._close_redis_connection()
+
+            # 处理完已入队的消息，再写入缓冲区中剩余的上报数据
+            await self.ingest.stop()
+            await self.report_writer.stop()
             
             # 关闭所有QUIC连接
             self.connections.clear()
@@ -361,8 +390,7 @@ class NM_ServiceQUIC:
         # 异步检查是否为控制响应
         if request_id:
             async with self.lock:
-                if request_id in self.pending_requests:
-                    request_info = self.pending_requests.pop(request_id, None)
+                request_info = self.pending_requests.pop(request_id, None)
             
             if request_info:
                 await self._handle_control_response(msg_dict, request_info)
@@ -389,31 +417,19 @@ class NM_ServiceQUIC:
                     gl_logger.warning(f"QUIC已忽略 long={long}, lat={lat} 的消息（异常的地理坐标）。")
                     return
 
-                model_data = {}
-                _sentinel = object()
-
-                for msg_key, model_field in JSON_TO_MODEL_MAP.items():
-                    value = msg_dict.get(msg_key, _sentinel)
-                    if value is not _sentinel:
-                        if value == 'N/A':
-                            value = None
-                        if value is not None and isinstance(TerminalReport._meta.get_field(model_field), (models.CharField, models.TextField)):
-                            value = str(value)
-                        model_data[model_field] = value
-
-                # 异步数据库操作
-                success, result = await self.create_terminal_report_async(**model_data)
-                if not success:
-                    gl_logger.error(f"QUIC存储上报数据失败 (SN: {msg_dict.get('sn')}): {result}")
-                    return
-                
+                # 使用预编译的转换表，将消息字段转换为模型字段
+                model_data = map_report(msg_dict)
+
+                # 交给批量写入器，由其按批写入数据库
+                await self.report_writer.submit(model_data)
+
                 sn = msg_dict.get('sn')
                 if sn:
                     # 注册SN到client_id的映射关系
                     self.register_sn_mapping(sn, client_id)
                     gl_logger.debug(f"QUIC成功处理SN: {sn} 的上报数据")
 
-                gl_logger.debug(f"QUIC成功将来自SN: {msg_dict.get('sn')} 的上报存入数据库。")
+                gl_logger.debug(f"QUIC已将来自SN: {msg_dict.get('sn')} 的上报提交至批量写入队列。")
                 
             elif (sn and op == 'heartbeat'):
                 # QUIC心跳包处理 - 仅维护SN映射，不更新数据库
@@ -441,14 +457,44 @@ class NM_ServiceQUIC:
                 reply_channel_group,
                 {
                     "type": "udp.reply",
-                    "message": json.dumps(response_data)
+                    "message": json_codec.dumps(response_data)
+                }
+            )
+
+    async def _expiry_loop(self):
+        """定期取出超时未应答的控制请求，并通知等待中的前端"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(DEFAULT_EXPIRY_INTERVAL)
+                async with self.lock:
+                    expired = self.pending_requests.pop_expired()
+                for request_id, request_info in expired:
+                    await self._handle_control_timeout(request_id, request_info)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                if self.is_running:
+                    gl_logger.error(f"QUIC清理超时控制请求时出错: {e}")
+
+    async def _handle_control_timeout(self, request_id: str, request_info: Dict[str, Any]):
+        """向 reply_channel 组推送请求超时通知"""
+        reply_channel_group = request_info['reply_channel']
+        gl_logger.warning(f"QUIC控制请求 {request_id} 超时未收到端站应答，通知组: {reply_channel_group}")
+
+        channel_layer = get_channel_layer()
+        if channel_layer and reply_channel_group:
+            await channel_layer.group_send(
+                reply_channel_group,
+                {
+                    "type": "udp.timeout",
+                    "request_id": request_id
                 }
             )
 
     async def _handle_redis_command(self, message):
         """异步处理Redis控制指令（QUIC版本）- 支持基于SN的client_id映射"""
         try:
-            command_data = json.loads(message['data'])
+            command_data = json_codec.loads(message['data'])
             reply_channel = command_data.get('reply_channel')
             payload = command_data.get('payload')
 
@@ -465,25 +511,23 @@ class NM_ServiceQUIC:
 
             # 通过SN获取对应的client_id
             client_id = self.sn_to_client_id.get(sn)
-            if not client_id:
-                gl_logger.warning(f"QUIC未找到SN {sn} 对应的client_id映射，可能客户端尚未建立连接或上报数据")
+            if not client_id or client_id not in self.connections:
+                gl_logger.warning(f"QUIC未找到SN {sn} 对应的客户端连接，可能客户端尚未建立连接或上报数据")
+                # 端站不可达，无需等待超时，直接通知前端
+                if command_data.get('expect_reply', True):
+                    await self._handle_control_timeout(request_id, {'reply_channel': reply_channel})
                 return
 
             gl_logger.debug(f"QUIC收到Redis指令, SN: {sn}, client_id: {client_id}, 请求ID: {request_id}")
             
-            # 异步存储待处理请求
-            async with self.lock:
-                self.pending_requests[request_id] = {
-                    'reply_channel': reply_channel,
-                    'timestamp': time()
-                }
+            # 异步存储待处理请求，登记超时时间，超时后由 _expiry_loop 通知前端
+            if command_data.get('expect_reply', True):
+                async with self.lock:
+                    self.pending_requests.add(request_id, reply_channel, command_data.get('timeout'))
 
             # 通过QUIC发送消息到指定客户端
-            if client_id in self.connections:
-                self.connections[client_id].send_message(payload)
-                gl_logger.debug(f"QUIC成功转发指令到客户端 {client_id}")
-            else:
-                gl_logger.warning(f"QUIC在处理redis指令时，未找到客户端 {client_id} 的连接")
+            self.connections[client_id].send_message(payload)
+            gl_logger.debug(f"QUIC成功转发指令到客户端 {client_id}")
 
         except Exception as e:
             gl_logger.error(f"QUIC处理Redis命令时出错: {e}")
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+# QUIC紧凑二进制编码
+# 通过第二个 ALPN 协商：客户端声明 quic_alpn_binary_protocol 时，该连接上的上报、心跳、指令与应答
+# 改用 MessagePack 编码，协议字段名替换为下表中的整数键；表中没有的字段仍以字符串键原样传输。
+# 消息内容与JSON协议完全相同，解码后得到的字典可直接交给原有的路由逻辑处理。
+# 二进制数据中可能出现换行符，因此该ALPN下的流固定使用4字节长度前缀分帧（见 acu.stream_framing）。
+
+from typing import Any, Dict
+
+from config import get_config
+
+try:
+    import msgpack
+except ImportError:     # 可选依赖，未安装时服务端不声明二进制ALPN
+    msgpack = None
+
+config = get_config()
+
+DEFAULT_BINARY_ALPN_PROTOCOL = config.get('quic_server_config.quic_alpn_binary_protocol', "comdi-nm-protocol-msgpack")
+
+# 字段名 → 整数键
+# 注意：该表是线上协议的一部分，使用二进制ALPN的端站固件须内置同一张表。只能在末尾追加新字段，不能修改或删除已有编号。
+FIELD_KEYS: Dict[str, int] = {
+    # 通用字段
+    'type': 0,
+    'sn': 1,
+    'op': 2,
+    'op_sub': 3,
+    'request_id': 4,
+    'date': 5,
+    'time': 6,
+
+    # 端站上报信息
+    'system_stat': 7,
+    'wireless_network_stat': 8,
+    'long': 9,
+    'lat': 10,
+    'theory_yaw': 11,
+    'yaw': 12,
+    'pitch': 13,
+    'roll': 14,
+    'yao_limit_state': 15,
+    'temp': 16,
+    'humi': 17,
+    'bts_name': 18,
+    'bts_long': 19,
+    'bts_lat': 20,
+    'bts_no': 21,
+    'bts_group_no': 22,
+    'bts_r': 23,
+    'upstream_rate': 24,
+    'downstream_rate': 25,
+    'standard': 26,
+    'plmn': 27,
+    'cellid': 28,
+    'pci': 29,
+    'rsrp': 30,
+    'sinr': 31,
+    'rssi': 32,
+
+    # 控制指令与应答
+    'pattern': 33,
+    'result': 34,
+    'error': 35,
+    'IMU_stat': 36,
+    'DGPS_stat': 37,
+    'storage_stat': 38,
+    'yaw_moto_stat': 39,
+    'pitch_moto_stat': 40,
+    'yaw_lim_stat': 41,
+    'pitch_lim_stat': 42,
+    'rtc_stat': 43,
+    'mode': 44,
+    'axis': 45,
+    'direct': 46,
+    'angle': 47,
+    'rst_type': 48,
+    'RTC': 49,
+    'interval': 50,
+    'model': 51,
+    'hw_version': 52,
+    'ADU_version': 53,
+    'ACU_version': 54,
+    'stru_version': 55,
+
+    # 文件上传与升级
+    'files': 56,
+    'fileId': 57,
+    'fileName': 58,
+    'fileType': 59,
+    'pathName': 60,
+    'totalSize': 61,
+    'totalChunks': 62,
+    'chunkIndex': 63,
+    'chunkData': 64,
+    'success': 65,
+    'status': 66,
+    'message': 67,
+    'station_list': 68,
+}
+
+# 整数键 → 字段名
+FIELD_NAMES: Dict[int, str] = {key: name for name, key in FIELD_KEYS.items()}
+
+
+def is_available() -> bool:
+    """是否安装了 msgpack"""
+    return msgpack is not None
+
+
+def _compact_keys(obj: Any) -> Any:
+    """递归地把字典中的已知字段名替换为整数键"""
+    if isinstance(obj, dict):
+        get_key = FIELD_KEYS.get
+        return {get_key(name, name): _compact_keys(value) for name, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_compact_keys(value) for value in obj]
+    return obj
+
+
+def _expand_pairs(pairs) -> Dict[Any, Any]:
+    """解码时对每个map调用（msgpack 的 object_pairs_hook），把整数键还原为字段名"""
+    get_name = FIELD_NAMES.get
+    return {get_name(key, key): value for key, value in pairs}
+
+
+def encode(msg: Dict[str, Any]) -> bytes:
+    """把一条消息编码为 MessagePack（整数键）"""
+    return msgpack.packb(_compact_keys(msg), use_bin_type=True)
+
+
+def decode(data: bytes) -> Dict[str, Any]:
+    """把 MessagePack（整数键）解码为与JSON协议相同的字典，格式非法时抛出 ValueError"""
+    try:
+        obj = msgpack.unpackb(data, raw=False, strict_map_key=False, object_pairs_hook=_expand_pairs)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"非法的MessagePack数据: {e}") from e
+    if not isinstance(obj, dict):
+        raise ValueError(f"MessagePack消息应为map，实际为 {type(obj).__name__}")
+    return obj
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# 有界的上报接收流水线
+# 接收循环把解码后的消息放入按SN分区的有界队列，由固定数量的工作协程顺序处理，
+# 同一SN的消息总是落在同一分区，保证单个端站的消息按到达顺序处理。
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# 项目内部
+from utils import gl_logger
+from config import get_config
+
+config = get_config()
+
+# 溢出策略
+OVERFLOW_BLOCK = 'block'                    # 队列满时阻塞生产者（接收循环暂停读socket，由内核缓冲区承压）
+OVERFLOW_DROP_OLDEST = 'drop_oldest'        # 队列满时丢弃该分区最旧的消息
+OVERFLOW_SHED_HEARTBEAT = 'shed_heartbeat'  # 队列满时优先丢弃该分区最旧的心跳包，没有心跳包时丢弃最旧的消息
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SHED_HEARTBEAT)
+
+# 流水线配置
+DEFAULT_WORKERS = config.get('ingest_config.ingest_workers', 8)                               # 工作协程（分区）数量
+DEFAULT_QUEUE_SIZE = config.get('ingest_config.ingest_queue_size', 10000)                     # 所有分区合计的队列容量
+DEFAULT_OVERFLOW_POLICY = config.get('ingest_config.ingest_overflow_policy', OVERFLOW_SHED_HEARTBEAT)
+
+# 每丢弃多少条消息打印一次警告，避免高峰期刷屏
+DROP_LOG_EVERY = 1000
+
+
+def is_heartbeat(msg_dict: Dict[str, Any]) -> bool:
+    """判断消息是否为心跳包（新版 op='heartbeat'，旧版只有 sn 没有 op/op_sub）"""
+    op = msg_dict.get('op')
+    return op == 'heartbeat' or (not op and not msg_dict.get('op_sub') and bool(msg_dict.get('sn')))
+
+
+class _Partition:
+    """
+    单个分区：一个有界双端队列 + 一个工作协程
+    队列中的每一项为 [处理函数参数, 是否心跳]。heartbeats 按顺序记录仍在队列中的心跳项，
+    shed_heartbeat 策略丢弃最旧的心跳时只把该项的参数置为 None（墓碑），不在队列中间删除，
+    工作协程和 popleft() 取出时跳过墓碑；墓碑多于分区容量时整体压缩一次，均摊仍为 O(1)。
+    """
+
+    __slots__ = ('items', 'heartbeats', 'size', 'tombstones', 'not_empty', 'not_full', 'worker')
+
+    def __init__(self):
+        self.items: Deque[list] = deque()
+        self.heartbeats: Deque[list] = deque()
+        self.size = 0           # 不含墓碑的消息数
+        self.tombstones = 0
+        self.not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.not_full.set()
+        self.worker: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return self.size
+
+    def append(self, args: Tuple[Any, ...], heartbeat: bool):
+        entry = [args, heartbeat]
+        self.items.append(entry)
+        if heartbeat:
+            self.heartbeats.append(entry)
+        self.size += 1
+
+    def popleft(self) -> Tuple[Any, ...]:
+        """取出最旧的消息参数（队列不能为空）"""
+        while True:
+            args, heartbeat = self.items.popleft()
+            if args is None:
+                self.tombstones -= 1
+                continue
+            if heartbeat:
+                # 心跳项按到达顺序出队，最旧的心跳总是 heartbeats 的第一项
+                self.heartbeats.popleft()
+            self.size -= 1
+            return args
+
+    def shed_heartbeat(self, capacity: int) -> bool:
+        """丢弃最旧的心跳，没有心跳时返回 False"""
+        if not self.heartbeats:
+            return False
+        self.heartbeats.popleft()[0] = None
+        self.size -= 1
+        self.tombstones += 1
+        if self.tombstones > capacity:
+            self.items = deque(entry for entry in self.items if entry[0] is not None)
+            self.tombstones = 0
+        return True
+
+
+class IngestPipeline:
+    """
+    按SN分区的有界接收队列
+    - put()：队列满时按溢出策略处理，block 策略下会等待空位
+    - put_nowait()：供同步回调（如QUIC事件回调）使用，block 策略下队列满时直接拒绝新消息
+    - get_stats()：队列深度与各类丢弃计数
+    """
+
+    def __init__(self,
+                 handler: Callable[..., Awaitable[Any]],
+                 workers=DEFAULT_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE,
+                 overflow_policy=DEFAULT_OVERFLOW_POLICY,
+                 name="Ingest"):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow_policy}，可选: {', '.join(OVERFLOW_POLICIES)}")
+
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.partition_capacity = max(1, int(queue_size) // self.workers)
+        self.overflow_policy = overflow_policy
+        self.name = name
+
+        self._partitions: List[_Partition] = [_Partition() for _ in range(self.workers)]
+        self._in_flight = 0     # 正在处理中的消息数
+        self.is_running = False
+
+        # 统计信息
+        self.stats = {
+            'enqueued': 0,          # 入队总数
+            'processed': 0,         # 处理完成总数
+            'errors': 0,            # 处理时抛出异常的数量
+            'dropped_oldest': 0,    # 因队列满被挤掉的旧消息
+            'shed_heartbeats': 0,   # 因队列满被丢弃的心跳包
+            'rejected': 0,          # block 策略下非阻塞入队被拒绝的新消息
+        }
+
+    async def start(self):
+        """为每个分区启动一个工作协程"""
+        self.is_running = True
+        for index, partition in enumerate(self._partitions):
+            partition.worker = asyncio.create_task(self._worker(partition), name=f"{self.name}_Worker_{index}")
+        gl_logger.info(f"{self.name} 接收流水线已启动 (workers={self.workers}, "
+                       f"每分区容量={self.partition_capacity}, 溢出策略={self.overflow_policy})")
+
+    async def stop(self, drain_timeout=5.0):
+        """停止接收流水线，在超时时间内尽量处理完已入队的消息"""
+        self.is_running = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+        while (self.depth or self._in_flight) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+        for partition in self._partitions:
+            if partition.worker and not partition.worker.done():
+                partition.worker.cancel()
+                try:
+                    await partition.worker
+                except asyncio.CancelledError:
+                    pass
+        if self.depth:
+            gl_logger.warning(f"{self.name} 接收流水线停止时仍有 {self.depth} 条消息未处理，已丢弃")
+        gl_logger.info(f"{self.name} 接收流水线已停止，统计: {self.stats}")
+
+    @property
+    def depth(self) -> int:
+        """当前所有分区中排队的消息总数"""
+        return sum(len(partition) for partition in self._partitions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回队列深度和计数器的快照"""
+        stats = dict(self.stats)
+        stats['depth'] = self.depth
+        stats['partition_depths'] = [len(partition) for partition in self._partitions]
+        return stats
+
+    def _partition_for(self, key: Hashable) -> _Partition:
+        return self._partitions[hash(key) % self.workers]
+
+    async def put(self, key: Hashable, args: Tuple[Any, ...], heartbeat=False):
+        """按 key（通常是SN）入队，args 为调用处理函数时的位置参数"""
+        partition = self._partition_for(key)
+        while len(partition) >= self.partition_capacity:
+            if self.overflow_policy == OVERFLOW_BLOCK:
+                partition.not_full.clear()
+                await partition.not_full.wait()
+            else:
+                self._evict(partition)
+        self._append(partition, args, heartbeat)
+
+    async def put_batch(self, items: Iterable[Tuple[Hashable, Tuple[Any, ...], bool]]):
+        """整批入队，items 为 (key, args, heartbeat) 序列；只有 block 策略下队列满时才会让出事件循环"""
+        for key, args, heartbeat in items:
+            partition = self._partition_for(key)
+            if len(partition) < self.partition_capacity:
+                self._append(partition, args, heartbeat)
+            else:
+                await self.put(key, args, heartbeat)
+
+    def put_nowait(self, key: Hashable, args: Tuple[Any, ...], heartbeat=False) -> bool:
+        """非阻塞入队，返回是否入队成功"""
+        partition = self._partition_for(key)
+        if len(partition) >= self.partition_capacity:
+            if self.overflow_policy == OVERFLOW_BLOCK:
+                self._count_drop('rejected')
+                return False
+            self._evict(partition)
+        self._append(partition, args, heartbeat)
+        return True
+
+    def _append(self, partition: _Partition, args: Tuple[Any, ...], heartbeat: bool):
+        partition.append(args, heartbeat)
+        partition.not_empty.set()
+        self.stats['enqueued'] += 1
+
+    def _evict(self, partition: _Partition):
+        """按溢出策略为新消息腾出一个位置"""
+        if self.overflow_policy == OVERFLOW_SHED_HEARTBEAT and partition.shed_heartbeat(self.partition_capacity):
+            self._count_drop('shed_heartbeats')
+            return
+        partition.popleft()
+        self._count_drop('dropped_oldest')
+
+    def _count_drop(self, counter: str):
+        self.stats[counter] += 1
+        if self.stats[counter] % DROP_LOG_EVERY == 1:
+            gl_logger.warning(f"{self.name} 接收队列已满 (策略={self.overflow_policy})，"
+                              f"{counter} 累计 {self.stats[counter]} 条，当前深度 {self.depth}")
+
+    async def _worker(self, partition: _Partition):
+        """顺序处理单个分区中的消息"""
+        while True:
+            while not partition.size:
+                partition.not_empty.clear()
+                await partition.not_empty.wait()
+
+            args = partition.popleft()
+            partition.not_full.set()
+            self._in_flight += 1
+            try:
+                await self.handler(*args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                gl_logger.error(f"{self.name} 处理消息时出错: {e}")
+            finally:
+                self._in_flight -= 1
+            self.stats['processed'] += 1
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# 待响应控制指令表
+# 按 request_id 保存等待端站应答的请求，并用小顶堆按截止时间排序，
+# 超时的请求可以在 O(log n) 内逐个取出，由NM服务向 reply_channel 推送超时通知。
+
+import heapq
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_config
+
+config = get_config()
+
+# 控制指令超时配置
+DEFAULT_REQUEST_TIMEOUT = config.get('control_request_config.request_default_timeout', 10.0)    # 未指定超时时间的请求的默认超时（秒）
+DEFAULT_EXPIRY_INTERVAL = config.get('control_request_config.request_expiry_interval', 0.5)     # 超时检查间隔（秒）
+
+
+class PendingRequestTable:
+    """
+    request_id → 请求信息 的映射，附带按截止时间排序的堆
+    - add()：登记请求，O(log n)
+    - pop()：收到应答时取出请求，O(1)，堆中的旧条目延迟删除
+    - pop_expired()：取出所有已超时的请求，每个 O(log n)
+    非线程安全，调用方需在同一事件循环内使用（或自行加锁）
+    """
+
+    def __init__(self):
+        self._requests: Dict[str, Dict[str, Any]] = {}
+        self._deadlines: List[Tuple[float, str]] = []    # (截止时间, request_id) 小顶堆
+
+    def __len__(self):
+        return len(self._requests)
+
+    def __contains__(self, request_id):
+        return request_id in self._requests
+
+    def add(self, request_id: str, reply_channel: str, timeout: Optional[float] = None, **extra):
+        """登记一个等待应答的请求"""
+        if timeout is None:
+            timeout = DEFAULT_REQUEST_TIMEOUT
+        now = monotonic()
+        deadline = now + timeout
+        self._requests[request_id] = {
+            'reply_channel': reply_channel,
+            'timestamp': now,
+            'deadline': deadline,
+            **extra,
+        }
+        heapq.heappush(self._deadlines, (deadline, request_id))
+        self._compact()
+
+    def pop(self, request_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """取出请求信息，不存在（未登记或已超时）时返回 default（与 dict.pop 的用法一致）"""
+        return self._requests.pop(request_id, default)
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """取出所有截止时间已过的请求"""
+        if now is None:
+            now = monotonic()
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, request_id = heapq.heappop(self._deadlines)
+            request_info = self._requests.get(request_id)
+            # 请求已被应答，或被重新登记了新的截止时间，跳过旧条目
+            if request_info is None or request_info['deadline'] != deadline:
+                continue
+            del self._requests[request_id]
+            expired.append((request_id, request_info))
+        return expired
+
+    def _compact(self):
+        """已应答请求留下的旧堆条目过多时重建堆，避免堆无限增长"""
+        if len(self._deadlines) > 2 * len(self._requests) + 64:
+            self._deadlines = [(info['deadline'], request_id) for request_id, info in self._requests.items()]
+            heapq.heapify(self._deadlines)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# 端站上报消息 → TerminalReport 字段的预编译转换表
+# 三个NM服务（UDP同步版、UDP异步版、QUIC版）共用这一份映射，
+# 模块导入时按模型字段类型为每个消息字段生成专用的转换函数，处理每条消息时不再反射模型。
+
+from datetime import date, time, datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+# Django相关
+from django.db import models
+
+# 项目内部
+from terminal_management.models import TerminalReport
+
+# 定义映射字典（消息字段：数据库字段）
+# 字段名以《MBP通信协议V1.0.3》第一节“端站上报信息”为准，旧版端站使用的字段名作为别名保留
+JSON_TO_MODEL_MAP = {
+    # 复合唯一约束字段 (Compound Unique Fields)
+    'type': 'type',
+    'sn': 'sn',
+    'date': 'report_date',
+    'time': 'report_time',
+
+    # 操作信息 (Operation Info)
+    'op': 'op',
+    'op_sub': 'op_sub',
+
+    # 端站状态信息 (Terminal Status)
+    'system_stat': 'system_stat',
+    'system_state': 'system_stat',                      # 旧版字段名
+    'wireless_network_stat': 'wireless_network_stat',
+    'wireless_network_state': 'wireless_network_stat',  # 旧版字段名
+    'long': 'long',
+    'lat': 'lat',
+    'theory_yaw': 'theory_yaw',
+    'yaw': 'yaw',
+    'pitch': 'pitch',
+    'roll': 'roll',
+    'yao_limit_state': 'yao_limit_state',
+    'temp': 'temp',
+    'humi': 'humi',
+
+    # 基站相关信息 (Base Station Info)
+    'bts_name': 'bts_name',
+    'bts_long': 'bts_long',
+    'bts_lat': 'bts_lat',
+    'bts_no': 'bts_number',
+    'bts_group_no': 'bts_group_number',
+    'bts_r': 'bts_r',
+
+    # 通信质量信息 (Communication Quality)
+    'upstream_rate': 'upstream_rate',
+    'downstream_rate': 'downstream_rate',
+    'standard': 'standard',
+    'plmn': 'plmn',
+    'cellid': 'cellid',
+    'pci': 'pci',
+    'rsrp': 'rsrp',
+    'sinr': 'sinr',
+    'rssi': 'rssi',
+}
+
+# 端站用来表示“无数据”的取值
+NULL_VALUES = frozenset(['N/A', ''])
+
+
+# =============================================================================
+# 各类型的转换函数：输入消息中的原始值，输出可直接写入模型字段的值
+# 无法转换时抛出 ValueError / TypeError
+# =============================================================================
+
+def _to_str(value):
+    return value if value.__class__ is str else str(value)
+
+def _to_float(value):
+    return value if value.__class__ is float else float(value)
+
+def _to_int(value):
+    if value.__class__ is int:
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{value} 不是整数")
+        return int(value)
+    return int(value)
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    value = str(value)
+    if len(value) == 8 and value.isdigit():     # 兼容 YYYYMMDD
+        return datetime.strptime(value, '%Y%m%d').date()
+    return date.fromisoformat(value)
+
+def _to_time(value):
+    if isinstance(value, time):
+        return value
+    value = str(value)
+    if len(value) == 6 and value.isdigit():     # 兼容 HHMMSS
+        return datetime.strptime(value, '%H%M%S').time()
+    return time.fromisoformat(value)
+
+# 模型字段类型 → 转换函数（按 isinstance 顺序匹配）
+FIELD_COERCERS: List[Tuple[type, Callable[[Any], Any]]] = [
+    ((models.CharField, models.TextField), _to_str),
+    (models.FloatField, _to_float),
+    (models.IntegerField, _to_int),
+    (models.DateField, _to_date),
+    (models.TimeField, _to_time),
+]
+
+
+def _build_coercer(field: models.Field) -> Callable[[Any], Any]:
+    """
+    为单个模型字段生成转换函数：N/A 和空串统一转为 None，其余值转换失败时抛错（可空字段也一样），
+    由调用方记录并丢弃这条上报，不会把格式错误的值静默存为空
+    """
+    convert = None
+    for field_types, coercer in FIELD_COERCERS:
+        if isinstance(field, field_types):
+            convert = coercer
+            break
+    if convert is None:
+        raise TypeError(f"TerminalReport.{field.name} 的字段类型 {type(field).__name__} 没有对应的转换函数")
+
+    def coerce(value):
+        if value is None or (value.__class__ is str and value in NULL_VALUES):
+            return None
+        return convert(value)
+    coerce.__name__ = f"coerce_{field.name}"
+    return coerce
+
+
+def _compile_plan() -> Tuple[Tuple[str, str, Callable[[Any], Any]], ...]:
+    """根据模型定义编译转换计划：((消息字段, 模型字段, 转换函数), ...)"""
+    coercers: Dict[str, Callable[[Any], Any]] = {}
+    plan = []
+    for msg_key, model_field in JSON_TO_MODEL_MAP.items():
+        if model_field not in coercers:
+            coercers[model_field] = _build_coercer(TerminalReport._meta.get_field(model_field))
+        plan.append((msg_key, model_field, coercers[model_field]))
+    return tuple(plan)
+
+
+# 导入时编译一次，所有服务共用
+REPORT_PLAN = _compile_plan()
+
+
+def map_report(msg_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把一条端站上报消息转换为 TerminalReport 的字段字典。
+    消息中不存在的字段不会出现在结果中；新旧字段名同时出现时以协议中的字段名为准。
+    任一字段格式非法时抛出 ValueError，错误信息中带有 SN、字段名和原始值。
+    """
+    model_data = {}
+    for msg_key, model_field, coerce in REPORT_PLAN:
+        if msg_key in msg_dict and model_field not in model_data:
+            try:
+                model_data[model_field] = coerce(msg_dict[msg_key])
+            except (ValueError, TypeError) as e:
+                raise ValueError(
+                    f"上报字段 {msg_key} 的值 {msg_dict[msg_key]!r} 无法转换 (SN: {msg_dict.get('sn')}): {e}"
+                ) from e
+    return model_data
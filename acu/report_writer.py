@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+# 端站上报数据的批量写入器（write-behind）
+# NM服务将映射好的上报行提交到这里，由后台任务按数量或时间批量写入数据库
+# 每批写入提交后，在事件循环中一次发布该批的实时推送（terminal_management/outbox.py），数据库线程不等待 Redis
+
+import asyncio
+from time import perf_counter
+from typing import Dict, Any, List, Optional
+
+# Django异步支持
+from channels.db import database_sync_to_async
+
+# 项目内部
+from utils import gl_logger
+from terminal_management import services
+from config import get_config
+
+config = get_config()
+
+# 批量写入配置
+DEFAULT_BATCH_SIZE = config.get('report_writer_config.report_batch_size', 200)           # 单批最大行数
+DEFAULT_FLUSH_INTERVAL = config.get('report_writer_config.report_flush_interval', 0.5)   # 最长攒批时间（秒）
+DEFAULT_MAX_PENDING = config.get('report_writer_config.report_max_pending', 5000)        # 缓冲区上限，超过后提交方等待落库
+
+
+class ReportBatchWriter:
+    """
+    TerminalReport 的异步批量写入器
+    - submit() 只把行放入内存缓冲区，不等待数据库
+    - 缓冲区达到 batch_size 或距上次写入超过 flush_interval 时，执行一次多行插入
+    - 批内及与库内重复的 (sn, reported_at) 会被跳过，不影响整批；其余写入错误整批退化为逐行写入
+    - 每批提交后发布一次实时推送（逐行写入的退化路径仍由 post_save 信号推送）
+    """
+
+    def __init__(self,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING,
+                 name="ReportWriter"):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, batch_size)
+        self.name = name
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+        # 统计信息：累计批次/行数/重复数/失败数，以及最近一批的耗时
+        self.stats = {
+            'batches': 0,
+            'rows': 0,
+            'duplicates': 0,
+            'failed_rows': 0,
+            'last_batch_rows': 0,
+            'last_batch_ms': 0.0,
+            'published_updates': 0,
+            'publish_errors': 0,
+        }
+
+        # 异步数据库操作
+        self.bulk_create_terminal_reports_async = database_sync_to_async(services.bulk_create_terminal_reports)
+        self.create_terminal_report_async = database_sync_to_async(services.create_terminal_report)
+
+    async def start(self):
+        """启动后台刷写任务"""
+        self.is_running = True
+        self._flush_task = asyncio.create_task(self._flush_loop(), name=f"{self.name}_Flush_Task")
+        gl_logger.info(f"{self.name} 已启动 (batch_size={self.batch_size}, flush_interval={self.flush_interval}s)")
+
+    async def stop(self):
+        """
+        停止后台任务，并把缓冲区中剩余的数据全部写入。
+        不取消刷写任务：正在写入的一批被取消时，数据库线程中的写入仍会完成，但推送和统计会丢失。
+        这里只清除运行标志并唤醒刷写循环，等它完成当前这批和最后一次刷写后自行退出。
+        """
+        self.is_running = False
+        self._flush_event.set()
+        if self._flush_task and not self._flush_task.done():
+            await self._flush_task
+        await self.flush()
+        gl_logger.info(f"{self.name} 已停止，累计写入 {self.stats['rows']} 行，批次 {self.stats['batches']}")
+
+    @property
+    def pending(self) -> int:
+        """缓冲区中尚未写入的行数"""
+        return len(self._buffer)
+
+    async def submit(self, model_data: Dict[str, Any]):
+        """提交一行已映射好的上报数据"""
+        self._buffer.append(model_data)
+        if len(self._buffer) >= self.batch_size:
+            self._flush_event.set()
+        # 数据库跟不上时，让提交方直接参与落库，避免缓冲区无限增长
+        if len(self._buffer) >= self.max_pending:
+            await self.flush()
+
+    async def _flush_loop(self):
+        """按数量或时间触发刷写"""
+        while self.is_running:
+            try:
+                try:
+                    await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_event.clear()
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                gl_logger.error(f"{self.name} 刷写循环出错: {e}")
+                if self.is_running:
+                    await asyncio.sleep(1)
+
+    async def flush(self):
+        """把缓冲区按 batch_size 切片写入数据库"""
+        async with self._flush_lock:
+            while self._buffer:
+                rows = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                await self._write_batch(rows)
+
+    async def _write_batch(self, rows: List[Dict[str, Any]]):
+        """写入一批数据，并记录耗时与行数"""
+        start = perf_counter()
+        success, result = await self.bulk_create_terminal_reports_async(rows)
+
+        if success:
+            inserted, duplicates, failed = result['rows'], result['duplicates'], 0
+            await self._publish(result['outbox'])
+        else:
+            # 整批写入失败（通常是个别行数据非法），退化为逐行写入，只丢弃出错的行
+            gl_logger.warning(f"{self.name} 批量写入失败，改为逐行写入 ({len(rows)} 行): {result}")
+            inserted = duplicates = failed = 0
+            for row in rows:
+                row_success, row_result = await self.create_terminal_report_async(**row)
+                if row_success:
+                    inserted += 1
+                else:
+                    failed += 1
+                    gl_logger.error(f"{self.name} 存储上报数据失败 (SN: {row.get('sn')}): {row_result}")
+
+        elapsed_ms = (perf_counter() - start) * 1000
+        self.stats['batches'] += 1
+        self.stats['rows'] += inserted
+        self.stats['duplicates'] += duplicates
+        self.stats['failed_rows'] += failed
+        self.stats['last_batch_rows'] = len(rows)
+        self.stats['last_batch_ms'] = elapsed_ms
+        gl_logger.debug(f"{self.name} 批量写入完成: 提交 {len(rows)} 行, 写入 {inserted} 行, "
+                        f"重复 {duplicates} 行, 失败 {failed} 行, 耗时 {elapsed_ms:.1f} ms")
+
+    async def _publish(self, outbox):
+        """发布一批上报的实时推送；数据已经提交，失败只记录"""
+        try:
+            await outbox.publish()
+            self.stats['published_updates'] += len(outbox)
+        except Exception as e:
+            self.stats['publish_errors'] += 1
+            gl_logger.warning(f"{self.name} 批量上报已写入，但发布实时推送失败: {e}")
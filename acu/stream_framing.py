@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# QUIC流上的消息分帧
+# 端站可以在一条长期不关闭的流上连续发送多条消息，支持两种分帧方式：
+#   - 换行分隔：每条JSON消息以 b'\n' 结尾（json.dumps 的输出本身不含换行）
+#   - 长度前缀：每条消息前加4字节大端无符号长度
+# 分帧方式默认由流的第一个字节自动识别：JSON 以 '{' 或空白开头，长度前缀在消息小于16MB时首字节为 0x00；
+# 二进制编码（见 acu.compact_codec）的流由调用方固定指定为长度前缀。
+# 旧版“一条流一条消息”（发送后 end_stream=True，不带换行）仍然兼容：流结束时缓冲区中剩余的数据作为最后一条消息。
+
+from typing import List, Optional
+
+from config import get_config
+
+config = get_config()
+
+# 分帧配置
+DEFAULT_MAX_FRAME_SIZE = config.get('quic_server_config.quic_max_frame_size', 65536)    # 单条消息最大字节数，同时也是单个流未解析数据的上限
+
+FRAMING_NEWLINE = 'newline'
+FRAMING_LENGTH_PREFIX = 'length_prefix'
+
+LENGTH_PREFIX_SIZE = 4
+NEWLINE = 0x0A
+
+
+class FrameTooLarge(ValueError):
+    """单条消息超过上限（或未解析数据超过上限仍找不到帧边界）"""
+
+
+def encode_frame(payload: bytes, framing: str = FRAMING_NEWLINE) -> bytes:
+    """按指定分帧方式为一条消息加上帧边界"""
+    if framing == FRAMING_LENGTH_PREFIX:
+        return len(payload).to_bytes(LENGTH_PREFIX_SIZE, 'big') + payload
+    return payload + b'\n'
+
+
+class StreamFrameDecoder:
+    """
+    单个流的增量分帧解析器
+    feed() 追加收到的数据并返回其中已完整的消息（bytes），不完整的尾部留在缓冲区等待后续数据；
+    缓冲区为 bytearray，已解析的数据一次性从头部删除，避免 bytes 反复拼接带来的二次方开销。
+    """
+
+    __slots__ = ('max_frame_size', 'framing', '_buffer', '_scan_from')
+
+    def __init__(self, max_frame_size: int = DEFAULT_MAX_FRAME_SIZE, framing: Optional[str] = None):
+        self.max_frame_size = max_frame_size
+        self.framing: Optional[str] = framing   # 为 None 时由收到的第一个字节识别
+        self._buffer = bytearray()
+        self._scan_from = 0                     # 换行分隔模式下，已确认不含换行的前缀长度
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data: bytes, end_stream: bool = False) -> List[bytes]:
+        """追加数据，返回所有已完整的消息；超过上限时抛出 FrameTooLarge"""
+        if data:
+            self._buffer += data
+        if self.framing is None and self._buffer:
+            self.framing = FRAMING_LENGTH_PREFIX if self._buffer[0] == 0 else FRAMING_NEWLINE
+
+        try:
+            if self.framing == FRAMING_LENGTH_PREFIX:
+                frames = self._split_length_prefixed()
+            else:
+                frames = self._split_newline()
+        except FrameTooLarge:
+            # 超限后该流的数据已无法对齐帧边界，丢弃缓冲区
+            self._reset()
+            raise
+
+        if end_stream:
+            frames.extend(self._finish())
+        return frames
+
+    def _split_newline(self) -> List[bytes]:
+        buffer = self._buffer
+        frames = []
+        start = 0
+        while True:
+            end = buffer.find(NEWLINE, max(start, self._scan_from))
+            if end < 0:
+                break
+            frame = bytes(buffer[start:end]).strip()
+            if frame:
+                if len(frame) > self.max_frame_size:
+                    raise FrameTooLarge(f"消息长度 {len(frame)} 超过上限 {self.max_frame_size}")
+                frames.append(frame)
+            start = end + 1
+        if start:
+            del buffer[:start]
+        self._scan_from = len(buffer)
+        if len(buffer) > self.max_frame_size:
+            raise FrameTooLarge(f"流中未分帧的数据超过上限 {self.max_frame_size}")
+        return frames
+
+    def _split_length_prefixed(self) -> List[bytes]:
+        buffer = self._buffer
+        view = memoryview(buffer)
+        frames = []
+        offset = 0
+        try:
+            while len(buffer) - offset >= LENGTH_PREFIX_SIZE:
+                length = int.from_bytes(view[offset:offset + LENGTH_PREFIX_SIZE], 'big')
+                if length > self.max_frame_size:
+                    raise FrameTooLarge(f"声明的消息长度 {length} 超过上限 {self.max_frame_size}")
+                end = offset + LENGTH_PREFIX_SIZE + length
+                if end > len(buffer):
+                    break
+                frames.append(bytes(view[offset + LENGTH_PREFIX_SIZE:end]))
+                offset = end
+        finally:
+            # 释放 memoryview 后才能调整 bytearray 的大小
+            view.release()
+        if offset:
+            del buffer[:offset]
+        return frames
+
+    def _finish(self) -> List[bytes]:
+        """流结束：换行分隔模式下剩余数据作为最后一条消息，长度前缀模式下剩余数据为截断的帧"""
+        remaining = bytes(self._buffer)
+        framing = self.framing
+        self._reset()
+        if framing == FRAMING_LENGTH_PREFIX:
+            if remaining:
+                raise ValueError(f"流结束时有 {len(remaining)} 字节不完整的帧")
+            return []
+        remaining = remaining.strip()
+        return [remaining] if remaining else []
+
+    def _reset(self):
+        self._buffer.clear()
+        self._scan_from = 0
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# 端站网络信息的写回缓存（write-behind）
+# 每个心跳和上报都要刷新端站的 IP、端口和最后在线时间。缓存在内存中保存 SN → (ip, port, last_seen)：
+#   - 地址未变化：只更新内存中的 last_seen，由后台任务定期一次性批量写入
+#   - 地址变化（或缓存中没有该SN）：立即以数据库为准核对并写入，触发 post_save 推送
+# 启动时用一次查询预热缓存。多进程模式下各工作进程各有一份缓存，
+# 每个条目超过 revalidate_interval 后会重新与数据库核对一次，避免其他进程写入的地址长期不一致。
+
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Django异步支持
+from channels.db import database_sync_to_async
+from django.utils import timezone
+
+# 项目内部
+from utils import gl_logger
+from terminal_management import services
+from config import get_config
+
+config = get_config()
+
+# 缓存配置
+DEFAULT_FLUSH_INTERVAL = config.get('network_cache_config.last_seen_flush_interval', 30.0)      # 最后在线时间的批量写入间隔（秒）
+DEFAULT_REVALIDATE_INTERVAL = config.get('network_cache_config.revalidate_interval', 300.0)     # 缓存条目与数据库重新核对的间隔（秒）
+DEFAULT_UNKNOWN_RETRY = config.get('network_cache_config.unknown_sn_retry_interval', 60.0)      # 未登记的SN重新查询数据库的间隔（秒）
+DEFAULT_UNKNOWN_MAX = config.get('network_cache_config.unknown_sn_max_entries', 10000)          # 最多记住多少个未登记的SN
+
+
+class _Entry:
+    """单个端站的缓存条目"""
+
+    __slots__ = ('ip', 'port', 'last_seen', 'verified_at')
+
+    def __init__(self, ip, port, last_seen, verified_at):
+        self.ip = ip
+        self.port = port
+        self.last_seen = last_seen
+        self.verified_at = verified_at      # 上次与数据库核对的时间（事件循环时钟）
+
+
+class TerminalNetworkCache:
+    """
+    SN → (ip, port, last_seen) 的写回缓存
+    - start()：一次查询预热缓存，并启动定期批量写入任务
+    - touch()：收到心跳或上报时调用，只有地址变化时才访问数据库
+    - stop()：停止后台任务，并写入尚未落库的最后在线时间
+    """
+
+    def __init__(self,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 revalidate_interval=DEFAULT_REVALIDATE_INTERVAL,
+                 unknown_retry=DEFAULT_UNKNOWN_RETRY,
+                 unknown_max=DEFAULT_UNKNOWN_MAX,
+                 name="NetworkCache"):
+        self.flush_interval = flush_interval
+        self.revalidate_interval = revalidate_interval
+        self.unknown_retry = unknown_retry
+        self.unknown_max = max(1, unknown_max)
+        self.name = name
+
+        self._entries: Dict[str, _Entry] = {}
+        self._dirty: Dict[str, object] = {}         # 待写入的 {sn: last_seen}
+        # 数据库中不存在的SN → 下次允许查询的时间，按该时间先后排列；任何对端都能发送随机SN，
+        # 因此超过 unknown_max 时丢弃最早的，到期的条目在每次批量写入时清除
+        self._unknown: "OrderedDict[str, float]" = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+        # 统计信息
+        self.stats = {
+            'hits': 0,              # 地址未变化，只更新内存
+            'address_changes': 0,   # 地址变化并已写入数据库
+            'revalidations': 0,     # 与数据库的定期核对
+            'unknown': 0,           # 未登记SN的心跳
+            'unknown_evicted': 0,   # 因超过上限被丢弃的未登记SN记录
+            'flushes': 0,           # 批量写入次数
+            'flushed_rows': 0,      # 批量写入的端站数
+        }
+
+        # 异步数据库操作
+        self.get_snapshot_async = database_sync_to_async(services.get_terminal_network_snapshot)
+        self.sync_network_info_async = database_sync_to_async(services.sync_terminal_network_info)
+        self.bulk_update_last_seen_async = database_sync_to_async(services.bulk_update_terminal_last_seen)
+
+    async def start(self):
+        """预热缓存并启动后台写入任务"""
+        await self.prime()
+        self.is_running = True
+        self._flush_task = asyncio.create_task(self._flush_loop(), name=f"{self.name}_Flush_Task")
+
+    async def stop(self):
+        """停止后台任务，并写入尚未落库的最后在线时间"""
+        self.is_running = False
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        gl_logger.info(f"{self.name} 已停止，统计: {self.stats}")
+
+    async def prime(self):
+        """用一次查询把所有端站的网络信息载入缓存"""
+        success, result = await self.get_snapshot_async()
+        if not success:
+            gl_logger.error(f"{self.name} 预热失败，将在收到心跳时逐个查询: {result}")
+            return
+        now = asyncio.get_running_loop().time()
+        self._entries = {
+            sn: _Entry(ip, port, last_seen, now) for sn, (ip, port, last_seen) in result.items()
+        }
+        gl_logger.info(f"{self.name} 已预热 {len(self._entries)} 个端站的网络信息")
+
+    def get(self, sn) -> Optional[Tuple[str, int, object]]:
+        """返回缓存中的 (ip, port, last_seen)，没有时返回 None"""
+        entry = self._entries.get(sn)
+        return (entry.ip, entry.port, entry.last_seen) if entry else None
+
+    async def touch(self, sn, ip, port) -> Tuple[bool, object]:
+        """
+        记录一次心跳或上报。
+        返回 (success, changed_or_error)：changed 为 True 表示地址发生变化并已写入数据库。
+        """
+        loop_now = asyncio.get_running_loop().time()
+        last_seen = timezone.now()
+
+        entry = self._entries.get(sn)
+        if (entry is not None and entry.ip == ip and entry.port == port
+                and loop_now - entry.verified_at < self.revalidate_interval):
+            entry.last_seen = last_seen
+            self._dirty[sn] = last_seen
+            self.stats['hits'] += 1
+            return (True, False)
+
+        retry_at = self._unknown.get(sn)
+        if retry_at is not None and loop_now < retry_at:
+            self.stats['unknown'] += 1
+            return (False, f"未找到SN为 '{sn}' 的端站。")
+
+        # 地址变化、缓存中没有该SN或需要重新核对：以数据库为准写入
+        success, result = await self.sync_network_info_async(sn, ip, port, last_seen)
+        if not success:
+            self._entries.pop(sn, None)
+            self._remember_unknown(sn, loop_now + self.unknown_retry)
+            self.stats['unknown'] += 1
+            return (False, result)
+
+        self._unknown.pop(sn, None)
+        self._dirty.pop(sn, None)
+        self._entries[sn] = _Entry(ip, port, last_seen, loop_now)
+        self.stats['address_changes' if result else 'revalidations'] += 1
+        return (True, result)
+
+    def _remember_unknown(self, sn, retry_at):
+        """记录未登记的SN；重新加入的排到末尾，保持按下次查询时间排序"""
+        self._unknown.pop(sn, None)
+        self._unknown[sn] = retry_at
+        while len(self._unknown) > self.unknown_max:
+            self._unknown.popitem(last=False)
+            self.stats['unknown_evicted'] += 1
+
+    def prune_unknown(self, now=None):
+        """清除已经到期的未登记SN记录（到期后下次心跳会重新查询数据库），返回清除的条数"""
+        if now is None:
+            now = asyncio.get_running_loop().time()
+        pruned = 0
+        while self._unknown:
+            sn, retry_at = next(iter(self._unknown.items()))
+            if retry_at > now:
+                break
+            del self._unknown[sn]
+            pruned += 1
+        return pruned
+
+    async def _flush_loop(self):
+        """定期批量写入最后在线时间"""
+        while self.is_running:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                gl_logger.error(f"{self.name} 写入循环出错: {e}")
+
+    async def flush(self):
+        """把内存中累积的最后在线时间一次性写入数据库，同时清除到期的未登记SN记录"""
+        self.prune_unknown()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            success, result = await self.bulk_update_last_seen_async(dirty)
+            if not success:
+                # 写入失败时放回缓冲区，期间新到的心跳时间更晚，以新值为准
+                for sn, last_seen in dirty.items():
+                    self._dirty.setdefault(sn, last_seen)
+                gl_logger.error(f"{self.name} 批量写入最后在线时间失败 ({len(dirty)} 个端站): {result}")
+                return
+            self.stats['flushes'] += 1
+            self.stats['flushed_rows'] += result
+            gl_logger.debug(f"{self.name} 已批量写入 {result} 个端站的最后在线时间")
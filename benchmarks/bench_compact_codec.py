@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+QUIC上报编码对比：JSON（comdi-nm-protocol）与 MessagePack + 整数键（二进制ALPN）
+统计每条状态上报的线上字节数（含分帧）和服务端解码耗时。
+
+用法:
+    python benchmarks/bench_compact_codec.py [循环次数]
+"""
+
+import json
+import os
+import sys
+import timeit
+
+# 将项目根目录添加到Python路径（只用到配置文件，不需要Django环境）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_codec
+from acu import compact_codec
+from acu.stream_framing import StreamFrameDecoder, encode_frame, FRAMING_LENGTH_PREFIX, FRAMING_NEWLINE
+
+# 协议文档中的上报消息示例
+SAMPLE_REPORT = {
+    "type": "MBP-N28 船载伺服基站", "sn": "sn000004", "op": "report", "op_sub": "state",
+    "date": "2025-09-11", "time": "00:50:53", "system_stat": 0, "wireless_network_stat": 0,
+    "long": 121.4737021, "lat": 31.2303904, "theory_yaw": 0.0, "yaw": 270.0, "pitch": 0.4000000059604645, "roll": -1.5,
+    "yao_limit_state": 0, "temp": 0.0, "humi": 0.0, "bts_name": "2号基站", "bts_long": 121.4801, "bts_lat": 31.2362,
+    "bts_no": 2, "bts_group_no": 1, "bts_r": 60.0, "upstream_rate": 0, "downstream_rate": 0,
+    "standard": "NR", "plmn": 46011, "cellid": 0, "pci": 219, "rsrp": -92, "sinr": 13, "rssi": "N/A",
+}
+SAMPLE_HEARTBEAT = {"sn": "sn000004", "op": "heartbeat"}
+
+
+def main():
+    if not compact_codec.is_available():
+        print("未安装 msgpack，无法测试二进制编码")
+        return
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    for name, msg in (('状态上报', SAMPLE_REPORT), ('心跳', SAMPLE_HEARTBEAT)):
+        # 端站旧固件的写法（ensure_ascii、带空格分隔符）与二进制编码对比
+        json_frame = encode_frame(json.dumps(msg).encode('utf-8'), FRAMING_NEWLINE)
+        binary_frame = encode_frame(compact_codec.encode(msg), FRAMING_LENGTH_PREFIX)
+        print(f"{name}: JSON {len(json_frame)} 字节, 二进制 {len(binary_frame)} 字节, "
+              f"节省 {1 - len(binary_frame) / len(json_frame):.0%}")
+
+    json_frame = encode_frame(json.dumps(SAMPLE_REPORT).encode('utf-8'), FRAMING_NEWLINE)
+    binary_frame = encode_frame(compact_codec.encode(SAMPLE_REPORT), FRAMING_LENGTH_PREFIX)
+    json_decoder = StreamFrameDecoder()
+    binary_decoder = StreamFrameDecoder(framing=FRAMING_LENGTH_PREFIX)
+
+    def decode_json():
+        for frame in json_decoder.feed(json_frame):
+            json_codec.decode_terminal_message(frame)
+
+    def decode_binary():
+        for frame in binary_decoder.feed(binary_frame):
+            compact_codec.decode(frame)
+
+    json_us = min(timeit.repeat(decode_json, number=number, repeat=5)) / number * 1e6
+    binary_us = min(timeit.repeat(decode_binary, number=number, repeat=5)) / number * 1e6
+    print(f"分帧+解码状态上报 (json_codec 后端: {json_codec.BACKEND}): JSON {json_us:.2f} us, 二进制 {binary_us:.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+字段级增量推送的基准测试
+模拟一个船队一小时的上报（默认 50 个端站、每 5 秒一条），按推送路径构造每条上报的 report / antenna / GIS 帧，
+对比订阅整个船队的一个连接在以下两种方式下收到的字节数（UTF-8 编码后的消息文本，不含 WebSocket 帧头）：
+  - 完整帧：每条更新发送全部字段
+  - 增量：deltas.DeltaTracker 只发送变化的字段（每个端站每种帧类型第一次为完整快照）
+上报中位置、姿态、信号和速率每条都在变化，温湿度约每5分钟变化，基站/小区约每30分钟切换一次。
+不考虑 coalescer.py 的限速合并（合并只减少帧数，两种方式同样受益）。
+
+用法:
+    python benchmarks/bench_delta_updates.py [端站数] [上报间隔秒数] [小时数]
+"""
+
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+# 将项目根目录添加到Python路径，使用项目配置；不访问数据库
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mbp_project import settings as project_settings
+from django.conf import settings
+
+values = {name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()}
+values['DATABASES'] = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}}
+values['CHANNEL_LAYERS'] = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+settings.configure(**values)
+import django
+django.setup()
+
+from django.utils import timezone
+from terminal_management import outbox, services
+from terminal_management.deltas import DeltaTracker
+from terminal_management.models import ShipInfo, TerminalInfo, TerminalReport
+
+HANDOVER_REPORTS = 360      # 约每30分钟切换一次基站（每5秒一条时）
+ENVIRONMENT_REPORTS = 60    # 约每5分钟温湿度变化一次
+
+
+class SimulatedTerminal:
+    """一个端站的模拟上报"""
+
+    def __init__(self, index, rng):
+        self.rng = rng
+        self.sn = f"bench{index:06d}"
+        ship = ShipInfo(mmsi=f"412{index:06d}", ship_name=f"基准测试船{index}", ship_owner="测试")
+        self.terminal = TerminalInfo(sn=self.sn, ship=ship, ip_address=f"10.0.{index // 256}.{index % 256}", port_number=5000)
+        self.long = 120.0 + rng.random()
+        self.lat = 30.0 + rng.random()
+        self.heading = rng.uniform(0, 360)
+        self.offset = rng.randrange(HANDOVER_REPORTS)   # 各端站错开切换时刻
+        self.count = 0
+
+    def report(self, reported_at):
+        rng = self.rng
+        self.count += 1
+        self.heading = (self.heading + rng.uniform(-5, 5)) % 360
+        self.long += 1e-4 * rng.uniform(0.5, 1.5)
+        self.lat += 1e-4 * rng.uniform(-0.5, 0.5)
+        cell = (self.count + self.offset) // HANDOVER_REPORTS
+        environment = (self.count + self.offset) // ENVIRONMENT_REPORTS
+        local = timezone.localtime(reported_at)
+        report = TerminalReport(
+            type='MBP-ACU', sn=self.sn, report_date=local.date(), report_time=local.time(), op='report', op_sub='status',
+            system_stat=1, wireless_network_stat=1,
+            long=round(self.long, 6), lat=round(self.lat, 6),
+            theory_yaw=round(self.heading, 1), yaw=round(self.heading + rng.uniform(-1, 1), 1),
+            pitch=round(rng.uniform(-3, 3), 1), roll=round(rng.uniform(-3, 3), 1), yao_limit_state=0.0,
+            temp=20.0 + environment % 5, humi=60.0 + environment % 7,
+            bts_name=f"{cell % 40}号基站", bts_long=121.0 + cell % 40 * 0.01, bts_lat=31.0, bts_number=cell % 40,
+            bts_group_number=cell % 4, bts_r=20.0,
+            upstream_rate=round(rng.uniform(5, 50), 2), downstream_rate=round(rng.uniform(20, 200), 2),
+            standard='NR', plmn='46000', cellid=str(100000 + cell % 40), pci=cell % 500,
+            rsrp=round(rng.uniform(-110, -70), 1), sinr=round(rng.uniform(-5, 25), 1), rssi=round(rng.uniform(-90, -50), 1),
+        )
+        report.fill_reported_at()
+        return report
+
+    def frames(self, reported_at):
+        """与 services.build_report_outbox 相同的方式构造一条上报的推送帧"""
+        report = self.report(reported_at)
+        success, payloads = services.build_realtime_payloads(self.sn, report, self.terminal)
+        assert success, payloads
+        return outbox.sn_frames(outbox.report_message(report), payloads)
+
+
+def main():
+    terminals = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    hours = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    rng = random.Random(0)
+    fleet = [SimulatedTerminal(index, rng) for index in range(terminals)]
+    tracker = DeltaTracker()
+    full_bytes, delta_bytes, frame_count = Counter(), Counter(), Counter()
+
+    start = timezone.make_aware(datetime(2026, 1, 1, 8, 0, 0))
+    steps = int(hours * 3600 // interval)
+    begin = time.perf_counter()
+    for step in range(steps):
+        reported_at = start + timedelta(seconds=step * interval)
+        for terminal in fleet:
+            for _, kind, text, data in terminal.frames(reported_at):
+                frame_count[kind] += 1
+                full_bytes[kind] += len(text.encode('utf-8'))
+                delta_text = tracker.encode(terminal.sn, kind, text, data)
+                if delta_text is not None:
+                    delta_bytes[kind] += len(delta_text.encode('utf-8'))
+    elapsed = time.perf_counter() - begin
+
+    print(f"{terminals} 个端站，每 {interval} 秒一条，{hours} 小时：{steps * terminals} 条上报，"
+          f"{sum(frame_count.values())} 帧（模拟耗时 {elapsed:.1f} s）")
+    for kind in frame_count:
+        saved = full_bytes[kind] - delta_bytes[kind]
+        print(f"  {kind:8s} 完整帧 {full_bytes[kind] / 1024 / 1024:8.2f} MiB，增量 {delta_bytes[kind] / 1024 / 1024:8.2f} MiB，"
+              f"节省 {saved / full_bytes[kind]:.1%}")
+    total_full, total_delta = sum(full_bytes.values()), sum(delta_bytes.values())
+    per_hour = (total_full - total_delta) / hours
+    print(f"  合计     完整帧 {total_full / 1024 / 1024:8.2f} MiB，增量 {total_delta / 1024 / 1024:8.2f} MiB，"
+          f"节省 {(total_full - total_delta) / total_full:.1%}（每连接每小时 {per_hour / 1024 / 1024:.2f} MiB）")
+    print(f"  快照/增量/跳过: {tracker.stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+JSON编解码微基准测试
+用真实的端站上报、WebSocket广播和控制指令消息，对比旧代码中的标准库写法与 utils.json_codec 的耗时。
+json_codec 在安装了 orjson 时使用 orjson，否则使用标准库（此时两者差别只在于紧凑分隔符）。
+
+用法:
+    python benchmarks/bench_json_codec.py [循环次数]
+"""
+
+import json
+import os
+import sys
+import timeit
+
+# 将项目根目录添加到Python路径（只用到配置文件，不需要Django环境）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_codec
+
+# 协议文档中的上报消息示例
+SAMPLE_REPORT = {
+    "type": "MBP-N28 船载伺服基站", "sn": "sn000004", "op": "report", "op_sub": "state",
+    "date": "2025-09-11", "time": "00:50:53", "system_stat": 0, "wireless_network_stat": 0,
+    "long": 121.4737021, "lat": 31.2303904, "theory_yaw": 0.0, "yaw": 270.0, "pitch": 0.4000000059604645, "roll": -1.5,
+    "yao_limit_state": 0, "temp": 0.0, "humi": 0.0, "bts_name": "2号基站", "bts_long": 121.4801, "bts_lat": 31.2362,
+    "bts_no": 2, "bts_group_no": 1, "bts_r": 60.0, "upstream_rate": 0, "downstream_rate": 0,
+    "standard": "NR", "plmn": 46011, "cellid": 0, "pci": 219, "rsrp": -92, "sinr": 13, "rssi": "N/A",
+}
+REPORT_UTF8 = json.dumps(SAMPLE_REPORT, ensure_ascii=False).encode('utf-8')
+REPORT_GBK = json.dumps(SAMPLE_REPORT, ensure_ascii=False).encode('gbk')
+
+# signals 向前端广播的最新上报（字段与 terminal_report_handler 一致）
+BROADCAST_MESSAGE = {'message': {
+    'type': 'latest_report_data', 'sn': 'sn000004',
+    'data': {key: str(value) for key, value in SAMPLE_REPORT.items()},
+}}
+
+# consumers 发布到 Redis 'udp-command' 频道的控制指令
+COMMAND = {
+    "ip": "192.168.3.101", "port": 59999, "reply_channel": "reply_3f9c2a6d8e", "timeout": 10.0, "expect_reply": True,
+    "payload": {"sn": "sn000004", "op": "query", "op_sub": "equipment_status", "request_id": "3f9c2a6d-8e1b-4c7a-9d2e-5b6f7a8c9d0e"},
+}
+COMMAND_TEXT = json.dumps(COMMAND)
+
+
+def legacy_decode(raw_data):
+    """旧版NM服务的解码方式：先UTF-8后GBK"""
+    try:
+        return json.loads(raw_data.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return json.loads(raw_data.decode('gbk'))
+
+
+CASES = [
+    ('解码上报 (UTF-8)', lambda: legacy_decode(REPORT_UTF8), lambda: json_codec.decode_terminal_message(REPORT_UTF8)),
+    ('解码上报 (GBK)', lambda: legacy_decode(REPORT_GBK), lambda: json_codec.decode_terminal_message(REPORT_GBK)),
+    ('编码广播消息', lambda: json.dumps(BROADCAST_MESSAGE), lambda: json_codec.dumps(BROADCAST_MESSAGE)),
+    ('编码Redis指令', lambda: json.dumps(COMMAND), lambda: json_codec.dumps(COMMAND)),
+    ('解码Redis指令', lambda: json.loads(COMMAND_TEXT), lambda: json_codec.loads(COMMAND_TEXT)),
+    ('编码下发指令', lambda: json.dumps(COMMAND['payload']).encode('utf-8'), lambda: json_codec.encode_terminal_message(COMMAND['payload'])),
+]
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(f"json_codec 后端: {json_codec.BACKEND}")
+    for name, legacy, current in CASES:
+        legacy_us = min(timeit.repeat(legacy, number=number, repeat=5)) / number * 1e6
+        current_us = min(timeit.repeat(current, number=number, repeat=5)) / number * 1e6
+        print(f"{name}: 标准库 {legacy_us:.2f} us, json_codec {current_us:.2f} us, 加速比 {legacy_us / current_us:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
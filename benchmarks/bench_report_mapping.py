@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+上报消息字段转换的微基准测试
+对比旧版逐条反射模型的映射循环与预编译转换表 (acu.report_mapping) 的单条消息耗时
+
+用法:
+    python benchmarks/bench_report_mapping.py [循环次数]
+"""
+
+import os
+import sys
+import timeit
+
+# 将项目根目录添加到Python路径，并初始化Django（只用到模型元数据，不连接数据库）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mbp_project.settings')
+import django
+django.setup()
+
+from django.db import models
+from terminal_management.models import TerminalReport
+from acu.report_mapping import JSON_TO_MODEL_MAP, map_report
+
+# 协议文档中的上报消息示例
+SAMPLE_REPORT = {
+    "type": "MBP-N28 船载伺服基站", "sn": "sn000004", "op": "report", "op_sub": "state",
+    "date": "2025-09-11", "time": "00:50:53", "system_stat": 0, "wireless_network_stat": 0,
+    "long": 0.5, "lat": 0.5, "theory_yaw": 0.0, "yaw": 270.0, "pitch": 0.4000000059604645, "roll": -1.5,
+    "yao_limit_state": 0, "temp": 0.0, "humi": 0.0, "bts_name": "2号基站", "bts_long": 0.0, "bts_lat": 0.0,
+    "bts_no": 2, "bts_group_no": 1, "bts_r": 60.0, "upstream_rate": 0, "downstream_rate": 0,
+    "standard": "NR", "plmn": 46011, "cellid": 0, "pci": 219, "rsrp": -92, "sinr": 13, "rssi": "N/A",
+}
+
+
+def legacy_map_report(msg_dict):
+    """旧版NM服务中的映射循环（每个字段都调用 get_field 和 isinstance）"""
+    model_data = {}
+    _sentinel = object()
+    for msg_key, model_field in JSON_TO_MODEL_MAP.items():
+        value = msg_dict.get(msg_key, _sentinel)
+        if value is not _sentinel:
+            if value == 'N/A':
+                value = None
+            if value is not None and isinstance(TerminalReport._meta.get_field(model_field), (models.CharField, models.TextField)):
+                value = str(value)
+            model_data[model_field] = value
+    return model_data
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    results = {}
+    for name, func in (('旧版映射循环', legacy_map_report), ('预编译转换表', map_report)):
+        best = min(timeit.repeat(lambda: func(SAMPLE_REPORT), number=number, repeat=5))
+        results[name] = best / number * 1e6
+        print(f"{name}: {results[name]:.2f} us/条")
+
+    print(f"加速比: {results['旧版映射循环'] / results['预编译转换表']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
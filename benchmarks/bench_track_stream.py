@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+轨迹接口的基准测试
+在临时 SQLite 数据库中生成一个端站一周（默认每5秒一条）的上报，对比：
+  - 旧版：.values() 整体转为列表、逐行补充字段后一次性 JsonResponse
+  - 新版：views.get_ship_track 分块读取、流式输出（StreamingHttpResponse）
+输出两者的耗时、Python 内存峰值（tracemalloc）和响应大小，并校验输出内容一致。
+
+用法:
+    python benchmarks/bench_track_stream.py [天数] [上报间隔秒数]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+# 将项目根目录添加到Python路径，使用项目配置但把数据库替换为临时 SQLite
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mbp_project import settings as project_settings
+from django.conf import settings
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_track_'), 'bench.sqlite3')
+values = {name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()}
+values['DATABASES'] = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DB_PATH}}
+values['CHANNEL_LAYERS'] = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+settings.configure(**values)
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.test import RequestFactory
+from django.utils import timezone
+from terminal_management import views
+from terminal_management.models import ShipInfo, TerminalInfo, TerminalReport
+from utils import json_codec
+
+SN = 'bench000001'
+
+
+def populate(days, interval):
+    """生成测试数据，返回 (开始时间, 结束时间, 行数)"""
+    call_command('migrate', verbosity=0)
+    ship = ShipInfo.objects.create(mmsi='412000001', ship_name='基准测试船', ship_owner='测试')
+    TerminalInfo.objects.create(sn=SN, ship=ship, ip_address='127.0.0.1', port_number=5000)
+
+    end = timezone.localtime().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    count = int((end - start).total_seconds() // interval)
+    batch = []
+    for i in range(count):
+        reported_at = start + timedelta(seconds=i * interval)
+        batch.append(TerminalReport(
+            sn=SN, report_date=reported_at.date(), report_time=reported_at.time(), reported_at=reported_at,
+            long=120.0 + i * 1e-5, lat=30.0 + i * 1e-5, yaw=float(i % 360), bts_name=f"{i // 720 % 20}号基站",
+            standard='NR', pci=i // 720 % 500, rsrp=-90 - i % 20, sinr=10 + i % 5, rssi=-60,
+        ))
+        if len(batch) == 5000:
+            TerminalReport.objects.bulk_create(batch)
+            batch = []
+    TerminalReport.objects.bulk_create(batch)
+    return start, end, count
+
+
+def legacy_track(sn, start_time, end_time):
+    """旧版视图的查询与序列化过程，返回响应内容"""
+    ship = TerminalInfo.objects.select_related('ship').get(sn=sn).ship
+    reports = TerminalReport.objects.filter(sn=sn, reported_at__range=(start_time, end_time)).order_by('-reported_at')
+    track_data = list(reports.values(*views.TRACK_FIELDS))
+    for report in track_data:
+        report['report_date'] = report['report_date'].isoformat()
+        report['report_time'] = report['report_time'].isoformat()
+        report['ship_name'] = ship.ship_name
+        report['mmsi'] = ship.mmsi
+        report['ship_owner'] = ship.ship_owner
+    return JsonResponse(track_data, safe=False).content
+
+
+def streaming_track(request):
+    """新版视图，返回响应内容"""
+    return b''.join(views.get_ship_track(request).streaming_content)
+
+
+def streaming_track_size(request):
+    """新版视图，像发送到网络一样逐块丢弃输出，只统计大小"""
+    size = 0
+    for part in views.get_ship_track(request).streaming_content:
+        size += len(part)
+    return size
+
+
+def measure(name, func, *args):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = result if isinstance(result, int) else len(result)
+    print(f"{name}: {elapsed:.2f} s, 内存峰值 {peak / 1024 / 1024:.1f} MiB, 响应 {size / 1024 / 1024:.1f} MiB")
+
+
+def main():
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    start, end, count = populate(days, interval)
+    print(f"已生成 {count} 条上报（{days} 天，每 {interval} 秒一条），分块大小 {views.TRACK_CHUNK_SIZE}")
+
+    request = RequestFactory().get('/api/get_ship_track/', {
+        'sn': SN, 'start_time': start.isoformat(), 'end_time': end.isoformat(),
+    })
+    request.user = User.objects.create_user('bench', password='bench')
+
+    measure('旧版 JsonResponse', legacy_track, SN, start, end)
+    measure('流式输出', streaming_track_size, request)
+    same = json_codec.loads(legacy_track(SN, start, end)) == json_codec.loads(streaming_track(request))
+    print(f"输出一致: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+UDP接收路径基准测试
+对比旧版“每个数据报一次 sock_recvfrom + 一个任务”的接收循环，
+与 NM_ServiceAsync 现在“一次唤醒读空socket、整批交给下游”的接收方式的吞吐（包/秒）。
+两种方式的下游都只做JSON解码，排除数据库的影响。
+
+发送端在同一事件循环中按突发（burst）发送，等接收端处理完这一突发后再发下一批，
+这样结果不受CPU核数和内核接收缓冲区大小的影响，两种方式的发送开销相同。
+
+用法:
+    python benchmarks/bench_udp_receive.py [总包数] [每次突发包数]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+# 将项目根目录添加到Python路径，并初始化Django（NM_ServiceAsync 依赖Django环境）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mbp_project.settings')
+import django
+django.setup()
+
+from acu.NM_Service_async import NM_ServiceAsync, recv_datagram_batch
+
+BENCH_ADDR = ("127.0.0.1", 59998)
+SAMPLE_REPORT = json.dumps({
+    "type": "MBP-N28 船载伺服基站", "sn": "sn000004", "op": "report", "op_sub": "state",
+    "date": "2025-09-11", "time": "00:50:53", "system_stat": 0, "wireless_network_stat": 0,
+    "long": 121.5, "lat": 31.2, "theory_yaw": 0.0, "yaw": 270.0, "pitch": 0.4, "roll": -1.5,
+    "yao_limit_state": 0, "temp": 0.0, "humi": 0.0, "bts_name": "2号基站", "bts_long": 0.0, "bts_lat": 0.0,
+    "bts_no": 2, "bts_group_no": 1, "bts_r": 60.0, "upstream_rate": 0, "downstream_rate": 0,
+    "standard": "NR", "plmn": 46011, "cellid": 0, "pci": 219, "rsrp": -92, "sinr": 13, "rssi": "N/A",
+}).encode('utf-8')
+
+
+class Counter:
+    """统计已处理的包数，达到目标时唤醒发送端"""
+
+    def __init__(self):
+        self.received = 0
+        self.target = 0
+        self.reached = asyncio.Event()
+
+    def add(self, n=1):
+        self.received += n
+        if self.received >= self.target:
+            self.reached.set()
+
+
+async def legacy_receiver(sock, counter):
+    """旧版接收循环：每个数据报 await 一次 sock_recvfrom 并创建一个任务"""
+    loop = asyncio.get_running_loop()
+
+    async def handle(data):
+        json.loads(data.decode('utf-8'))
+        counter.add()
+
+    while True:
+        data, addr = await loop.sock_recvfrom(sock, NM_ServiceAsync.MAX_BUFFER_LENGTH)
+        if data:
+            asyncio.create_task(handle(data))
+
+
+async def batched_receiver(sock, counter):
+    """现在的接收循环：可读时读空socket，整批处理"""
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(sock.fileno(), readable.set)
+    try:
+        while True:
+            await readable.wait()
+            readable.clear()
+            batch = recv_datagram_batch(sock, NM_ServiceAsync.MAX_RECV_BATCH, NM_ServiceAsync.MAX_BUFFER_LENGTH)
+            for data, addr in batch:
+                json.loads(data.decode('utf-8'))
+            if batch:
+                counter.add(len(batch))
+    finally:
+        loop.remove_reader(sock.fileno())
+
+
+async def drive(receiver, total, burst):
+    recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    recv_sock.setblocking(False)
+    recv_sock.bind(BENCH_ADDR)
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    counter = Counter()
+    task = asyncio.create_task(receiver(recv_sock, counter))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    sent = 0
+    while sent < total:
+        counter.target = sent + burst
+        counter.reached.clear()
+        for _ in range(burst):
+            send_sock.sendto(SAMPLE_REPORT, BENCH_ADDR)
+        sent += burst
+        try:
+            await asyncio.wait_for(counter.reached.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            # 内核丢包时不再等待，按实际收到的包数计算
+            pass
+    elapsed = time.perf_counter() - start
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    recv_sock.close()
+    send_sock.close()
+    return counter.received, elapsed
+
+
+def run(name, receiver, total, burst):
+    received, elapsed = asyncio.run(drive(receiver, total, burst))
+    rate = received / elapsed
+    print(f"{name}: 收到 {received}/{total} 包, {rate:,.0f} 包/秒")
+    return rate
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    burst = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    legacy = run('旧版逐包接收', legacy_receiver, total, burst)
+    batched = run('批量读空接收', batched_receiver, total, burst)
+    print(f"吞吐提升: {batched / legacy:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 // 全局变量
 var ws = null;
 let selectedSn = null;
+let subscribedSn = null;   // 当前连接上已订阅的端站
+let deltaStates = {};     // 按 "kind:sn" 缓存的端站更新完整数据，用于合并增量
 
 // 初始化函数
 function init() {
@@ -19,8 +21,10 @@ function init() {
 function initWebSocket() {
     // 创建WebSocket连接
     ws = new WebSocket(
-        'ws://' + window.location.host + '/ws/data/'
+        'ws://' + window.location.host + '/ws/data/?topics=antenna&deltas=1'
     );
+    subscribedSn = null; // 新连接没有任何订阅
+    deltaStates = {};    // 新连接从完整快照开始
 
     // 连接打开事件
     ws.onopen = function(e) {
@@ -43,6 +47,9 @@ function initWebSocket() {
             
             // 发起数据请求
             fetchLatestReport(selectedSn);
+        } else if (selectedSn) {
+            // 重连后恢复当前端站的订阅
+            subscribeTerminal(selectedSn);
         }
     };
 
@@ -50,8 +57,9 @@ function initWebSocket() {
     ws.onmessage = function(e) {
         try {
             const data = JSON.parse(e.data);
-            if (data.message) {
-                handleWebSocketMessage(data.message);
+            const message = data.message ? applyDelta(data.message) : null;
+            if (message) {
+                handleWebSocketMessage(message);
             }
         } catch (error) {
             console.error('Error parsing WebSocket message:', error);
@@ -136,6 +144,28 @@ function bindEventListeners() {
     document.getElementById('query_devices_status').addEventListener('click', () => sendControlCommand('query_device_status'));
 }
 
+// 合并字段级增量（连接时声明了 deltas=1）：带 kind 的消息为端站更新，快照直接缓存，
+// 增量（delta 为 true，只含变化的字段）合并到缓存后还原为完整消息
+function applyDelta(message) {
+    if (!message.kind) {
+        return message;
+    }
+    const sn = message.sn || (message.data && message.data.sn);
+    const key = message.kind + ':' + sn;
+    if (!message.delta) {
+        deltaStates[key] = Object.assign({}, message.data);
+        return message;
+    }
+    const previous = deltaStates[key];
+    if (!previous) {
+        // 没有对应的快照，请求服务端下次发送完整数据
+        ws.send(JSON.stringify({ 'type': 'resync', 'sns': [sn] }));
+        return null;
+    }
+    deltaStates[key] = Object.assign({}, previous, message.data);
+    return Object.assign({}, message, { delta: false, data: Object.assign({}, deltaStates[key]) });
+}
+
 // 处理WebSocket消息
 function handleWebSocketMessage(message) {
     console.log(message.type);
@@ -186,8 +216,23 @@ function handleWebSocketMessage(message) {
 
 // --- 以下函数不依赖于 WebSocket 的连接状态，可以放在 initWebSocket 外部 ---
 
+// 订阅端站的实时上报：服务端只向订阅了该端站的连接推送上报（切换端站时取消之前的订阅）
+function subscribeTerminal(sn) {
+    if (!ws || ws.readyState !== WebSocket.OPEN) {
+        return; // 连接建立后在 onopen 中订阅
+    }
+    if (subscribedSn && subscribedSn !== sn) {
+        ws.send(JSON.stringify({ 'type': 'unsubscribe', 'sns': [subscribedSn] }));
+    }
+    if (sn && sn !== subscribedSn) {
+        ws.send(JSON.stringify({ 'type': 'subscribe', 'sns': [sn] }));
+    }
+    subscribedSn = sn;
+}
+
 function fetchLatestReport(sn) {
     // 此处调用时，可以确信 WebSocket 已经连接成功
+    subscribeTerminal(sn);
     const message = {
         'type': 'get_latest_report',
         'sn': sn
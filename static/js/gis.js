@@ -1,5 +1,7 @@
 // GIS页面专用全局变量
 var ws = null;
+let subscribedSn = null;   // 当前连接上已订阅的端站
+let deltaStates = {};     // 按 "kind:sn" 缓存的端站更新完整数据，用于合并增量
 
 // 全局变量定义
 let map;
@@ -13,6 +15,7 @@ let stickyLabels = new Set(); // 使用Set来存储被用户打开（固定）
 let sidebar, toggleBtn, searchInput, shipListContainer, shipListItems;
 let timeRangeSelect, customTimeRangeDiv, startTimeInput, endTimeInput;
 let distanceSlider, distanceInput;
+let simplifyCheckbox;
 
 // 定义统一的航迹线样式常量
 const MAIN_POLYLINE_STYLE = {
@@ -50,26 +53,32 @@ function initializeDOMElements() {
     
     distanceSlider = document.getElementById('distance-slider');
     distanceInput = document.getElementById('distance-input');
+    simplifyCheckbox = document.getElementById('simplify-track-checkbox');
 }
 
 // 初始化WebSocket连接
 function initWebSocket() {
     // 创建WebSocket连接
     ws = new WebSocket(
-        'ws://' + window.location.host + '/ws/data/'
+        'ws://' + window.location.host + '/ws/data/?topics=gis&deltas=1'
     );
+    subscribedSn = null; // 新连接没有任何订阅
+    deltaStates = {};    // 新连接从完整快照开始
 
     // 连接打开事件
     ws.onopen = function(e) {
         console.log('GIS: WebSocket connection established successfully.');
+        // 订阅当前显示的端站
+        subscribeTerminal(currentSn);
     };
 
     // 接收消息事件
     ws.onmessage = function(e) {
         try {
             const data = JSON.parse(e.data);
-            if (data.message) {
-                handleWebSocketMessage(data.message);
+            const message = data.message ? applyDelta(data.message) : null;
+            if (message) {
+                handleWebSocketMessage(message);
             }
         } catch (error) {
             console.error('Error parsing WebSocket message:', error);
@@ -89,6 +98,42 @@ function initWebSocket() {
     };
 }
 
+// 订阅端站的实时上报：服务端只向订阅了该端站的连接推送上报（切换端站时取消之前的订阅）
+function subscribeTerminal(sn) {
+    if (!ws || ws.readyState !== WebSocket.OPEN) {
+        return; // 连接建立后在 onopen 中订阅
+    }
+    if (subscribedSn && subscribedSn !== sn) {
+        ws.send(JSON.stringify({ 'type': 'unsubscribe', 'sns': [subscribedSn] }));
+    }
+    if (sn && sn !== subscribedSn) {
+        ws.send(JSON.stringify({ 'type': 'subscribe', 'sns': [sn] }));
+    }
+    subscribedSn = sn;
+}
+
+// 合并字段级增量（连接时声明了 deltas=1）：带 kind 的消息为端站更新，快照直接缓存，
+// 增量（delta 为 true，只含变化的字段）合并到缓存后还原为完整消息
+function applyDelta(message) {
+    if (!message.kind) {
+        return message;
+    }
+    const sn = message.sn || (message.data && message.data.sn);
+    const key = message.kind + ':' + sn;
+    if (!message.delta) {
+        deltaStates[key] = Object.assign({}, message.data);
+        return message;
+    }
+    const previous = deltaStates[key];
+    if (!previous) {
+        // 没有对应的快照，请求服务端下次发送完整数据
+        ws.send(JSON.stringify({ 'type': 'resync', 'sns': [sn] }));
+        return null;
+    }
+    deltaStates[key] = Object.assign({}, previous, message.data);
+    return Object.assign({}, message, { delta: false, data: Object.assign({}, deltaStates[key]) });
+}
+
 // 处理WebSocket消息
 function handleWebSocketMessage(message) {
     console.log("GIS: Received message:", message);
@@ -418,12 +463,14 @@ function getCurrentTimeRange() {
 }
 
 // 获取轨迹数据并绘制
-async function fetchAndDrawPath(sn, ifzoom = false) {
-    console.log(`--- fetchAndDrawPath called for SN: ${sn}. ifzoom: ${ifzoom} ---`);
+// keepView 为 true 时不调整地图视野（缩放级别变化后按新级别重新抽稀时使用）
+async function fetchAndDrawPath(sn, ifzoom = false, keepView = false) {
+    console.log(`--- fetchAndDrawPath called for SN: ${sn}. ifzoom: ${ifzoom}, keepView: ${keepView} ---`);
     
     clearAllShipOverlays(); // 清除所有船只的轨迹
 
     currentSn = sn; // 更新当前显示的SN
+    subscribeTerminal(sn); // 只接收当前显示的端站的实时上报
     if (!sn) {
         console.error("SN is required.");
         return;
@@ -436,7 +483,12 @@ async function fetchAndDrawPath(sn, ifzoom = false) {
     }
 
     const minDistance = parseInt(distanceInput.value, 10);
-    const apiUrl = `/api/get_track/?sn=${sn}&start_time=${startTime.toISOString()}&end_time=${endTime.toISOString()}`;
+    let apiUrl = `/api/get_track/?sn=${sn}&start_time=${startTime.toISOString()}&end_time=${endTime.toISOString()}`;
+    // 勾选“抽稀轨迹”时由服务端按当前缩放级别抽稀，只返回在该级别下可见的拐点和基站/PCI/系统状态变化点；
+    // 默认返回全部上报，标记点只按最小距离筛选。缩放级别变化后会按新级别重新获取（见 zoomend 监听）
+    if (simplifyCheckbox && simplifyCheckbox.checked) {
+        apiUrl += `&zoom=${map.getZoom()}`;
+    }
 
     try {
         const response = await fetch(apiUrl);
@@ -498,7 +550,7 @@ async function fetchAndDrawPath(sn, ifzoom = false) {
             };
         }
 
-        if (bmapPoints.length > 0) {
+        if (bmapPoints.length > 0 && !keepView) {
             // 首次进入网页时，采用setViewport来同时调整地图中心以及缩放等级
             if(ifzoom) {
                 map.setViewport(bmapPoints);
@@ -553,6 +605,14 @@ function setupEventListeners() {
     });
     
     distanceSlider.addEventListener('input', () => { distanceInput.value = distanceSlider.value; });
+    simplifyCheckbox.addEventListener('change', () => { if (currentSn) fetchAndDrawPath(currentSn, false, true); });
+    // 抽稀的轨迹与缩放级别有关：缩放结束后（包括 setViewport 引起的缩放）按新级别重新获取
+    let zoomRefetchTimer = null;
+    map.addEventListener('zoomend', () => {
+        if (!simplifyCheckbox.checked || !currentSn) return;
+        clearTimeout(zoomRefetchTimer);
+        zoomRefetchTimer = setTimeout(() => fetchAndDrawPath(currentSn, false, true), 300);
+    });
     distanceInput.addEventListener('input', () => { distanceSlider.value = distanceInput.value; });
 
     function handleConfirmClick() {
@@ -600,7 +660,7 @@ function initializeDefaultShip() {
         if (defaultSn) {
             firstShipElement.classList.add('active');
             currentSn = defaultSn;
-            fetchAndDrawPath(defaultSn, false, true);
+            fetchAndDrawPath(defaultSn);
         }
     }
 }
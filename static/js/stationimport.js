@@ -17,9 +17,9 @@ function init() {
 
 // 初始化WebSocket连接
 function initWebSocket() {
-    // 创建WebSocket连接
+    // 创建WebSocket连接（本页只用于控制指令，不声明任何推送主题）
     ws = new WebSocket(
-        'ws://' + window.location.host + '/ws/data/'
+        'ws://' + window.location.host + '/ws/data/?topics='
     );
 
     // 连接打开事件
@@ -62,6 +62,8 @@ function bindEventListeners() {
     document.getElementById('btsMasterCheckbox').addEventListener('change', toggleAllBts);
     // 更新基站信息按钮
     document.getElementById('updateBtsInfoBtn').addEventListener('click', updateBtsInfo);
+    // 按端站位置选择基站
+    document.getElementById('selectByPositionBtn').addEventListener('click', selectBtsByTerminalPosition);
     // 按地区选择基站
     document.querySelectorAll('.region-select-item').forEach(item => {
         item.addEventListener('click', function(e) {
@@ -162,6 +164,31 @@ function selectBtsByRegion(region) {
     updateMasterCheckboxState('btsMasterCheckbox', '.bts-checkbox');
 }
 
+// 按端站最新位置选择基站：选中覆盖该位置的基站，没有覆盖基站时选中最近的基站
+async function selectBtsByTerminalPosition() {
+    if (!currentTerminalSN) {
+        alert('请先选择端站');
+        return;
+    }
+    try {
+        const response = await fetch(`/api/get_nearby_base_stations/?sn=${encodeURIComponent(currentTerminalSN)}&k=1`);
+        const data = await response.json();
+        if (!response.ok) {
+            alert(data.error || '查询附近基站失败');
+            return;
+        }
+        const stations = data.covering.length > 0 ? data.covering : data.nearest;
+        const btsIds = new Set(stations.map(station => station.bts_id));
+        document.querySelectorAll('.bts-checkbox').forEach(checkbox => {
+            checkbox.checked = btsIds.has(checkbox.getAttribute('data-bts-id'));
+        });
+        updateMasterCheckboxState('btsMasterCheckbox', '.bts-checkbox');
+        console.log(`端站 ${currentTerminalSN} 位置 (${data.long}, ${data.lat}) 覆盖基站:`, data.covering, '最近基站:', data.nearest);
+    } catch (error) {
+        console.error('查询附近基站失败:', error);
+    }
+}
+
 // 切换所有基站选择状态
 function toggleAllBts() {
     const isChecked = document.getElementById('btsMasterCheckbox').checked;
@@ -17,9 +17,9 @@ function init() {
 
 // 初始化WebSocket连接
 function initWebSocket() {
-    // 创建WebSocket连接
+    // 创建WebSocket连接（本页只用于控制指令，不声明任何推送主题）
     ws = new WebSocket(
-        'ws://' + window.location.host + '/ws/data/'
+        'ws://' + window.location.host + '/ws/data/?topics='
     );
 
     // 连接打开事件
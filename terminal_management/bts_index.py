@@ -0,0 +1,200 @@
+# terminal_management/bts_index.py
+
+# 基站的进程内空间索引
+# BaseStationInfo 中的经纬度和覆盖距离没有空间索引，“哪些基站覆盖这艘船”“最近的几个基站”只能全表读出后逐个计算距离。
+# 索引一次性载入全部基站，按经纬度划分为 cell_degrees 大小的网格：
+#   - 位置网格：每个基站登记在其所在的格子中，用于“最近的 k 个基站”（由近及远逐圈搜索）和“矩形范围内的基站”
+#   - 覆盖网格：每个基站登记在其覆盖圆的外接矩形经过的所有格子中，“覆盖某点的基站”只需查一个格子
+# 候选基站最后都用球面距离精确过滤。距离单位为公里，与 coverage_distance 一致。
+# 缺少经纬度的基站不进入索引；缺少覆盖距离的基站不参与覆盖查询。不处理跨越180°经线的情况。
+# 失效机制与端站注册表相同（见 registry.VersionedCache）：signals.py 中基站的 post_save / post_delete
+# 在事务提交后调用 invalidate()，下次查询时重建。索引中的模型实例由所有调用方共享，只能读取。
+
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+from config import get_config
+from utils import gl_logger
+from .models import BaseStationInfo
+from .registry import VersionedCache, DEFAULT_VERSION_CHECK_INTERVAL, DEFAULT_MAX_AGE
+
+config = get_config()
+
+# 空间索引配置
+DEFAULT_CELL_DEGREES = config.get('bts_index_config.cell_degrees', 0.5)    # 网格大小（度），约为常见覆盖半径的量级
+
+VERSION_KEY = "mbp:bts_index:version"
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def haversine_km(long1, lat1, long2, lat2) -> float:
+    """两点间的球面距离（公里）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(long2 - long1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class _Entry:
+    """索引中的一个基站"""
+
+    __slots__ = ('station', 'long', 'lat', 'coverage')
+
+    def __init__(self, station: BaseStationInfo):
+        self.station = station
+        self.long = station.longitude
+        self.lat = station.latitude
+        self.coverage = station.coverage_distance
+
+
+class BaseStationIndex(VersionedCache):
+    """
+    基站的网格空间索引
+    - covering()：覆盖某点的基站（距离不超过各自的覆盖距离）
+    - nearest()：距某点最近的 k 个基站
+    - in_bbox()：经纬度矩形范围内的基站
+    - invalidate()：标记失效并通知其他进程
+    """
+
+    version_key = VERSION_KEY
+
+    def __init__(self, cell_degrees=DEFAULT_CELL_DEGREES,
+                 version_check_interval=DEFAULT_VERSION_CHECK_INTERVAL, max_age=DEFAULT_MAX_AGE):
+        super().__init__(version_check_interval, max_age)
+        self.cell_degrees = cell_degrees
+        self._entries: List[_Entry] = []
+        self._by_cell: Dict[Tuple[int, int], List[_Entry]] = {}
+        self._coverage_by_cell: Dict[Tuple[int, int], List[_Entry]] = {}
+        self._bounds = None     # 位置网格中有基站的格子范围 (min_x, min_y, max_x, max_y)
+
+    # --- 查询 ---
+
+    def covering(self, long, lat) -> List[Tuple[BaseStationInfo, float]]:
+        """覆盖 (long, lat) 的基站及距离（公里），按距离由近到远排列"""
+        self._ensure_fresh()
+        results = []
+        for entry in self._coverage_by_cell.get(self._cell(long, lat), ()):
+            distance = haversine_km(long, lat, entry.long, entry.lat)
+            if distance <= entry.coverage:
+                results.append((entry.station, distance))
+        results.sort(key=lambda item: item[1])
+        return results
+
+    def nearest(self, long, lat, k=1, max_distance=None) -> List[Tuple[BaseStationInfo, float]]:
+        """距 (long, lat) 最近的 k 个基站及距离（公里），按距离由近到远排列；max_distance 限制最远距离"""
+        self._ensure_fresh()
+        if k <= 0 or self._bounds is None:
+            return []
+        center_x, center_y = self._cell(long, lat)
+        min_x, min_y, max_x, max_y = self._bounds
+        last_ring = max(center_x - min_x, max_x - center_x, center_y - min_y, max_y - center_y)
+
+        heap = []   # 大小为 k 的最大堆：(-距离, 序号, 基站)
+        for ring in range(last_ring + 1):
+            for cell in self._ring_cells(center_x, center_y, ring):
+                for entry in self._by_cell.get(cell, ()):
+                    distance = haversine_km(long, lat, entry.long, entry.lat)
+                    if max_distance is not None and distance > max_distance:
+                        continue
+                    item = (-distance, id(entry), entry.station)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif distance < -heap[0][0]:
+                        heapq.heapreplace(heap, item)
+            # 更外圈的基站不会比该下界更近
+            bound = self._outside_distance(long, lat, center_x, center_y, ring)
+            if len(heap) == k and -heap[0][0] <= bound:
+                break
+            if max_distance is not None and bound > max_distance:
+                break
+        return [(station, -negative) for negative, _, station in sorted(heap, reverse=True)]
+
+    def in_bbox(self, min_long, min_lat, max_long, max_lat) -> List[BaseStationInfo]:
+        """经纬度矩形范围内（含边界）的基站，按基站ID排列"""
+        self._ensure_fresh()
+        low_x, low_y = self._cell(min_long, min_lat)
+        high_x, high_y = self._cell(max_long, max_lat)
+        if (high_x - low_x + 1) * (high_y - low_y + 1) > len(self._by_cell):
+            # 范围比有基站的格子数还大时，直接遍历全部基站
+            candidates = self._entries
+        else:
+            candidates = [entry for x in range(low_x, high_x + 1) for y in range(low_y, high_y + 1)
+                          for entry in self._by_cell.get((x, y), ())]
+        stations = [entry.station for entry in candidates
+                    if min_long <= entry.long <= max_long and min_lat <= entry.lat <= max_lat]
+        stations.sort(key=lambda station: station.bts_id)
+        return stations
+
+    # --- 内部实现 ---
+
+    def _cell(self, long, lat) -> Tuple[int, int]:
+        return (math.floor(long / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    @staticmethod
+    def _ring_cells(center_x, center_y, ring):
+        """以 (center_x, center_y) 为中心、第 ring 圈的格子"""
+        if ring == 0:
+            yield (center_x, center_y)
+            return
+        for x in range(center_x - ring, center_x + ring + 1):
+            yield (x, center_y - ring)
+            yield (x, center_y + ring)
+        for y in range(center_y - ring + 1, center_y + ring):
+            yield (center_x - ring, y)
+            yield (center_x + ring, y)
+
+    def _outside_distance(self, long, lat, center_x, center_y, ring) -> float:
+        """(long, lat) 到前 ring 圈格子所组成的正方形之外任意一点的最短距离（公里）"""
+        size = self.cell_degrees
+        west, east = (center_x - ring) * size, (center_x + ring + 1) * size
+        south, north = (center_y - ring) * size, (center_y + ring + 1) * size
+        lat_distance = min(lat - south, north - lat) * KM_PER_DEGREE
+        # 到经线（大圆）的距离：sin(d) = cos(φ)·sin(Δλ)
+        d_lambda = math.radians(min(long - west, east - long, 90.0))
+        long_distance = EARTH_RADIUS_KM * math.asin(math.cos(math.radians(lat)) * math.sin(d_lambda))
+        return min(lat_distance, long_distance)
+
+    def _coverage_cells(self, entry: _Entry):
+        """覆盖圆的外接矩形经过的格子"""
+        d_lat = entry.coverage / KM_PER_DEGREE
+        max_lat = min(abs(entry.lat) + d_lat, 89.0)
+        d_long = min(entry.coverage / (KM_PER_DEGREE * math.cos(math.radians(max_lat))), 180.0)
+        low_x, low_y = self._cell(entry.long - d_long, entry.lat - d_lat)
+        high_x, high_y = self._cell(entry.long + d_long, entry.lat + d_lat)
+        for x in range(low_x, high_x + 1):
+            for y in range(low_y, high_y + 1):
+                yield (x, y)
+
+    def _load(self, version):
+        generation = self._generation
+        entries = [_Entry(station) for station in BaseStationInfo.objects.all()
+                   if station.longitude is not None and station.latitude is not None]
+
+        by_cell: Dict[Tuple[int, int], List[_Entry]] = {}
+        coverage_by_cell: Dict[Tuple[int, int], List[_Entry]] = {}
+        for entry in entries:
+            by_cell.setdefault(self._cell(entry.long, entry.lat), []).append(entry)
+            if entry.coverage is not None and entry.coverage > 0:
+                for cell in self._coverage_cells(entry):
+                    coverage_by_cell.setdefault(cell, []).append(entry)
+
+        self._entries = entries
+        self._by_cell = by_cell
+        self._coverage_by_cell = coverage_by_cell
+        if by_cell:
+            xs = [x for x, _ in by_cell]
+            ys = [y for _, y in by_cell]
+            self._bounds = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            self._bounds = None
+        self._mark_loaded(generation, version)
+        gl_logger.debug(f"基站空间索引已载入: {len(entries)} 个基站, {len(by_cell)} 个位置格子, "
+                        f"{len(coverage_by_cell)} 个覆盖格子 (version={version})")
+
+
+# 进程内唯一的基站索引实例
+bts_index = BaseStationIndex()
@@ -0,0 +1,79 @@
+# terminal_management/coalescer.py
+
+# 端站更新的合并推送（latest-wins）
+# 端站每秒多次上报或回放积压数据时，每条上报都会给每个页面推送一帧，浏览器随之重绘。
+# 每个 WebSocket 连接持有一个 UpdateCoalescer：同一端站同一类帧在等待发送期间只保留最新的一帧，
+# 连接按 max_rate（Hz）限速批量发送，被覆盖的中间帧按主题计数（collapsed_updates）。
+# 帧的编码在发布时完成（见 outbox.py），这里只决定发送哪些、何时发送；实际发送（含增量编码）由连接的 send 回调完成。
+
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+
+from utils import gl_logger
+
+# 被合并掉的中间帧数（本进程累计，按主题统计）
+collapsed_updates = Counter()
+
+
+class UpdateCoalescer:
+    """
+    单个连接的合并发送器
+    - push()：加入某端站一次更新的各帧，(端站, 帧类型) 相同的未发送帧被替换
+    - discard()：丢弃某端站未发送的帧（取消订阅时）
+    - close()：取消定时发送（连接断开时）
+    max_rate 为每秒最多发送的批次数，不大于0时不合并、直接发送。
+    """
+
+    def __init__(self, send: Callable[[str, list], Awaitable[None]], max_rate: float):
+        self._send = send
+        self.interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        self._pending: Dict[Tuple[str, str], list] = {}    # (端站, 帧类型) -> 帧，按首次加入的顺序发送
+        self._last_flush = float('-inf')
+        self._timer = None
+        self.collapsed = Counter()
+
+    async def push(self, sn: str, frames: Iterable[list]):
+        """加入某端站一次更新的各帧（格式见 outbox.py）；同一次更新的帧总在同一批发出"""
+        if not self.interval:
+            for frame in frames:
+                await self._send(sn, frame)
+            return
+        for frame in frames:
+            topic, kind = frame[0], frame[1]
+            key = (sn, kind)
+            if key in self._pending:
+                self.collapsed[topic] += 1
+                collapsed_updates[topic] += 1
+            self._pending[key] = frame
+        if not self._pending or self._timer is not None:
+            return
+        delay = self._last_flush + self.interval - asyncio.get_running_loop().time()
+        if delay <= 0:
+            await self._flush()
+        else:
+            self._timer = asyncio.create_task(self._flush_later(delay))
+
+    def discard(self, sn: str):
+        for key in [key for key in self._pending if key[0] == sn]:
+            del self._pending[key]
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending.clear()
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self._timer = None
+        try:
+            await self._flush()
+        except Exception as e:
+            gl_logger.error(f"合并推送发送失败: {e}", exc_info=True)
+
+    async def _flush(self):
+        pending, self._pending = self._pending, {}
+        self._last_flush = asyncio.get_running_loop().time()
+        for (sn, _), frame in pending.items():
+            await self._send(sn, frame)
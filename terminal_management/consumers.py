@@ -1,6 +1,5 @@
 # terminal_management/consumers.py
 
-import json
 import uuid
 import redis
 import os
@@ -8,10 +7,30 @@ import base64
 from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .services import get_latest_report_by_sn, get_latest_report_for_gis_by_sn
-from utils import gl_logger
+from .services import get_latest_report_by_sn
+from .coalescer import UpdateCoalescer
+from .deltas import DeltaTracker
+from .groups import DATA_UPDATES_GROUP, FLEET_GROUP, ALL_TOPICS, REPORT_TOPICS, TOPIC_INVENTORY, report_group
+from utils import gl_logger, json_codec
+from config import get_config
 
 import asyncio
+from collections import Counter
+from urllib.parse import parse_qs
+
+config = get_config()
+
+# NM_Service 负责控制指令的超时通知，本地等待在指令超时时间之外再多等的兜底时间（秒）
+REPLY_TIMEOUT_GRACE = 5.0
+
+# 每个连接最多订阅的端站数（订阅全部端站请使用船队订阅）
+MAX_SUBSCRIPTIONS = config.get('websocket_config.max_subscriptions', 200)
+
+# 每个连接推送端站更新的最大频率（Hz），期间同一端站只推送最新的一帧；0 表示不合并
+MAX_UPDATE_RATE = config.get('websocket_config.max_update_rate', 2.0)
+
+# 因连接未声明对应主题而丢弃的帧数（本进程累计，按主题统计）
+dropped_frames = Counter()
 
 # --- 创建一个专用于发布的、标准的 Redis 连接 ---
 try:
@@ -24,15 +43,38 @@ except Exception as e:
     gl_logger.error(f"Consumer: 连接到 Redis 失败，控制功能将不可用: {e}")
 
 class DataConsumer(AsyncWebsocketConsumer):
+    """
+    前端页面的 WebSocket 连接。
+    建立连接时通过查询参数声明需要的主题（见 groups.py），如 /ws/data/?topics=antenna,gis；
+    不带 topics 参数时接收全部主题，topics 为空时只用于控制指令。未声明的主题不加入对应的组，
+    收到的未声明主题的帧直接丢弃并按主题计数（dropped_frames）。
+    声明了 inventory 的连接接收船舶/端站/基站的增删改；声明了 antenna 或 gis 的连接可以订阅端站上报：
+      {"type": "subscribe", "sns": ["sn1", ...]}      订阅指定端站
+      {"type": "unsubscribe", "sns": ["sn1", ...]}    取消订阅
+      {"type": "subscribe", "fleet": true}             订阅全部端站（船队总览），"unsubscribe" 同理取消
+    端站更新按 MAX_UPDATE_RATE 限速推送，同一端站在间隔内的多次更新只推送最新的一次（见 coalescer.py）。
+    查询参数带 deltas=1 时端站更新只发送变化的字段（见 deltas.py），客户端可以发送
+      {"type": "resync", "sns": ["sn1", ...]}          要求下次发送完整快照（不带 sns 时为全部端站）
+    每次订阅变更后回复 subscription_state 消息，列出当前订阅。
+    """
+
     async def connect(self):
-        self.room_group_name = 'data_updates'
+        self.room_group_name = DATA_UPDATES_GROUP
         # 初始化一个集合用于追踪后台任务
         self.background_tasks = set()
-
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        # 订阅的端站；订阅船队时暂时退出各端站的组，避免同一条上报收到两次
+        self.subscribed_sns = set()
+        self.fleet = False
+        self.topics = self._parse_topics()
+        self.dropped = Counter()
+        self.coalescer = UpdateCoalescer(self._send_frame, MAX_UPDATE_RATE)
+        self.deltas = DeltaTracker() if self._query_flag('deltas') else None
+
+        if TOPIC_INVENTORY in self.topics:
+            await self.channel_layer.group_add(
+                self.room_group_name,
+                self.channel_name
+            )
         self.pending_replies = {}   # 用于存放等待中请求的 Future 对象，键为request_id
         await self.accept()
         gl_logger.debug(f"WebSocket 链接已建立: {self.channel_name}")
@@ -41,22 +83,56 @@ class DataConsumer(AsyncWebsocketConsumer):
         # 在断开连接时，取消所有正在运行的后台任务
         for task in self.background_tasks:
             task.cancel()
-
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        self.coalescer.close()
+
+        if TOPIC_INVENTORY in self.topics:
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
+        for group in self._report_groups():
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if self.dropped:
+            gl_logger.debug(f"连接 {self.channel_name} 丢弃的未声明主题帧数: {dict(self.dropped)}")
+        if self.coalescer.collapsed:
+            gl_logger.debug(f"连接 {self.channel_name} 合并掉的中间更新数: {dict(self.coalescer.collapsed)}")
+        if self.deltas is not None:
+            gl_logger.debug(f"连接 {self.channel_name} 增量推送统计: {self.deltas.stats}")
         gl_logger.debug(f"WebSocket 链接已关闭: {self.channel_name} with code {close_code}")
 
+    def _query(self):
+        return parse_qs(self.scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+
+    def _query_flag(self, name):
+        """查询参数中的开关，1 / true / yes 为开启"""
+        values = self._query().get(name)
+        return bool(values) and values[-1].strip().lower() in ('1', 'true', 'yes')
+
+    def _parse_topics(self):
+        """从连接的查询参数中读取声明的主题；没有 topics 参数时返回全部主题"""
+        query = self._query()
+        if 'topics' not in query:
+            return ALL_TOPICS
+        topics = {topic.strip() for value in query['topics'] for topic in value.split(',') if topic.strip()}
+        unknown = topics - ALL_TOPICS
+        if unknown:
+            gl_logger.warning(f"连接 {self.channel_name} 声明了未知的主题 {sorted(unknown)}，已忽略")
+        return frozenset(topics & ALL_TOPICS)
+
     # 从前端接收消息
     async def receive(self, text_data):
         gl_logger.debug(f"接收到前端消息: {text_data}")
-        data = json.loads(text_data)
+        data = json_codec.loads(text_data)
         message_type = data.get('type')
         task = None
 
         # 使用 asyncio.create_task 在后台执行任务，避免阻塞 receive 方法
-        if message_type == 'get_latest_report':
+        if message_type in ('subscribe', 'unsubscribe'):
+            # 订阅变更直接执行，保证按消息顺序生效
+            await self.handle_subscription(data, message_type == 'subscribe')
+        elif message_type == 'resync':
+            self.handle_resync(data)
+        elif message_type == 'get_latest_report':
             task = asyncio.create_task(self.handle_get_latest_report(data))
         elif message_type == 'control_command':
             task = asyncio.create_task(self.handle_control_command(data))
@@ -68,6 +144,69 @@ class DataConsumer(AsyncWebsocketConsumer):
             self.background_tasks.add(task)
             task.add_done_callback(self.background_tasks.discard)
 
+    def _report_groups(self):
+        """当前实际加入的上报组；没有声明 antenna / gis 主题时不加入任何上报组"""
+        if not self.topics & REPORT_TOPICS:
+            return []
+        if self.fleet:
+            return [FLEET_GROUP]
+        return [report_group(sn) for sn in self.subscribed_sns]
+
+    async def handle_subscription(self, data, subscribe):
+        """处理 subscribe / unsubscribe 消息，调整加入的上报组"""
+        sns = data.get('sns') or []
+        if isinstance(sns, str):
+            sns = [sns]
+        sns = {str(sn) for sn in sns if sn}
+        fleet = bool(data.get('fleet'))
+
+        before = set(self._report_groups())
+        if subscribe:
+            room = MAX_SUBSCRIPTIONS - len(self.subscribed_sns)
+            new_sns = sns - self.subscribed_sns
+            if len(new_sns) > room:
+                gl_logger.warning(f"连接 {self.channel_name} 订阅的端站超过上限 {MAX_SUBSCRIPTIONS}，多余的订阅被忽略")
+                new_sns = set(sorted(new_sns)[:max(room, 0)])
+            self.subscribed_sns |= new_sns
+            self.fleet = self.fleet or fleet
+            # 新订阅的端站先发送完整快照
+            if self.deltas is not None:
+                self.deltas.reset(None if fleet else new_sns)
+        else:
+            self.subscribed_sns -= sns
+            if fleet:
+                self.fleet = False
+            if not self.fleet:
+                # 已取消订阅的端站不再推送尚未发出的更新，重新订阅时发送完整快照
+                removed = set(sns)
+                if self.deltas is not None:
+                    removed |= self.deltas.tracked_sns() - self.subscribed_sns
+                for sn in removed:
+                    self.coalescer.discard(sn)
+                if self.deltas is not None:
+                    self.deltas.reset(removed)
+        after = set(self._report_groups())
+
+        for group in before - after:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        for group in after - before:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+        await self.send_to_client('subscription_state', {
+            'sns': sorted(self.subscribed_sns),
+            'fleet': self.fleet,
+            'topics': sorted(self.topics),
+        })
+
+    def handle_resync(self, data):
+        """处理 resync 消息：指定端站（默认全部）的下一次更新发送完整快照"""
+        if self.deltas is None:
+            return
+        sns = data.get('sns')
+        if isinstance(sns, str):
+            sns = [sns]
+        self.deltas.reset({str(sn) for sn in sns} if sns else None)
+
     # 专门处理获取最新上报数据的请求
     async def handle_get_latest_report(self, data):
         sn = data.get('sn')
@@ -266,20 +405,35 @@ class DataConsumer(AsyncWebsocketConsumer):
                 gl_logger.error(f"收到了一个未知的控制模块: {module}")
                 raise ValueError("未知的控制模块")
 
+            # 为不同类型的命令设置不同的超时时间，由 NM_Service 负责计时并在超时后通知
+            expect_reply = True
+            if module == 'software_upgrade':
+                # 升级命令没有响应，不需要等待
+                expect_reply = False
+                timeout = None
+            elif module in ['upload_file_init', 'upload_file_chunk', 'upload_file_complete']:
+                # 文件上传相关命令，设置较长的超时时间
+                timeout = 30.0
+            elif module in ['upload_file_list', 'upload_file_delete']:
+                # 文件列表查询和删除命令
+                timeout = 15.0
+            else:
+                # 其他命令
+                timeout = 10.0
+
             command_to_send = {
                 "ip": data.get('ip'),
                 "port": int(data.get('port')),
                 "reply_channel": reply_channel_name,
+                "timeout": timeout,
+                "expect_reply": expect_reply,
                 "payload": payload
             }
 
-            redis_publisher.publish("udp-command", json.dumps(command_to_send))
+            redis_publisher.publish("udp-command", json_codec.dumps(command_to_send))
             gl_logger.debug(f"已向 Redis 'udp-command' 频道发布指令: {command_to_send}")
 
-            # 等待 Future 被设置结果，设置10秒超时，对于更新功能设置60秒超时
-            # 为不同类型的命令设置不同的超时时间
-            if module == 'software_upgrade':
-                # 升级命令没有响应，不需要等待
+            if not expect_reply:
                 # 将前端的request_id传递回客户端
                 frontend_request_id = data.get('frontend_request_id')
                 await self.send_to_client('control_response', {
@@ -288,17 +442,10 @@ class DataConsumer(AsyncWebsocketConsumer):
                     'frontend_request_id': frontend_request_id
                 })
                 return
-            elif module in ['upload_file_init', 'upload_file_chunk', 'upload_file_complete']:
-                # 文件上传相关命令，设置较长的超时时间
-                timeout = 30.0
-            elif module in ['upload_file_list', 'upload_file_delete']:
-                # 文件列表查询和删除命令
-                timeout = 15.0
-            else:
-                # 其他命令
-                timeout = 10.0
             
-            response_dict = await asyncio.wait_for(future, timeout=timeout)
+            # 正常情况下超时由 NM_Service 通过 udp_timeout 通知；
+            # 本地再留一段余量作为兜底，防止 NM_Service 未运行时永久等待
+            response_dict = await asyncio.wait_for(future, timeout=timeout + REPLY_TIMEOUT_GRACE)
             
             # 将前端的request_id传递回客户端
             frontend_request_id = data.get('frontend_request_id')
@@ -338,7 +485,7 @@ class DataConsumer(AsyncWebsocketConsumer):
         message_str = event['message']
         gl_logger.debug(f"收到来自 NM_Service 的UDP回复: {message_str}")
         
-        response_data = json.loads(message_str)
+        response_data = json_codec.loads(message_str)
         # 使用 request_id 来查找 future
         request_id = response_data.get('request_id')
         
@@ -349,59 +496,58 @@ class DataConsumer(AsyncWebsocketConsumer):
             gl_logger.warning(f"收到了一个未知或已超时的请求的回复, request_id: {request_id}")
 
 
+    # 用于接收 NM_Service 超时通知的处理器
+    async def udp_timeout(self, event):
+        request_id = event.get('request_id')
+        gl_logger.debug(f"收到来自 NM_Service 的超时通知, request_id: {request_id}")
+
+        future = self.pending_replies.get(request_id)
+        if future and not future.done():
+            future.set_exception(asyncio.TimeoutError())
+
     # 封装一个向客户端发送消息的辅助函数
     async def send_to_client(self, msg_type, data):
         message_to_send = {'message': {'type': msg_type, **data}}
-        gl_logger.debug(f"Sending message to client: {json.dumps(message_to_send)}")
-        await self.send(text_data=json.dumps(message_to_send))
+        text_data = json_codec.dumps(message_to_send)
+        gl_logger.debug(f"Sending message to client: {text_data}")
+        await self.send(text_data=text_data)
 
     # 从 channel layer 接收广播消息并推送给前端
     async def send_update(self, event):
         """
         接收来自signals的广播。
-        1. 转发旧格式消息给 antenna 等页面。
-        2. 获取并发送新格式的GIS专属消息。
+        每一帧都已在 signals 中编码好并标明主题（所有连接共用同一份文本，不访问数据库），
+        这里只转发连接声明的主题，其余丢弃并计数；端站更新交给 coalescer 限速合并。
         """
-
-        original_message = event['message']
-        sn = original_message.get('sn')
-        if not sn:
-            return
-        
-        # 1. 转发与之前完全兼容的消息，供 antenna 等页面使用
-        success, antenna_report = await database_sync_to_async(get_latest_report_by_sn)(sn=sn)
-        antenna_report_dict = {}
-        for field in antenna_report._meta.fields:
-            antenna_report_dict[field.name] = str(getattr(antenna_report, field.name))
-            
-        await self.send(text_data=json.dumps({'message': original_message}))
-        if success:
-            # 构造antenna专属的新消息
-            message_for_antenna = {
-                'type': 'latest_report_data', # 使用新的、专属的类型
-                'data': antenna_report_dict
-            }
-            gl_logger.debug(f"正在向antenna页面发送广播更新: {json.dumps({'message': message_for_antenna})}")
-            # 直接发送，不经过 send_to_client 的额外包装
-            await self.send(text_data=json.dumps({'message': message_for_antenna}))
-        else:
-            gl_logger.warning(f"send_update 中为GIS获取数据失败 (SN: {sn}): {antenna_report_dict}")
-
-
-        # 2. 调用为GIS准备的service函数，获取包含MMSI等信息的丰富字典
-        success, gis_report_dict = await database_sync_to_async(get_latest_report_for_gis_by_sn)(sn)
-        
-        if success:
-            # 构造GIS专属的新消息
-            message_for_gis = {
-                'type': 'gis_update_data', # 使用新的、专属的类型
-                'data': gis_report_dict
-            }
-            gl_logger.debug(f"正在向GIS页面发送专属广播更新: {json.dumps({'message': message_for_gis})}")
-            # 直接发送，不经过 send_to_client 的额外包装
-            await self.send(text_data=json.dumps({'message': message_for_gis}))
-        else:
-            gl_logger.warning(f"send_update 中为GIS获取数据失败 (SN: {sn}): {gis_report_dict}")
+        # 采集服务的批量推送一个事件包含多个端站更新（见 outbox.py），其余广播只有一个
+        updates = event.get('updates')
+        if updates is None:
+            updates = [event]
+        for update in updates:
+            frames = []
+            for frame in update['frames']:
+                topic = frame[0]
+                if topic in self.topics:
+                    frames.append(frame)
+                else:
+                    self.dropped[topic] += 1
+                    dropped_frames[topic] += 1
+
+            sn = update.get('sn')
+            if sn:
+                await self.coalescer.push(sn, frames)
+            else:
+                for frame in frames:
+                    await self.send(text_data=frame[2])
+
+    async def _send_frame(self, sn, frame):
+        """发送一个端站更新帧，开启增量时只发送变化的字段"""
+        _, kind, text, data = frame
+        if self.deltas is not None:
+            text = self.deltas.encode(sn, kind, text, data)
+            if text is None:
+                return
+        await self.send(text_data=text)
 
     async def udp_message(self, event):
         await self.channel_layer.send(event['reply_channel'], {
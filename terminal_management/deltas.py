@@ -0,0 +1,74 @@
+# terminal_management/deltas.py
+
+# 端站更新的字段级增量推送
+# antenna / GIS 页面的每条更新都携带约30个字段，其中 type、bts_name、plmn、standard、cellid、船舶信息等很少变化。
+# 连接建立时声明 deltas=1（如 /ws/data/?topics=antenna&deltas=1）后，DeltaTracker 按 (端站, 帧类型) 记录
+# 该连接上次发出的完整数据，之后只发送变化的字段：
+#   快照：与不使用增量时相同的共享文本帧，消息中带 kind（帧类型），不带 delta
+#   增量：{'message': {'type': ..., 'kind': ..., 'sn': ..., 'delta': true, 'data': {变化的字段}}}，消失的字段值为 null
+# 订阅端站、取消订阅或客户端发送 resync 时清除对应记录，下一次更新重新发送快照。前端按 kind 和 sn 合并增量。
+# 字段完全没有变化的更新不发送。
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from utils import json_codec
+
+# 帧类型对应的消息类型（见 outbox.sn_frames）
+MESSAGE_TYPES = {
+    'report': 'latest_report_data',
+    'antenna': 'latest_report_data',
+    'gis': 'gis_update_data',
+}
+
+
+def diff(previous: dict, current: dict) -> dict:
+    """current 相对 previous 变化的字段；previous 中有而 current 中没有的字段值为 None"""
+    changed = {key: value for key, value in current.items() if key not in previous or previous[key] != value}
+    for key in previous:
+        if key not in current:
+            changed[key] = None
+    return changed
+
+
+class DeltaTracker:
+    """
+    单个连接的增量编码器
+    - encode()：返回要发送的文本（快照或增量），没有变化时返回 None
+    - reset()：清除某些端站（默认全部）的记录，下次发送快照
+    同时统计发送的快照、增量和因没有变化而跳过的帧数。
+    """
+
+    def __init__(self):
+        self._sent: Dict[Tuple[str, str], dict] = {}
+        self.stats = {'snapshots': 0, 'deltas': 0, 'skipped': 0}
+
+    def encode(self, sn: str, kind: str, text: str, data: Optional[dict]) -> Optional[str]:
+        """text 为该帧完整的共享文本，data 为其中的数据字典（没有时直接发送 text）"""
+        if data is None or kind not in MESSAGE_TYPES:
+            return text
+        key = (sn, kind)
+        previous = self._sent.get(key)
+        self._sent[key] = data
+        if previous is None:
+            self.stats['snapshots'] += 1
+            return text
+
+        changed = diff(previous, data)
+        if not changed:
+            self.stats['skipped'] += 1
+            return None
+        self.stats['deltas'] += 1
+        return json_codec.dumps({'message': {
+            'type': MESSAGE_TYPES[kind], 'kind': kind, 'sn': sn, 'delta': True, 'data': changed,
+        }})
+
+    def reset(self, sns: Optional[Iterable[str]] = None):
+        if sns is None:
+            self._sent.clear()
+            return
+        sns = set(sns)
+        for key in [key for key in self._sent if key[0] in sns]:
+            del self._sent[key]
+
+    def tracked_sns(self):
+        return {sn for sn, _ in self._sent}
@@ -0,0 +1,36 @@
+# terminal_management/groups.py
+
+# WebSocket 推送使用的 Channel Layer 组名与主题
+# - data_updates：声明了 inventory 主题的连接，接收船舶/端站/基站的增删改
+# - 端站上报（以及端站信息变化后的最新状态）只发往该端站的订阅组和船队组，页面通过 subscribe / unsubscribe
+#   消息选择接收哪些端站，推送的开销只与关注该端站的连接数有关，而不是与全部打开的页面数有关
+# 每条广播由若干带主题的文本帧组成，连接只转发建立时声明的主题（见 consumers.DataConsumer）：
+#   - antenna：latest_report_data（端站数据与状态页面）
+#   - gis：gis_update_data（GIS 页面）
+#   - inventory：ship_* / terminal_* / basestation_* 增删改
+
+import hashlib
+import re
+
+TOPIC_ANTENNA = 'antenna'
+TOPIC_GIS = 'gis'
+TOPIC_INVENTORY = 'inventory'
+
+ALL_TOPICS = frozenset((TOPIC_ANTENNA, TOPIC_GIS, TOPIC_INVENTORY))
+REPORT_TOPICS = frozenset((TOPIC_ANTENNA, TOPIC_GIS))     # 按端站订阅的主题
+
+# 声明了 inventory 主题的连接加入的组
+DATA_UPDATES_GROUP = 'data_updates'
+
+# 订阅了全部端站（船队总览）的连接加入的组
+FLEET_GROUP = 'reports.fleet'
+
+# Channel Layer 组名只允许字母、数字、连字符、下划线和点，长度小于100
+_GROUP_SAFE = re.compile(r'^[A-Za-z0-9\-_.]{1,64}$')
+
+
+def report_group(sn: str) -> str:
+    """某端站上报的订阅组名；SN 含有组名不允许的字符时使用其摘要"""
+    if _GROUP_SAFE.match(sn):
+        return f'reports.sn.{sn}'
+    return f'reports.snh.{hashlib.sha1(sn.encode("utf-8")).hexdigest()}'
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from terminal_management import report_archive
+from terminal_management.models import TerminalReport
+
+class Command(BaseCommand):
+    """
+    把早于截止日期的上报记录按 端站/日 归档为压缩的列式文件（parquet 或 csv.gz），并从数据库删除。
+    归档后的数据仍可通过轨迹查询透明读回。可重复执行，中断后重新执行即可继续。
+
+    用法:
+        python manage.py archive_reports                       # 归档 archive_after_days 天之前的上报
+        python manage.py archive_reports --before 2026-01-01
+        python manage.py archive_reports --sn sn000004 --dry-run
+    """
+    help = '把历史上报记录归档为压缩文件（parquet / csv.gz）并从数据库删除'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='归档该日期（服务器时区，YYYY-MM-DD）之前的上报，默认为 archive_after_days 天前')
+        parser.add_argument('--sn', action='append', dest='sns', help='只归档指定SN（可重复指定），默认全部端站')
+        parser.add_argument('--format', default=report_archive.DEFAULT_ARCHIVE_FORMAT, choices=['auto', 'parquet', 'csv'],
+                            help=f'归档格式（默认 {report_archive.DEFAULT_ARCHIVE_FORMAT}）')
+        parser.add_argument('--dry-run', action='store_true', help='只统计将要归档的行数，不写文件也不删除')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff_day = date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError('--before 日期格式无效，请使用 YYYY-MM-DD')
+        else:
+            cutoff_day = timezone.localdate() - timedelta(days=report_archive.DEFAULT_ARCHIVE_AFTER_DAYS)
+
+        try:
+            archive_format = report_archive.resolve_format(options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        sns = options['sns'] or list(TerminalReport.objects.values_list('sn', flat=True).distinct().order_by('sn'))
+        self.stdout.write(self.style.SUCCESS(
+            f'--- 开始归档 {cutoff_day} 之前的上报（格式: {archive_format}，目录: {report_archive.archive_dir()}）---'
+        ))
+
+        total_rows = total_days = 0
+        for sn in sns:
+            if not report_archive.is_safe_sn(sn):
+                self.stdout.write(self.style.WARNING(f'跳过 SN {sn!r}：含有路径分隔符或 \'..\'，不能用于归档路径'))
+                continue
+            sn_rows = sn_days = 0
+            for day in report_archive.archive_days(sn, cutoff_day):
+                sn_rows += report_archive.archive_sn_day(sn, day, archive_format, dry_run=options['dry_run'])
+                sn_days += 1
+            if sn_rows:
+                self.stdout.write(f'{sn}: {sn_days} 天, {sn_rows} 行')
+            total_rows += sn_rows
+            total_days += sn_days
+
+        action = '将归档' if options['dry_run'] else '已归档'
+        self.stdout.write(self.style.SUCCESS(f'--- 完成：{action} {len(sns)} 个端站、{total_days} 个端站日、{total_rows} 行 ---'))
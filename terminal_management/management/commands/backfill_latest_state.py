@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from terminal_management.models import TerminalReport
+from terminal_management.services import upsert_latest_states
+
+class Command(BaseCommand):
+    """
+    根据历史上报记录重建端站最新状态表 (TerminalLatestState)。
+    每个端站在 (sn, reported_at) 索引上取最新的一条上报；已有的更新状态不会被旧数据覆盖，可重复执行。
+
+    用法:
+        python manage.py backfill_latest_state
+        python manage.py backfill_latest_state --sn sn000004
+    """
+    help = '根据历史上报记录回填端站最新状态表 TerminalLatestState'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sn', action='append', dest='sns', help='只回填指定SN（可重复指定），默认回填全部端站')
+        parser.add_argument('--batch-size', type=int, default=200, help='每个事务处理的端站数量（默认200）')
+
+    def handle(self, *args, **options):
+        sns = options['sns'] or list(TerminalReport.objects.values_list('sn', flat=True).distinct().order_by('sn'))
+        batch_size = max(1, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'--- 开始回填端站最新状态，共 {len(sns)} 个端站 ---'))
+
+        updated_count = 0
+        missing_count = 0
+        for start in range(0, len(sns), batch_size):
+            reports = []
+            for sn in sns[start:start + batch_size]:
+                report = TerminalReport.objects.filter(sn=sn, reported_at__isnull=False).order_by('-reported_at').first()
+                if report is None:
+                    missing_count += 1
+                    continue
+                reports.append(report)
+            with transaction.atomic():
+                updated_count += upsert_latest_states(reports)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'--- 回填完成：更新 {updated_count} 个端站，{missing_count} 个端站没有上报记录 ---'
+        ))
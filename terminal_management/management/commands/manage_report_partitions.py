@@ -0,0 +1,92 @@
+from datetime import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from terminal_management import partitioning
+from terminal_management.partitioning import PartitioningNotSupported
+from terminal_management.services import delete_reports_before
+
+class Command(BaseCommand):
+    """
+    管理端站上报表 (TerminalReport) 的按月分区与数据保留，建议每天由定时任务执行一次。
+
+    用法:
+        python manage.py manage_report_partitions --init          # 首次使用：把上报表转换为分区表（维护窗口执行）
+        python manage.py manage_report_partitions                 # 提前创建未来的分区，并删除过期分区
+        python manage.py manage_report_partitions --list          # 查看当前分区
+        python manage.py manage_report_partitions --dry-run       # 只打印将要执行的操作
+    """
+    help = '创建上报表的未来分区，并按保留期整块删除过期分区（仅MySQL；其他数据库退回分块删除）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--init', action='store_true', help='把未分区的上报表转换为分区表')
+        parser.add_argument('--list', action='store_true', help='列出当前分区后退出')
+        parser.add_argument('--dry-run', action='store_true', help='只打印将要执行的操作，不修改数据库')
+        parser.add_argument('--interval-months', type=int, default=partitioning.DEFAULT_INTERVAL_MONTHS,
+                            help=f'每个分区覆盖的月数（默认 {partitioning.DEFAULT_INTERVAL_MONTHS}）')
+        parser.add_argument('--months-ahead', type=int, default=partitioning.DEFAULT_MONTHS_AHEAD,
+                            help=f'提前创建未来多少个月的分区（默认 {partitioning.DEFAULT_MONTHS_AHEAD}）')
+        parser.add_argument('--retention-months', type=int, default=partitioning.DEFAULT_RETENTION_MONTHS,
+                            help=f'上报数据保留的月数，0 表示不删除（默认 {partitioning.DEFAULT_RETENTION_MONTHS}）')
+
+    def handle(self, *args, **options):
+        interval_months = options['interval_months']
+        if interval_months not in (1, 2, 3, 4, 6, 12):
+            raise CommandError('--interval-months 必须能整除12（1/2/3/4/6/12）')
+        dry_run = options['dry_run']
+
+        try:
+            if options['list']:
+                self._list_partitions()
+                return
+
+            if options['init']:
+                statements = partitioning.init_partitioning(
+                    interval_months=interval_months, months_ahead=options['months_ahead'], dry_run=dry_run
+                )
+                for statement in statements:
+                    self.stdout.write(statement)
+                if dry_run:
+                    # 表并未真正分区，后续步骤读取不到分区信息；初始化语句已包含到 --months-ahead 为止的分区
+                    self.stdout.write(self.style.SUCCESS('（dry-run，未执行）初始化后才能计算新建和过期的分区，已跳过这两步。'))
+                    return
+                self.stdout.write(self.style.SUCCESS('上报表分区初始化完成。'))
+
+            created = partitioning.create_future_partitions(
+                interval_months=interval_months, months_ahead=options['months_ahead'], dry_run=dry_run
+            )
+            self.stdout.write(self.style.SUCCESS(f"新建分区: {', '.join(created) if created else '无'}"))
+
+            if options['retention_months'] > 0:
+                dropped = partitioning.drop_expired_partitions(
+                    retention_months=options['retention_months'], dry_run=dry_run
+                )
+                self.stdout.write(self.style.SUCCESS(f"删除过期分区: {', '.join(dropped) if dropped else '无'}"))
+
+        except PartitioningNotSupported as e:
+            if options['init'] or options['list']:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.WARNING(f'{e}，数据保留改为分块删除过期记录。'))
+            self._delete_expired_rows(options['retention_months'], dry_run)
+
+    def _list_partitions(self):
+        partitions = partitioning.get_partitions()
+        if not partitions:
+            self.stdout.write(self.style.WARNING('上报表尚未分区。'))
+            return
+        for name, upper, rows in partitions:
+            self.stdout.write(f"{name:<12} < {upper or 'MAXVALUE':<22} 约 {rows} 行")
+
+    def _delete_expired_rows(self, retention_months, dry_run):
+        """未分区时的数据保留：按 reported_at 索引分块删除"""
+        if retention_months <= 0:
+            return
+        cutoff_day = partitioning.add_months(timezone.localdate(), -retention_months)
+        cutoff = partitioning.TerminalReport.combine_reported_at(cutoff_day, time.min)
+        if dry_run:
+            self.stdout.write(f'（dry-run）将删除 {cutoff} 之前的上报记录')
+            return
+        success, result = delete_reports_before(cutoff)
+        if not success:
+            raise CommandError(result)
+        self.stdout.write(self.style.SUCCESS(f'已删除 {cutoff} 之前的上报记录 {result} 条。'))
@@ -0,0 +1,53 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from terminal_management import rollups
+
+class Command(BaseCommand):
+    """
+    根据高水位线增量生成信号与链路指标的分钟/小时/天汇总，并清理过期的汇总数据。
+    可由定时任务每分钟执行一次，也可以 --loop 常驻运行。
+
+    用法:
+        python manage.py rollup_metrics
+        python manage.py rollup_metrics --loop
+        python manage.py rollup_metrics --rebuild-from 2026-01-01   # 回退高水位线，重新汇总迟到的上报
+    """
+    help = '增量生成信号与链路指标（rsrp/sinr/rssi/上下行速率/温湿度）的分钟、小时、天汇总'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--granularity', action='append', choices=list(rollups.GRANULARITIES),
+                            help='只处理指定粒度（可重复指定），默认全部')
+        parser.add_argument('--rebuild-from', help='把高水位线回退到指定时间（ISO 8601），从该处重新汇总')
+        parser.add_argument('--lag', type=int, default=rollups.DEFAULT_ROLLUP_LAG,
+                            help=f'只汇总早于（当前时刻 - LAG 秒）的时间桶（默认 {rollups.DEFAULT_ROLLUP_LAG}）')
+        parser.add_argument('--loop', action='store_true', help='常驻运行，每隔 --interval 秒汇总一次')
+        parser.add_argument('--interval', type=float, default=rollups.DEFAULT_ROLLUP_INTERVAL,
+                            help=f'常驻运行时的汇总间隔（秒，默认 {rollups.DEFAULT_ROLLUP_INTERVAL}）')
+
+    def handle(self, *args, **options):
+        names = options['granularity'] or list(rollups.GRANULARITIES)
+
+        if options['rebuild_from']:
+            try:
+                since = datetime.fromisoformat(options['rebuild_from'])
+            except ValueError:
+                raise CommandError('--rebuild-from 时间格式无效，请使用ISO 8601格式')
+            for name in names:
+                rollups.reset_watermark(rollups.GRANULARITIES[name], since)
+            self.stdout.write(self.style.WARNING(f"已把 {', '.join(names)} 汇总的高水位线回退到 {since}"))
+
+        while True:
+            started = time.monotonic()
+            written = rollups.run_rollups(names, lag_seconds=options['lag'])
+            deleted = rollups.prune_rollups()
+            self.stdout.write(self.style.SUCCESS(
+                f"汇总完成（{time.monotonic() - started:.2f}s）: 写入 {written}，清理 {deleted}"
+            ))
+            if not options['loop']:
+                break
+            # 常驻运行时释放空闲过久的数据库连接
+            close_old_connections()
+            time.sleep(options['interval'])
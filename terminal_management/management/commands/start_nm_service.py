@@ -1,13 +1,45 @@
 # terminal_management/management/commands/start_nm_service.py
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 # from acu.NM_Service import NM_Service
+import asyncio
+import multiprocessing
+import signal
 import time
 
+from config import get_config
+
+config = get_config()
+
+# 多进程模式下工作进程的重启策略
+FAST_FAILURE_SECONDS = config.get('udp_server_config.worker_fast_failure_seconds', 10.0)   # 启动后多少秒内退出算作启动失败
+MAX_FAST_FAILURES = config.get('udp_server_config.worker_max_fast_failures', 5)            # 连续启动失败多少次后放弃
+RESTART_BACKOFF_MAX = config.get('udp_server_config.worker_restart_backoff_max', 30.0)     # 重启等待时间的上限（秒）
+
+
+def restart_delay(fast_failures):
+    """连续启动失败 fast_failures 次后重新拉起前的等待时间：1、2、4... 秒，不超过 RESTART_BACKOFF_MAX；运行过一段时间后退出的立即重启"""
+    if fast_failures <= 0:
+        return 0.0
+    return min(2.0 ** (fast_failures - 1), RESTART_BACKOFF_MAX)
+
 class Command(BaseCommand):
     help = '启动UDP NM_Service来监听端站上报'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='以多进程模式启动异步UDP服务的工作进程数，各进程以 SO_REUSEPORT 绑定同一端口（默认0：单进程线程版）'
+        )
+
     def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 0:
+            raise CommandError('--workers 不能为负数')
+        if workers > 0:
+            self._run_supervisor(workers)
+            return
+
         from acu.NM_Service import NM_Service
 
         self.stdout.write(self.style.SUCCESS('正在启动 NM_Service...'))
@@ -24,4 +56,115 @@ class Command(BaseCommand):
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING('\n正在停止 NM_Service...'))
             service.stop()
-            self.stdout.write(self.style.SUCCESS('NM_Service 已成功停止。'))
\ No newline at end of file
+            self.stdout.write(self.style.SUCCESS('NM_Service 已成功停止。'))
+
+    # -------------------------------------------------------------------------
+    # 多进程（supervisor）模式
+    # -------------------------------------------------------------------------
+
+    def _run_supervisor(self, workers):
+        """
+        fork 出 N 个工作进程并守护它们，意外退出的工作进程会被重新拉起。
+        启动后 FAST_FAILURE_SECONDS 秒内就退出的视为启动失败（如端口被占用、数据库不可用），重新拉起前按指数退避等待；
+        同一工作进程连续启动失败 MAX_FAST_FAILURES 次后停止全部工作进程，命令以非零状态退出。
+        """
+        from django.db import connections
+
+        # fork 前关闭数据库连接，避免子进程共用父进程的连接
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+
+        processes = [None] * workers
+        started_at = [0.0] * workers
+        restart_at = [0.0] * workers     # 等待重新拉起的工作进程的重启时刻
+        fast_failures = [0] * workers
+
+        def spawn(index):
+            process = context.Process(target=_worker_main, args=(index, workers), name=f"NM_UDP_Worker_{index}")
+            process.start()
+            processes[index] = process
+            started_at[index] = time.monotonic()
+
+        for index in range(workers):
+            spawn(index)
+        self.stdout.write(self.style.SUCCESS(f'NM_Service 多进程模式已启动，共 {workers} 个工作进程。按 CTRL+C 停止。'))
+
+        stopping = False
+        failed_worker = None
+
+        def request_stop(sig, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        while not stopping:
+            time.sleep(1)
+            now = time.monotonic()
+            for index, process in enumerate(processes):
+                if stopping:
+                    break
+                if process is None:
+                    if now >= restart_at[index]:
+                        spawn(index)
+                    continue
+                if process.is_alive():
+                    continue
+
+                if now - started_at[index] < FAST_FAILURE_SECONDS:
+                    fast_failures[index] += 1
+                else:
+                    fast_failures[index] = 0
+                if fast_failures[index] >= MAX_FAST_FAILURES:
+                    self.stdout.write(self.style.ERROR(
+                        f'工作进程 {index} 连续 {fast_failures[index]} 次启动后 {FAST_FAILURE_SECONDS} 秒内退出 '
+                        f'(exitcode={process.exitcode})，停止全部工作进程'
+                    ))
+                    failed_worker = index
+                    stopping = True
+                    break
+
+                delay = restart_delay(fast_failures[index])
+                self.stdout.write(self.style.WARNING(
+                    f'工作进程 {index} 已退出 (exitcode={process.exitcode})，'
+                    + (f'{delay:.0f} 秒后重新启动...' if delay else '正在重新启动...')
+                ))
+                processes[index] = None
+                restart_at[index] = now + delay
+                if not delay:
+                    spawn(index)
+
+        self.stdout.write(self.style.WARNING('\n正在停止 NM_Service 工作进程...'))
+        running = [process for process in processes if process is not None]
+        for process in running:
+            if process.is_alive():
+                process.terminate()
+        for process in running:
+            process.join(10)
+            if process.is_alive():
+                process.kill()
+        if failed_worker is not None:
+            raise CommandError(f'工作进程 {failed_worker} 反复启动失败，NM_Service 已退出，请检查日志')
+        self.stdout.write(self.style.SUCCESS('NM_Service 已成功停止。'))
+
+
+def _worker_main(worker_index, worker_count):
+    """工作进程入口：运行自己的事件循环和异步UDP服务"""
+    # 中断信号由 supervisor 统一处理，工作进程只响应 SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(worker_index, worker_count))
+
+
+async def _run_worker(worker_index, worker_count):
+    from acu.NM_Service_async import NM_ServiceAsync
+
+    stop_event = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+
+    service = NM_ServiceAsync(reuse_port=True, worker_index=worker_index, worker_count=worker_count)
+    await service.start()
+    try:
+        await stop_event.wait()
+    finally:
+        await service.stop()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terminal_management", "0006_terminalreport_system_stat_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="terminalreport",
+            name="reported_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="上报时刻"),
+        ),
+    ]
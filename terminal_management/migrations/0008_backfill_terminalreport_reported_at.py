@@ -0,0 +1,44 @@
+# 为已有的上报记录回填 reported_at
+# 按主键分块处理，每块单独提交，避免在大表上长时间持有锁或产生超大事务；
+# 中断后重新执行 migrate 会从尚未回填的记录继续。
+
+from datetime import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+CHUNK_SIZE = 5000
+
+
+def backfill_reported_at(apps, schema_editor):
+    TerminalReport = apps.get_model("terminal_management", "TerminalReport")
+    tz = timezone.get_current_timezone()
+    last_id = 0
+    while True:
+        rows = list(
+            TerminalReport.objects.filter(id__gt=last_id, reported_at__isnull=True)
+            .order_by("id")
+            .values_list("id", "report_date", "report_time")[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        reports = [
+            TerminalReport(id=report_id, reported_at=timezone.make_aware(datetime.combine(report_date, report_time), tz))
+            for report_id, report_date, report_time in rows
+        ]
+        TerminalReport.objects.bulk_update(reports, ["reported_at"], batch_size=1000)
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # 每个分块独立提交
+    atomic = False
+
+    dependencies = [
+        ("terminal_management", "0007_terminalreport_reported_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_reported_at, migrations.RunPython.noop),
+    ]
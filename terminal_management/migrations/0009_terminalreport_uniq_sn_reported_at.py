@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terminal_management", "0008_backfill_terminalreport_reported_at"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="terminalreport",
+            name="terminal_ma_sn_ff09dd_idx",
+        ),
+        migrations.AlterUniqueTogether(
+            name="terminalreport",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="terminalreport",
+            constraint=models.UniqueConstraint(
+                fields=("sn", "reported_at"), name="uniq_report_sn_reported_at"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="terminalreport",
+            index=models.Index(fields=["reported_at"], name="terminal_report_at_idx"),
+        ),
+    ]
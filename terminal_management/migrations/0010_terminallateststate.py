@@ -0,0 +1,170 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terminal_management", "0009_terminalreport_uniq_sn_reported_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TerminalLatestState",
+            fields=[
+                (
+                    "sn",
+                    models.CharField(
+                        max_length=50,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="设备序列号",
+                    ),
+                ),
+                ("type", models.CharField(max_length=100, verbose_name="设备类型名")),
+                ("report_date", models.DateField(verbose_name="上报日期")),
+                ("report_time", models.TimeField(verbose_name="上报时间")),
+                ("reported_at", models.DateTimeField(verbose_name="上报时刻")),
+                ("op", models.CharField(max_length=20, verbose_name="操作类型")),
+                ("op_sub", models.CharField(max_length=20, verbose_name="操作子类")),
+                (
+                    "system_stat",
+                    models.IntegerField(blank=True, null=True, verbose_name="系统状态"),
+                ),
+                (
+                    "wireless_network_stat",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="无线网络状态"
+                    ),
+                ),
+                (
+                    "long",
+                    models.FloatField(blank=True, null=True, verbose_name="端站经度"),
+                ),
+                (
+                    "lat",
+                    models.FloatField(blank=True, null=True, verbose_name="端站纬度"),
+                ),
+                (
+                    "theory_yaw",
+                    models.FloatField(blank=True, null=True, verbose_name="理论方位角"),
+                ),
+                (
+                    "yaw",
+                    models.FloatField(blank=True, null=True, verbose_name="当前方位角"),
+                ),
+                (
+                    "pitch",
+                    models.FloatField(blank=True, null=True, verbose_name="当前俯仰角"),
+                ),
+                (
+                    "roll",
+                    models.FloatField(blank=True, null=True, verbose_name="当前横滚角"),
+                ),
+                (
+                    "yao_limit_state",
+                    models.FloatField(blank=True, null=True, verbose_name="方位限位"),
+                ),
+                (
+                    "temp",
+                    models.FloatField(blank=True, null=True, verbose_name="温度(°C)"),
+                ),
+                (
+                    "humi",
+                    models.FloatField(blank=True, null=True, verbose_name="湿度(%)"),
+                ),
+                (
+                    "bts_name",
+                    models.CharField(
+                        blank=True, max_length=100, null=True, verbose_name="基站名"
+                    ),
+                ),
+                (
+                    "bts_long",
+                    models.FloatField(blank=True, null=True, verbose_name="基站经度"),
+                ),
+                (
+                    "bts_lat",
+                    models.FloatField(blank=True, null=True, verbose_name="基站纬度"),
+                ),
+                (
+                    "bts_number",
+                    models.IntegerField(blank=True, null=True, verbose_name="基站编号"),
+                ),
+                (
+                    "bts_group_number",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="基站分区号"
+                    ),
+                ),
+                (
+                    "bts_r",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="基站覆盖半径(公里)"
+                    ),
+                ),
+                (
+                    "upstream_rate",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="上行速率(Mbps)"
+                    ),
+                ),
+                (
+                    "downstream_rate",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="下行速率(Mbps)"
+                    ),
+                ),
+                (
+                    "standard",
+                    models.CharField(
+                        blank=True, max_length=50, null=True, verbose_name="通信制式"
+                    ),
+                ),
+                (
+                    "plmn",
+                    models.CharField(
+                        blank=True, max_length=20, null=True, verbose_name="运营商PLMN"
+                    ),
+                ),
+                (
+                    "cellid",
+                    models.CharField(
+                        blank=True,
+                        max_length=20,
+                        null=True,
+                        verbose_name="服务小区CellID",
+                    ),
+                ),
+                (
+                    "pci",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="服务小区PCI"
+                    ),
+                ),
+                (
+                    "rsrp",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="RSRP(信号接收功率)"
+                    ),
+                ),
+                (
+                    "sinr",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="SINR(信噪比)"
+                    ),
+                ),
+                (
+                    "rssi",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="RSSI(信号强度指示)"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "端站最新状态",
+                "verbose_name_plural": "端站最新状态",
+            },
+        ),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terminal_management", "0010_terminallateststate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricRollupWatermark",
+            fields=[
+                (
+                    "granularity",
+                    models.CharField(
+                        max_length=10,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="汇总粒度",
+                    ),
+                ),
+                ("processed_until", models.DateTimeField(verbose_name="已汇总至")),
+            ],
+            options={
+                "verbose_name": "指标汇总进度",
+                "verbose_name_plural": "指标汇总进度",
+            },
+        ),
+        migrations.CreateModel(
+            name="MetricRollupDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sn", models.CharField(max_length=50, verbose_name="设备序列号")),
+                ("metric", models.CharField(max_length=20, verbose_name="指标名")),
+                ("bucket_start", models.DateTimeField(verbose_name="时间桶起点")),
+                ("count", models.PositiveIntegerField(verbose_name="样本数")),
+                ("min_value", models.FloatField(verbose_name="最小值")),
+                ("max_value", models.FloatField(verbose_name="最大值")),
+                ("avg_value", models.FloatField(verbose_name="平均值")),
+                ("p05_value", models.FloatField(verbose_name="5%分位数")),
+                ("p50_value", models.FloatField(verbose_name="中位数")),
+                ("p95_value", models.FloatField(verbose_name="95%分位数")),
+            ],
+            options={
+                "verbose_name": "指标日汇总",
+                "verbose_name_plural": "指标日汇总",
+                "abstract": False,
+                "indexes": [
+                    models.Index(fields=["bucket_start"], name="metricrollupday_at_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("sn", "metric", "bucket_start"),
+                        name="uniq_metricrollupday_key",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MetricRollupHour",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sn", models.CharField(max_length=50, verbose_name="设备序列号")),
+                ("metric", models.CharField(max_length=20, verbose_name="指标名")),
+                ("bucket_start", models.DateTimeField(verbose_name="时间桶起点")),
+                ("count", models.PositiveIntegerField(verbose_name="样本数")),
+                ("min_value", models.FloatField(verbose_name="最小值")),
+                ("max_value", models.FloatField(verbose_name="最大值")),
+                ("avg_value", models.FloatField(verbose_name="平均值")),
+                ("p05_value", models.FloatField(verbose_name="5%分位数")),
+                ("p50_value", models.FloatField(verbose_name="中位数")),
+                ("p95_value", models.FloatField(verbose_name="95%分位数")),
+            ],
+            options={
+                "verbose_name": "指标小时汇总",
+                "verbose_name_plural": "指标小时汇总",
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["bucket_start"], name="metricrolluphour_at_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("sn", "metric", "bucket_start"),
+                        name="uniq_metricrolluphour_key",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MetricRollupMinute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sn", models.CharField(max_length=50, verbose_name="设备序列号")),
+                ("metric", models.CharField(max_length=20, verbose_name="指标名")),
+                ("bucket_start", models.DateTimeField(verbose_name="时间桶起点")),
+                ("count", models.PositiveIntegerField(verbose_name="样本数")),
+                ("min_value", models.FloatField(verbose_name="最小值")),
+                ("max_value", models.FloatField(verbose_name="最大值")),
+                ("avg_value", models.FloatField(verbose_name="平均值")),
+                ("p05_value", models.FloatField(verbose_name="5%分位数")),
+                ("p50_value", models.FloatField(verbose_name="中位数")),
+                ("p95_value", models.FloatField(verbose_name="95%分位数")),
+            ],
+            options={
+                "verbose_name": "指标分钟汇总",
+                "verbose_name_plural": "指标分钟汇总",
+                "abstract": False,
+                "indexes": [
+                    models.Index(
+                        fields=["bucket_start"], name="metricrollupminute_at_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("sn", "metric", "bucket_start"),
+                        name="uniq_metricrollupminute_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terminal_management", "0011_metric_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="terminalinfo",
+            name="last_seen",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="最后在线时间"
+            ),
+        ),
+    ]
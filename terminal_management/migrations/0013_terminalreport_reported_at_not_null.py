@@ -0,0 +1,20 @@
+# 上报时刻改为非空，与 manage_report_partitions --init 后 MySQL 分区表的定义一致
+# （reported_at 是分区列和主键 (id, reported_at) 的一部分）。
+# 0008 已为历史记录回填；report_date / report_time 都是必填的，保存和批量写入时总会合成 reported_at。
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("terminal_management", "0012_terminalinfo_last_seen"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="terminalreport",
+            name="reported_at",
+            field=models.DateTimeField(blank=True, verbose_name="上报时刻"),
+        ),
+    ]
@@ -1,6 +1,9 @@
 # terminal_management/models.py
 
+from datetime import datetime
+
 from django.db import models
+from django.utils import timezone
 # 由于该项目的网页用户管理较为简单，因此直接导入 Django 内置的用户模型，并将直接使用它
 from django.contrib.auth.models import User
 
@@ -77,6 +80,12 @@ class TerminalInfo(models.Model):
         blank=True,
         null=True
     )
+    # 最近一次收到该端站心跳或上报的时间，由NM服务在内存中缓存并定期批量写入
+    last_seen = models.DateTimeField(
+        verbose_name="最后在线时间",
+        blank=True,
+        null=True
+    )
 
     def __str__(self):
         return f"端站SN: {self.sn} (属于: {self.ship.ship_name})"
@@ -153,11 +162,15 @@ class TerminalReport(models.Model):
     这是系统的核心数据，数据量可能会很大。
     """
     
-    # -- 复合唯一约束字段 --
+    # -- 设备与上报时间 --
     type = models.CharField(max_length=100, verbose_name="设备类型名")
     sn = models.CharField(max_length=50, verbose_name="设备序列号", db_index=True) # 经常用于查询，添加索引
     report_date = models.DateField(verbose_name="上报日期", db_index=True) # 名字用 report_date 避免与 Python 关键字冲突
     report_time = models.TimeField(verbose_name="上报时间") # 名字用 report_time
+    # 由 report_date + report_time（按服务器时区解释）合成，保存时自动填充；
+    # 与 sn 组成唯一索引，按时间范围查询轨迹、取最新上报、清理历史数据都只需在该索引上做一次范围扫描；
+    # 非空（report_date / report_time 都是必填的），也是 MySQL 分区表主键的一部分（见 partitioning.py）
+    reported_at = models.DateTimeField(verbose_name="上报时刻", blank=True)
 
     # -- 操作信息 --
     op = models.CharField(max_length=20, verbose_name="操作类型")
@@ -199,12 +212,178 @@ class TerminalReport(models.Model):
     def __str__(self):
         return f"Report from {self.sn} at {self.report_date} {self.report_time}"
 
+    @staticmethod
+    def combine_reported_at(report_date, report_time):
+        """把端站上报的日期和时间（服务器时区的本地时间）合成为带时区的时刻"""
+        if report_date is None or report_time is None:
+            return None
+        return timezone.make_aware(datetime.combine(report_date, report_time), timezone.get_current_timezone())
+
+    def fill_reported_at(self):
+        """根据 report_date / report_time 填充 reported_at（bulk_create 不会调用 save()，需显式调用）"""
+        if self.reported_at is None:
+            self.reported_at = self.combine_reported_at(self.report_date, self.report_time)
+
+    def save(self, *args, **kwargs):
+        self.fill_reported_at()
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "端站上报信息"
         verbose_name_plural = "端站上报信息"
-        # 定义复合唯一约束，效果等同于复合主键
-        unique_together = ('type', 'sn', 'report_date', 'report_time')
-        # 可以为经常一起查询的字段创建联合索引
+        # 同一端站同一时刻只有一条上报，唯一索引 (sn, reported_at) 同时作为轨迹/最新上报查询的复合索引
+        constraints = [
+            models.UniqueConstraint(fields=['sn', 'reported_at'], name='uniq_report_sn_reported_at'),
+        ]
+        # 按时间范围跨端站查询和清理历史数据
+        indexes = [
+            models.Index(fields=['reported_at'], name='terminal_report_at_idx'),
+        ]
+
+# -----------------------------------------------------------------------------
+# 5. 端站最新状态表 (TerminalLatestState)
+#    - 每个端站一行，保存其最新一条上报的全部字段（TerminalReport 的反规范化副本）。
+#    - 与上报记录在同一事务中写入，页面和实时推送按主键 sn 直接读取，不再扫描上报大表。
+# -----------------------------------------------------------------------------
+class TerminalLatestState(models.Model):
+    """
+    存储每个端站的最新上报状态。
+    字段与 TerminalReport 一一对应，新增上报字段时两边需同时修改。
+    """
+
+    sn = models.CharField(max_length=50, primary_key=True, verbose_name="设备序列号")
+
+    # -- 设备与上报时间 --
+    type = models.CharField(max_length=100, verbose_name="设备类型名")
+    report_date = models.DateField(verbose_name="上报日期")
+    report_time = models.TimeField(verbose_name="上报时间")
+    reported_at = models.DateTimeField(verbose_name="上报时刻")
+
+    # -- 操作信息 --
+    op = models.CharField(max_length=20, verbose_name="操作类型")
+    op_sub = models.CharField(max_length=20, verbose_name="操作子类")
+
+    # -- 端站状态信息 --
+    system_stat = models.IntegerField(verbose_name="系统状态", null=True, blank=True)
+    wireless_network_stat = models.IntegerField(verbose_name="无线网络状态", null=True, blank=True)
+    long = models.FloatField(verbose_name="端站经度", blank=True, null=True)
+    lat = models.FloatField(verbose_name="端站纬度", blank=True, null=True)
+    theory_yaw = models.FloatField(verbose_name="理论方位角", blank=True, null=True)
+    yaw = models.FloatField(verbose_name="当前方位角", blank=True, null=True)
+    pitch = models.FloatField(verbose_name="当前俯仰角", blank=True, null=True)
+    roll = models.FloatField(verbose_name="当前横滚角", blank=True, null=True)
+    yao_limit_state = models.FloatField(verbose_name="方位限位", blank=True, null=True)
+    temp = models.FloatField(verbose_name="温度(°C)", blank=True, null=True)
+    humi = models.FloatField(verbose_name="湿度(%)", blank=True, null=True)
+
+    # -- 基站相关信息 --
+    bts_name = models.CharField(max_length=100, verbose_name="基站名", blank=True, null=True)
+    bts_long = models.FloatField(verbose_name="基站经度", blank=True, null=True)
+    bts_lat = models.FloatField(verbose_name="基站纬度", blank=True, null=True)
+    bts_number = models.IntegerField(verbose_name="基站编号", blank=True, null=True)
+    bts_group_number = models.IntegerField(verbose_name="基站分区号", blank=True, null=True)
+    bts_r = models.FloatField(verbose_name="基站覆盖半径(公里)", blank=True, null=True)
+
+    # -- 通信质量信息 --
+    upstream_rate = models.FloatField(verbose_name="上行速率(Mbps)", blank=True, null=True)
+    downstream_rate = models.FloatField(verbose_name="下行速率(Mbps)", blank=True, null=True)
+    standard = models.CharField(max_length=50, verbose_name="通信制式", blank=True, null=True)
+    plmn = models.CharField(max_length=20, verbose_name="运营商PLMN", blank=True, null=True)
+    cellid = models.CharField(max_length=20, verbose_name="服务小区CellID", blank=True, null=True)
+    pci = models.IntegerField(verbose_name="服务小区PCI", blank=True, null=True)
+    rsrp = models.FloatField(verbose_name="RSRP(信号接收功率)", blank=True, null=True)
+    sinr = models.FloatField(verbose_name="SINR(信噪比)", blank=True, null=True)
+    rssi = models.FloatField(verbose_name="RSSI(信号强度指示)", blank=True, null=True)
+
+    def __str__(self):
+        return f"Latest state of {self.sn} at {self.report_date} {self.report_time}"
+
+    @classmethod
+    def state_field_names(cls):
+        """从上报记录复制到最新状态的字段（除主键 sn 外的全部字段）"""
+        return [field.name for field in cls._meta.concrete_fields if not field.primary_key]
+
+    @classmethod
+    def from_report(cls, report):
+        """用一条上报记录（TerminalReport 实例）构造最新状态"""
+        return cls(sn=report.sn, **{name: getattr(report, name) for name in cls.state_field_names()})
+
+    class Meta:
+        verbose_name = "端站最新状态"
+        verbose_name_plural = "端站最新状态"
+
+
+# -----------------------------------------------------------------------------
+# 6. 信号与链路指标汇总表 (MetricRollupMinute / MetricRollupHour / MetricRollupDay)
+#    - 按端站、指标、时间桶（分钟/小时/天，按服务器时区对齐）预先汇总 rsrp、sinr、rssi、上下行速率、温湿度。
+#    - 由后台任务 rollup_metrics 根据高水位线增量生成，趋势图按时间范围选择粒度，长时间范围只需读取几百行。
+# -----------------------------------------------------------------------------
+class MetricRollupBase(models.Model):
+    """
+    汇总表的公共字段，一行对应一个端站的一个指标在一个时间桶内的统计值。
+    桶内没有有效值（全部为空）的指标不生成记录。
+    """
+    sn = models.CharField(max_length=50, verbose_name="设备序列号")
+    metric = models.CharField(max_length=20, verbose_name="指标名")
+    bucket_start = models.DateTimeField(verbose_name="时间桶起点")
+
+    count = models.PositiveIntegerField(verbose_name="样本数")
+    min_value = models.FloatField(verbose_name="最小值")
+    max_value = models.FloatField(verbose_name="最大值")
+    avg_value = models.FloatField(verbose_name="平均值")
+    p05_value = models.FloatField(verbose_name="5%分位数")
+    p50_value = models.FloatField(verbose_name="中位数")
+    p95_value = models.FloatField(verbose_name="95%分位数")
+
+    def __str__(self):
+        return f"{self.sn} {self.metric} @ {self.bucket_start}"
+
+    @classmethod
+    def value_field_names(cls):
+        """统计值字段（重复汇总同一时间桶时需要覆盖的字段）"""
+        return ['count', 'min_value', 'max_value', 'avg_value', 'p05_value', 'p50_value', 'p95_value']
+
+    class Meta:
+        abstract = True
+        # 唯一索引同时用于按 (sn, metric) 查询时间范围
+        constraints = [
+            models.UniqueConstraint(fields=['sn', 'metric', 'bucket_start'], name='uniq_%(class)s_key'),
+        ]
+        # 按时间清理过期的汇总数据
         indexes = [
-            models.Index(fields=['sn', 'report_date']),
-        ]
\ No newline at end of file
+            models.Index(fields=['bucket_start'], name='%(class)s_at_idx'),
+        ]
+
+
+class MetricRollupMinute(MetricRollupBase):
+    class Meta(MetricRollupBase.Meta):
+        verbose_name = "指标分钟汇总"
+        verbose_name_plural = "指标分钟汇总"
+
+
+class MetricRollupHour(MetricRollupBase):
+    class Meta(MetricRollupBase.Meta):
+        verbose_name = "指标小时汇总"
+        verbose_name_plural = "指标小时汇总"
+
+
+class MetricRollupDay(MetricRollupBase):
+    class Meta(MetricRollupBase.Meta):
+        verbose_name = "指标日汇总"
+        verbose_name_plural = "指标日汇总"
+
+
+# -----------------------------------------------------------------------------
+# 7. 汇总任务高水位线 (MetricRollupWatermark)
+#    - 每种粒度一行，记录已汇总到的时刻；早于该时刻的时间桶都已完整生成。
+# -----------------------------------------------------------------------------
+class MetricRollupWatermark(models.Model):
+    granularity = models.CharField(max_length=10, primary_key=True, verbose_name="汇总粒度")
+    processed_until = models.DateTimeField(verbose_name="已汇总至")
+
+    def __str__(self):
+        return f"{self.granularity} rollup until {self.processed_until}"
+
+    class Meta:
+        verbose_name = "指标汇总进度"
+        verbose_name_plural = "指标汇总进度"
@@ -0,0 +1,104 @@
+# terminal_management/outbox.py
+
+# 端站上报的推送事件（outbox）
+# 上报推送有两条路径：
+#   - 采集服务的批量写入（acu/report_writer.py）：bulk_create_terminal_reports 在数据库线程中、事务提交后把整批上报
+#     编码为 ReportOutbox 返回，写入器回到事件循环后调用 publish() 一次发出，数据库线程不再等待 Redis
+#   - 后台编辑、单条创建等 ORM 操作：仍由 signals.py 中的 post_save 信号在事务提交后逐条推送
+# 两条路径使用这里相同的消息和帧格式。每一帧为 [主题, 帧类型, 文本, 数据]（主题见 groups.py，帧类型用于 coalescer.py 的合并，
+# 数据为文本中的数据字典，供 deltas.py 计算字段级增量）；
+# 发往上报组的事件为 {'type': 'send_update', 'updates': [{'sn': ..., 'frames': [...]}, ...]}。
+
+import asyncio
+from typing import Dict, List, Optional
+
+from channels.layers import get_channel_layer
+
+from utils import gl_logger, json_codec
+from .groups import FLEET_GROUP, TOPIC_ANTENNA, TOPIC_GIS, report_group
+
+# 上报推送的字段（与 antenna 页面使用的旧格式一致）
+REPORT_MESSAGE_FIELDS = (
+    'type', 'sn', 'report_date', 'report_time', 'op', 'op_sub', 'long', 'lat', 'theory_yaw', 'yaw', 'pitch', 'roll',
+    'yao_limit_state', 'temp', 'humi', 'bts_name', 'bts_long', 'bts_lat', 'bts_number', 'bts_group_number', 'bts_r',
+    'upstream_rate', 'downstream_rate', 'standard', 'plmn', 'cellid', 'pci', 'rsrp', 'sinr', 'rssi',
+    'system_stat', 'wireless_network_stat',
+)
+
+
+def report_message(report) -> dict:
+    """把一条上报记录转换为 latest_report_data 消息"""
+    report_data = {name: getattr(report, name) for name in REPORT_MESSAGE_FIELDS}
+    report_data['report_date'] = str(report.report_date)
+    report_data['report_time'] = str(report.report_time)
+    return {
+        'type': 'latest_report_data',   # 与JS端获取最新数据时使用的类型一致
+        'sn': report.sn,
+        'data': report_data,
+    }
+
+
+def sn_frames(message: dict, payloads: Optional[dict] = None) -> List[list]:
+    """
+    编码发往端站上报组的帧：上报消息本身（latest_report_data 时）以及 payloads 中的
+    antenna / GIS 页面数据（services.build_realtime_payloads 构造）
+    """
+    frames = []
+    if message.get('type') == 'latest_report_data':
+        frames.append(_frame(TOPIC_ANTENNA, 'report', {**message, 'kind': 'report'}))
+    if payloads:
+        if payloads.get('antenna') is not None:
+            frames.append(_frame(TOPIC_ANTENNA, 'antenna',
+                                 {'type': 'latest_report_data', 'kind': 'antenna', 'data': payloads['antenna']}))
+        if payloads.get('gis') is not None:
+            frames.append(_frame(TOPIC_GIS, 'gis',
+                                 {'type': 'gis_update_data', 'kind': 'gis', 'data': payloads['gis']}))
+    return frames
+
+
+def _frame(topic: str, kind: str, message: dict) -> list:
+    return [topic, kind, json_codec.dumps({'message': message}), message['data']]
+
+
+def group_events(updates: List[dict]) -> Dict[str, dict]:
+    """把若干端站更新按上报组归并为事件：每个端站的订阅组一个事件，船队组一个包含全部更新的事件"""
+    by_group: Dict[str, List[dict]] = {}
+    for update in updates:
+        by_group.setdefault(report_group(update['sn']), []).append(update)
+    events = {group: {'type': 'send_update', 'updates': group_updates} for group, group_updates in by_group.items()}
+    if updates:
+        events[FLEET_GROUP] = {'type': 'send_update', 'updates': updates}
+    return events
+
+
+class ReportOutbox:
+    """
+    一批已提交的上报对应的推送事件
+    - add()：加入一个端站更新（已编码的帧），按加入顺序推送
+    - publish()：在事件循环中发出全部事件，各组的 group_send 并发执行
+    """
+
+    def __init__(self):
+        self._updates: List[dict] = []
+
+    def __len__(self):
+        return len(self._updates)
+
+    def add(self, sn: str, frames: List[list]):
+        if frames:
+            self._updates.append({'sn': sn, 'frames': frames})
+
+    async def publish(self, channel_layer=None):
+        """发出全部事件，返回发送的组数；单个组发送失败只记录警告"""
+        if not self._updates:
+            return 0
+        channel_layer = channel_layer or get_channel_layer()
+        events = group_events(self._updates)
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, event) for group, event in events.items()),
+            return_exceptions=True
+        )
+        for group, result in zip(events, results):
+            if isinstance(result, Exception):
+                gl_logger.warning(f"推送上报事件到组 {group} 失败: {result}")
+        return len(events)
@@ -0,0 +1,202 @@
+# terminal_management/partitioning.py
+
+# TerminalReport 的按时间范围分区（仅 MySQL）
+# 上报表按 reported_at 做 RANGE COLUMNS 分区，默认每月一个分区，另有一个 MAXVALUE 兜底分区 p_future。
+# - 提前创建未来的分区：从 p_future 中拆分（REORGANIZE PARTITION），p_future 通常为空，拆分几乎不耗时
+# - 数据保留：整块 DROP PARTITION，与分区内的行数无关，不产生逐行删除的 undo/binlog
+# 分区对 ORM 透明，services.py 中的查询无需修改；带 reported_at 条件的查询会自动裁剪到相关分区。
+#
+# MySQL 要求表上的每个唯一键（包括主键）都包含分区列，因此初始化时会把主键从 (id) 改为 (id, reported_at)。
+# id 仍然自增且唯一，Django 依旧把 id 当作主键使用。reported_at 在模型中同样是非空的（迁移 0013），初始化时的 MODIFY 与之一致。
+
+from datetime import date, datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+from django.db import connection
+from django.utils import timezone
+
+from config import get_config
+from .models import TerminalReport
+
+config = get_config()
+
+# 分区配置
+DEFAULT_INTERVAL_MONTHS = config.get('report_partition_config.partition_interval_months', 1)   # 每个分区覆盖的月数
+DEFAULT_MONTHS_AHEAD = config.get('report_partition_config.partition_months_ahead', 3)         # 提前创建未来多少个月的分区
+DEFAULT_RETENTION_MONTHS = config.get('report_partition_config.report_retention_months', 12)   # 上报数据保留的月数
+
+FUTURE_PARTITION = 'p_future'   # MAXVALUE 兜底分区
+
+
+class PartitioningNotSupported(Exception):
+    """当前数据库不支持（或尚未初始化）上报表分区"""
+
+
+def _table():
+    return TerminalReport._meta.db_table
+
+
+def _check_mysql():
+    if connection.vendor != 'mysql':
+        raise PartitioningNotSupported(f"上报表分区仅支持 MySQL，当前数据库为 {connection.vendor}")
+
+
+def add_months(day: date, months: int) -> date:
+    """返回 day 所在月份加 months 个月后的当月1日"""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def period_start(day: date, interval_months: int = DEFAULT_INTERVAL_MONTHS) -> date:
+    """day 所在分区周期的起始日（周期按自然年对齐，如按季度分区时为 1/4/7/10 月1日）"""
+    month_index = (day.month - 1) // interval_months * interval_months
+    return date(day.year, month_index + 1, 1)
+
+
+def partition_name(start: date) -> str:
+    """分区名，如 p202601"""
+    return f"p{start.year:04d}{start.month:02d}"
+
+
+def boundary_value(day: date) -> str:
+    """
+    分区上界的字面值。
+    reported_at 在 MySQL 中按UTC存储，分区边界取服务器时区的本地零点换算成的UTC时间，
+    这样每个分区恰好对应本地的一个自然月。
+    """
+    local_midnight = timezone.make_aware(datetime(day.year, day.month, day.day), timezone.get_current_timezone())
+    utc_value = local_midnight.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return utc_value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def local_date_of(value: str) -> date:
+    """boundary_value() 的逆运算：把分区上界（UTC字面值）换算回服务器时区的本地日期"""
+    utc_value = datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=dt_timezone.utc)
+    return timezone.localtime(utc_value).date()
+
+
+def _partition_clause(start: date, interval_months: int) -> str:
+    """单个分区的定义：[start, start + interval) """
+    end = add_months(start, interval_months)
+    return f"PARTITION {partition_name(start)} VALUES LESS THAN ('{boundary_value(end)}')"
+
+
+def get_partitions() -> List[Tuple[str, Optional[str], int]]:
+    """
+    返回上报表当前的分区列表：[(分区名, 上界字面值（MAXVALUE 时为 None）, 估算行数)]，按顺序排列。
+    表未分区时返回空列表。
+    """
+    _check_mysql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [_table()],
+        )
+        partitions = []
+        for name, description, rows in cursor.fetchall():
+            upper = None if description == 'MAXVALUE' else description.strip("'")
+            partitions.append((name, upper, rows or 0))
+        return partitions
+
+
+def init_partitioning(today: Optional[date] = None,
+                      interval_months: int = DEFAULT_INTERVAL_MONTHS,
+                      months_ahead: int = DEFAULT_MONTHS_AHEAD,
+                      dry_run: bool = False) -> List[str]:
+    """
+    把未分区的上报表转换为分区表，返回执行（或将要执行）的SQL。
+    当前周期之前的数据全部放在 p_history 分区中，之后随保留策略整体删除。
+    注意：转换会重建整张表，大表上耗时较长，应在维护窗口执行。
+    """
+    _check_mysql()
+    if get_partitions():
+        raise PartitioningNotSupported("上报表已经是分区表，无需初始化")
+
+    today = today or timezone.localdate()
+    first = period_start(today, interval_months)
+    clauses = [f"PARTITION p_history VALUES LESS THAN ('{boundary_value(first)}')"]
+    start = first
+    last = add_months(today, months_ahead)
+    while start <= last:
+        clauses.append(_partition_clause(start, interval_months))
+        start = add_months(start, interval_months)
+    clauses.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+    table = connection.ops.quote_name(_table())
+    statements = [
+        # 唯一键必须包含分区列：(sn, reported_at) 已满足，主键改为 (id, reported_at)
+        f"ALTER TABLE {table} MODIFY reported_at DATETIME(6) NOT NULL, DROP PRIMARY KEY, ADD PRIMARY KEY (id, reported_at)",
+        f"ALTER TABLE {table} PARTITION BY RANGE COLUMNS(reported_at) (\n    " + ",\n    ".join(clauses) + "\n)",
+    ]
+    _execute(statements, dry_run)
+    return statements
+
+
+def create_future_partitions(today: Optional[date] = None,
+                             interval_months: int = DEFAULT_INTERVAL_MONTHS,
+                             months_ahead: int = DEFAULT_MONTHS_AHEAD,
+                             dry_run: bool = False) -> List[str]:
+    """从 p_future 中拆分出覆盖到 today + months_ahead 的分区，返回新建的分区名"""
+    partitions = get_partitions()
+    if not partitions:
+        raise PartitioningNotSupported("上报表尚未分区，请先执行初始化")
+    if partitions[-1][0] != FUTURE_PARTITION:
+        raise PartitioningNotSupported(f"上报表的最后一个分区不是 {FUTURE_PARTITION}，无法自动拆分")
+
+    today = today or timezone.localdate()
+    # 从最后一个有界分区的上界开始续建，即使中间有几个月没有执行，新分区也是连续的
+    bounded = [upper for _, upper, _ in partitions if upper is not None]
+    if bounded:
+        start = local_date_of(bounded[-1])
+    else:
+        start = period_start(today, interval_months)
+
+    last = add_months(today, months_ahead)
+    clauses, created = [], []
+    while start <= last:
+        clauses.append(_partition_clause(start, interval_months))
+        created.append(partition_name(start))
+        start = add_months(start, interval_months)
+    if not clauses:
+        return []
+
+    clauses.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    table = connection.ops.quote_name(_table())
+    _execute([
+        f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO (\n    " + ",\n    ".join(clauses) + "\n)"
+    ], dry_run)
+    return created
+
+
+def drop_expired_partitions(today: Optional[date] = None,
+                            retention_months: int = DEFAULT_RETENTION_MONTHS,
+                            dry_run: bool = False) -> List[str]:
+    """
+    删除上界不晚于保留期起点的分区（分区内的数据全部过期），返回删除的分区名。
+    保留期起点为 today 所在月往前 retention_months 个月的1日。
+    """
+    partitions = get_partitions()
+    if not partitions:
+        raise PartitioningNotSupported("上报表尚未分区，请先执行初始化")
+
+    today = today or timezone.localdate()
+    cutoff = boundary_value(add_months(today, -retention_months))
+    expired = [name for name, upper, _ in partitions if upper is not None and upper <= cutoff]
+    # 至少保留一个有界分区在 p_future 之前，避免表中只剩兜底分区
+    if len(expired) >= len(partitions) - 1:
+        expired = expired[:len(partitions) - 2]
+    if expired:
+        table = connection.ops.quote_name(_table())
+        _execute([f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}"], dry_run)
+    return expired
+
+
+def _execute(statements: List[str], dry_run: bool):
+    if dry_run:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
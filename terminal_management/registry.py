@@ -0,0 +1,180 @@
+# terminal_management/registry.py
+
+# 进程内的端站/船舶注册表
+# 端站与船舶的对应关系只在操作员编辑时变化，但 GIS 推送、轨迹查询和各个页面每次都要查 SN → 端站 → 船舶。
+# 注册表一次性载入全部端站（附带所属船舶）和船舶，之后热路径直接读内存，不访问数据库。
+# 失效机制：
+#   - 本进程：signals.py 中 ShipInfo / TerminalInfo 的 post_save / post_delete 在事务提交后调用 invalidate()
+#   - 多进程（Web 工作进程、NM 服务）：invalidate() 同时递增 Redis 中的版本号，
+#     其他进程最多每 version_check_interval 秒读取一次版本号，发现变化后重新载入
+#   - Redis 不可用时退化为按 max_age 定期重新载入
+# 失效机制由 VersionedCache 实现，基站空间索引（bts_index）也使用它。
+# 注册表中的模型实例由所有调用方共享，只能读取，不能修改或保存（编辑页面仍应从数据库查询）。
+
+import threading
+from time import monotonic
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from config import get_config
+from utils import gl_logger
+from .models import ShipInfo, TerminalInfo
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+config = get_config()
+
+# 注册表配置
+DEFAULT_VERSION_CHECK_INTERVAL = config.get('registry_config.registry_version_check_interval', 1.0)   # 读取 Redis 版本号的最小间隔（秒）
+DEFAULT_MAX_AGE = config.get('registry_config.registry_max_age', 300.0)                               # 无论版本号是否变化，超过该时间后重新载入（秒）
+
+VERSION_KEY = "mbp:registry:version"
+
+
+class VersionedCache:
+    """
+    进程内只读缓存的失效机制：本进程的失效计数 + Redis 中的全局版本号 + 最长存活时间。
+    子类实现 _load(version)，在载入完成后调用 _mark_loaded(generation, version)。
+    """
+
+    version_key = None
+
+    def __init__(self, version_check_interval=DEFAULT_VERSION_CHECK_INTERVAL, max_age=DEFAULT_MAX_AGE):
+        self.version_check_interval = version_check_interval
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._generation = 0            # 本进程内每次失效加一，用于发现载入过程中发生的失效
+        self._loaded_generation = -1    # 当前数据对应的 _generation，不等于 _generation 时需要重新载入
+        self._version = None            # 当前数据对应的 Redis 版本号
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+        self._redis = None
+        self._redis_retry_at = 0.0      # Redis 出错后，在此时间之前不再访问 Redis
+
+    # --- 失效 ---
+
+    def invalidate(self):
+        """标记本进程的数据失效，并递增 Redis 版本号通知其他进程"""
+        self._generation += 1
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.incr(self.version_key)
+            except Exception as e:
+                self._redis_unavailable(e)
+
+    # --- 内部实现 ---
+
+    def _ensure_fresh(self):
+        now = monotonic()
+        if (self._loaded_generation == self._generation
+                and now - self._checked_at < self.version_check_interval
+                and now - self._loaded_at < self.max_age):
+            return
+
+        with self._lock:
+            now = monotonic()
+            version = self._remote_version()
+            self._checked_at = now
+            if (self._loaded_generation == self._generation
+                    and version == self._version
+                    and now - self._loaded_at < self.max_age):
+                return
+            self._load(version)
+
+    def _load(self, version):
+        raise NotImplementedError
+
+    def _mark_loaded(self, generation, version):
+        self._version = version
+        self._loaded_at = monotonic()
+        # 载入期间又发生了失效时，保持失效状态，下次读取时重新载入
+        self._loaded_generation = generation
+
+    def _get_redis(self):
+        if redis is None or monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            try:
+                redis_settings = settings.CHANNEL_LAYERS['default']['CONFIG']['hosts'][0]
+                self._redis = redis.Redis(host=redis_settings[0], port=redis_settings[1], decode_responses=True,
+                                          socket_timeout=0.5, socket_connect_timeout=0.5)
+            except Exception as e:
+                self._redis_unavailable(e)
+        return self._redis
+
+    def _remote_version(self):
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            return client.get(self.version_key)
+        except Exception as e:
+            self._redis_unavailable(e)
+            return None
+
+    def _redis_unavailable(self, error):
+        # 出错后 max_age 秒内不再访问 Redis，期间仅依靠本进程的信号和 max_age 失效
+        gl_logger.warning(f"{type(self).__name__} 无法使用 Redis 版本号（{error}），{self.max_age} 秒内多进程失效退化为定期重新载入")
+        self._redis_retry_at = monotonic() + self.max_age
+
+
+class TerminalRegistry(VersionedCache):
+    """
+    SN → 端站（附带船舶）、MMSI → 船舶 的只读内存索引
+    - get_terminal() / get_ship()：按主键读取
+    - terminals()：按船名、SN 排序的全部端站（页面下拉框的顺序）
+    - invalidate()：标记失效并通知其他进程
+    """
+
+    version_key = VERSION_KEY
+
+    def __init__(self, version_check_interval=DEFAULT_VERSION_CHECK_INTERVAL, max_age=DEFAULT_MAX_AGE):
+        super().__init__(version_check_interval, max_age)
+        self._terminals: Dict[str, TerminalInfo] = {}
+        self._ships: Dict[str, ShipInfo] = {}
+        self._ordered: List[TerminalInfo] = []
+
+    # --- 读取 ---
+
+    def get_terminal(self, sn) -> Optional[TerminalInfo]:
+        """按 SN 返回端站（ship 已载入），不存在时返回 None"""
+        self._ensure_fresh()
+        return self._terminals.get(sn)
+
+    def get_ship(self, mmsi) -> Optional[ShipInfo]:
+        """按 MMSI 返回船舶，不存在时返回 None"""
+        self._ensure_fresh()
+        return self._ships.get(mmsi)
+
+    def terminals(self) -> List[TerminalInfo]:
+        """全部端站，按船名、SN 排序"""
+        self._ensure_fresh()
+        return self._ordered
+
+    # --- 内部实现 ---
+
+    def _load(self, version):
+        generation = self._generation
+        ships = {ship.mmsi: ship for ship in ShipInfo.objects.all()}
+        ordered = list(TerminalInfo.objects.all().order_by('sn'))
+        for terminal in ordered:
+            # 端站共享同一个船舶实例
+            terminal.ship = ships[terminal.ship_id]
+        ordered.sort(key=lambda terminal: (terminal.ship.ship_name, terminal.sn))
+
+        self._ships = ships
+        self._terminals = {terminal.sn: terminal for terminal in ordered}
+        self._ordered = ordered
+        self._mark_loaded(generation, version)
+        gl_logger.debug(f"端站注册表已载入: {len(ordered)} 个端站, {len(ships)} 艘船舶 (version={version})")
+
+
+# 进程内唯一的注册表实例
+registry = TerminalRegistry()
@@ -0,0 +1,244 @@
+# terminal_management/report_archive.py
+
+# 历史上报记录的归档
+# 早于截止日期的上报记录按 端站/年/日 导出为压缩的列式文件后从数据库删除：
+#     <archive_dir>/<sn>/<YYYY>/<YYYY-MM-DD>.parquet    （安装了 pyarrow 时，zstd 压缩）
+#     <archive_dir>/<sn>/<YYYY>/<YYYY-MM-DD>.csv.gz     （未安装 pyarrow 时）
+# 日期按服务器时区划分。文件先写入临时文件再原子替换，写入成功后才删除数据库中的行；
+# 同一天重复归档时与已有文件合并（按 reported_at 去重），因此归档过程中断后可以直接重新执行。
+# services.iter_track_chunks（轨迹接口）在查询范围早于数据库中最早的上报时，透明地从归档文件读回。
+# SN 来自端站上报，用作目录名前先检查（check_sn），含路径分隔符或 '..' 的 SN 不归档也不读回。
+
+import csv
+import gzip
+import os
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from config import get_config
+from .models import TerminalReport
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:     # 可选依赖，未安装时归档为 csv.gz
+    pyarrow = None
+
+config = get_config()
+
+# 归档配置
+DEFAULT_ARCHIVE_DIR = config.get('report_archive_config.archive_dir', "archive/reports")     # 归档目录，相对路径相对于项目根目录
+DEFAULT_ARCHIVE_AFTER_DAYS = config.get('report_archive_config.archive_after_days', 180)     # 归档多少天之前的上报记录
+DEFAULT_ARCHIVE_FORMAT = config.get('report_archive_config.archive_format', "auto")          # auto（有 pyarrow 时用 parquet）/ parquet / csv
+
+FORMAT_PARQUET = 'parquet'
+FORMAT_CSV = 'csv'
+EXTENSIONS = {FORMAT_PARQUET: '.parquet', FORMAT_CSV: '.csv.gz'}
+
+DELETE_CHUNK_SIZE = 5000    # 归档后每个事务删除的行数
+CSV_NULL = r'\N'             # csv.gz 中表示空值（与空串区分，同 MySQL 导出的约定）
+
+# 归档的列：除自增主键外的全部字段
+ARCHIVE_FIELDS = [field for field in TerminalReport._meta.concrete_fields if not field.primary_key]
+ARCHIVE_FIELD_NAMES = [field.name for field in ARCHIVE_FIELDS]
+
+
+def archive_dir() -> Path:
+    path = Path(DEFAULT_ARCHIVE_DIR)
+    return path if path.is_absolute() else Path(settings.BASE_DIR) / path
+
+
+def resolve_format(archive_format: str = DEFAULT_ARCHIVE_FORMAT) -> str:
+    """确定实际使用的归档格式"""
+    if archive_format == 'auto':
+        return FORMAT_PARQUET if pyarrow is not None else FORMAT_CSV
+    if archive_format == FORMAT_PARQUET and pyarrow is None:
+        raise ValueError("归档格式为 parquet，但未安装 pyarrow")
+    if archive_format not in EXTENSIONS:
+        raise ValueError(f"未知的归档格式: {archive_format}，可选: auto / parquet / csv")
+    return archive_format
+
+
+def is_safe_sn(sn: str) -> bool:
+    """SN 能否直接用作归档目录名：非空，且不含路径分隔符、'..' 或空字符"""
+    separators = {'/', '\\', os.sep, os.altsep} - {None}
+    return bool(sn) and '..' not in sn and '\0' not in sn and not any(sep in sn for sep in separators)
+
+
+def check_sn(sn: str):
+    """在拼接归档路径之前拒绝不安全的 SN（见 is_safe_sn）"""
+    if not is_safe_sn(sn):
+        raise ValueError(f"SN {sn!r} 含有路径分隔符或 '..'，不能用于归档路径")
+
+
+def day_path(sn: str, day: date, archive_format: str) -> Path:
+    check_sn(sn)
+    return archive_dir() / sn / f"{day.year:04d}" / f"{day.isoformat()}{EXTENSIONS[archive_format]}"
+
+
+def find_day_file(sn: str, day: date) -> Optional[Path]:
+    """返回某端站某天的归档文件（任一格式），不存在时返回 None"""
+    for archive_format in EXTENSIONS:
+        path = day_path(sn, day, archive_format)
+        if path.exists():
+            return path
+    return None
+
+
+def day_bounds(day: date):
+    """某一天（服务器时区）对应的 [开始, 结束) 时刻"""
+    return (TerminalReport.combine_reported_at(day, time.min),
+            TerminalReport.combine_reported_at(day + timedelta(days=1), time.min))
+
+
+# -----------------------------------------------------------------------------
+# 文件读写
+# -----------------------------------------------------------------------------
+
+def _parquet_schema():
+    types = {
+        'CharField': pyarrow.string(),
+        'IntegerField': pyarrow.int64(),
+        'FloatField': pyarrow.float64(),
+        'DateField': pyarrow.date32(),
+        'TimeField': pyarrow.time64('us'),
+        'DateTimeField': pyarrow.timestamp('us', tz='UTC'),
+    }
+    return pyarrow.schema([(field.name, types[field.get_internal_type()]) for field in ARCHIVE_FIELDS])
+
+
+def _write_parquet(path: Path, rows: List[Dict]):
+    columns = {name: [row[name] for row in rows] for name in ARCHIVE_FIELD_NAMES}
+    table = pyarrow.Table.from_pydict(columns, schema=_parquet_schema())
+    pyarrow.parquet.write_table(table, path, compression='zstd')
+
+
+def _read_parquet(path: Path) -> List[Dict]:
+    return pyarrow.parquet.read_table(path).to_pylist()
+
+
+def _write_csv(path: Path, rows: List[Dict]):
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ARCHIVE_FIELD_NAMES)
+        for row in rows:
+            writer.writerow([CSV_NULL if row[name] is None else _csv_value(row[name]) for name in ARCHIVE_FIELD_NAMES])
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _read_csv(path: Path) -> List[Dict]:
+    fields = {field.name: field for field in ARCHIVE_FIELDS}
+    rows = []
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        for values in reader:
+            row = {}
+            for name, value in zip(header, values):
+                field = fields.get(name)
+                if field is None:
+                    continue
+                row[name] = None if value == CSV_NULL else field.to_python(value)
+            rows.append(row)
+    return rows
+
+
+def read_day_file(path: Path) -> List[Dict]:
+    """读取一个归档文件，返回字段名到值的字典列表"""
+    if path.name.endswith(EXTENSIONS[FORMAT_PARQUET]):
+        if pyarrow is None:
+            raise RuntimeError(f"读取归档文件 {path} 需要安装 pyarrow")
+        return _read_parquet(path)
+    return _read_csv(path)
+
+
+def write_day_file(sn: str, day: date, rows: List[Dict], archive_format: str) -> Path:
+    """
+    把某端站某天的上报写入归档文件，已有归档（任一格式）时合并去重，返回文件路径。
+    先写临时文件，成功后原子替换。
+    """
+    existing = find_day_file(sn, day)
+    if existing is not None:
+        merged = {row['reported_at']: row for row in read_day_file(existing)}
+        merged.update((row['reported_at'], row) for row in rows)
+        rows = list(merged.values())
+    rows.sort(key=lambda row: row['reported_at'])
+
+    path = day_path(sn, day, archive_format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + '.tmp')
+    if archive_format == FORMAT_PARQUET:
+        _write_parquet(temp_path, rows)
+    else:
+        _write_csv(temp_path, rows)
+    os.replace(temp_path, path)
+    if existing is not None and existing != path:
+        existing.unlink()
+    return path
+
+
+# -----------------------------------------------------------------------------
+# 归档与读回
+# -----------------------------------------------------------------------------
+
+def archive_sn_day(sn: str, day: date, archive_format: str, dry_run: bool = False) -> int:
+    """归档某端站某天的上报并从数据库删除，返回归档的行数"""
+    start_at, end_at = day_bounds(day)
+    queryset = TerminalReport.objects.filter(sn=sn, reported_at__gte=start_at, reported_at__lt=end_at)
+    rows = list(queryset.order_by('reported_at').values('id', *ARCHIVE_FIELD_NAMES))
+    if not rows or dry_run:
+        return len(rows)
+
+    ids = [row.pop('id') for row in rows]
+    write_day_file(sn, day, rows, archive_format)
+    for offset in range(0, len(ids), DELETE_CHUNK_SIZE):
+        with transaction.atomic():
+            TerminalReport.objects.filter(id__in=ids[offset:offset + DELETE_CHUNK_SIZE]).delete()
+    return len(rows)
+
+
+def archive_days(sn: str, cutoff_day: date) -> Iterable[date]:
+    """某端站早于 cutoff_day 且数据库中仍有上报的日期"""
+    cutoff_at = TerminalReport.combine_reported_at(cutoff_day, time.min)
+    day = None
+    while True:
+        queryset = TerminalReport.objects.filter(sn=sn, reported_at__lt=cutoff_at)
+        if day is not None:
+            queryset = queryset.filter(reported_at__gte=day_bounds(day)[1])
+        # 在 (sn, reported_at) 索引上逐天跳到下一条上报，跳过没有数据的日期
+        first = queryset.order_by('reported_at').values_list('reported_at', flat=True).first()
+        if first is None:
+            return
+        day = timezone.localtime(first).date()
+        yield day
+
+
+def iter_archived_rows(sn: str, start_time: datetime, end_time: datetime, newest_first: bool = False) -> Iterator[List[Dict]]:
+    """
+    逐天读取归档文件中 [start_time, end_time] 内的上报，每次产出一天的行（字段名到值的字典）。
+    内存占用只与单个端站一天的行数有关，供轨迹接口流式输出。
+    """
+    check_sn(sn)
+    first_day = timezone.localtime(start_time).date()
+    last_day = timezone.localtime(end_time).date()
+    step = timedelta(days=-1 if newest_first else 1)
+    day = last_day if newest_first else first_day
+    while first_day <= day <= last_day:
+        path = find_day_file(sn, day)
+        if path is not None:
+            rows = [row for row in read_day_file(path) if start_time <= row['reported_at'] <= end_time]
+            if rows:
+                rows.sort(key=lambda row: row['reported_at'], reverse=newest_first)
+                yield rows
+        day += step
+
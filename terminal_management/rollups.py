@@ -0,0 +1,239 @@
+# terminal_management/rollups.py
+
+# 信号与链路指标的分钟/小时/天汇总
+# 后台任务（manage.py rollup_metrics）按粒度维护各自的高水位线 processed_until：
+# 每次运行把 [processed_until, 当前时刻 - 延迟) 之间完整的时间桶从上报表汇总到对应的汇总表，再推进高水位线。
+# - 每个窗口只读取窗口内有上报的端站（直接从上报表的 reported_at 索引取出窗口内出现过的SN，
+#   不依赖最新状态表，未回填最新状态的历史数据也会被汇总），
+#   每个端站在 (sn, reported_at) 唯一索引上做一次范围扫描，内存占用与单个端站单个窗口内的行数成正比
+# - 汇总结果按 (sn, metric, bucket_start) 覆盖写入，重复汇总同一时间段是幂等的；
+#   迟到的上报（端站离线补传等）可以用 --rebuild-from 回退高水位线后重新汇总
+# - 分钟、小时汇总按保留期定期清理，长时间范围的趋势查询自动改用更粗的粒度
+
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from config import get_config
+from .models import (TerminalReport, MetricRollupMinute, MetricRollupHour, MetricRollupDay,
+                     MetricRollupWatermark)
+
+config = get_config()
+
+# 汇总任务配置
+DEFAULT_ROLLUP_LAG = config.get('metric_rollup_config.rollup_lag_seconds', 120)                 # 只汇总早于（当前时刻 - 延迟）的时间桶，等待迟到的上报
+DEFAULT_ROLLUP_INTERVAL = config.get('metric_rollup_config.rollup_interval', 60)                # 常驻运行时两次汇总的间隔（秒）
+DEFAULT_MAX_POINTS = config.get('metric_rollup_config.rollup_max_points', 500)                  # 趋势查询自动选择粒度时，每个指标最多返回的时间桶数
+MINUTE_RETENTION_DAYS = config.get('metric_rollup_config.rollup_minute_retention_days', 30)     # 分钟汇总保留天数，0 表示不清理
+HOUR_RETENTION_DAYS = config.get('metric_rollup_config.rollup_hour_retention_days', 400)        # 小时汇总保留天数，0 表示不清理
+DAY_RETENTION_DAYS = config.get('metric_rollup_config.rollup_day_retention_days', 0)            # 日汇总保留天数，0 表示不清理
+
+# 参与汇总的上报字段
+METRIC_FIELDS = ('rsrp', 'sinr', 'rssi', 'upstream_rate', 'downstream_rate', 'temp', 'humi')
+
+GRANULARITY_MINUTE = 'minute'
+GRANULARITY_HOUR = 'hour'
+GRANULARITY_DAY = 'day'
+
+READ_CHUNK_SIZE = 5000      # 读取上报记录时每次从游标取出的行数
+WRITE_BATCH_SIZE = 1000     # 汇总结果每批写入的行数
+DELETE_CHUNK_SIZE = 5000    # 清理过期汇总时每个事务删除的行数
+
+
+class Granularity:
+    """一种汇总粒度：时间桶长度、单次汇总的窗口长度、汇总表与保留期"""
+
+    def __init__(self, name, model, bucket, window, retention_days):
+        self.name = name
+        self.model = model
+        self.bucket = bucket
+        self.window = window
+        self.retention_days = retention_days
+
+    def floor(self, value):
+        """value 所在时间桶的起点（服务器时区）"""
+        local = timezone.localtime(value)
+        if self.name == GRANULARITY_MINUTE:
+            return local.replace(second=0, microsecond=0)
+        if self.name == GRANULARITY_HOUR:
+            return local.replace(minute=0, second=0, microsecond=0)
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# 按从细到粗的顺序排列
+GRANULARITIES: Dict[str, Granularity] = {
+    GRANULARITY_MINUTE: Granularity(GRANULARITY_MINUTE, MetricRollupMinute, timedelta(minutes=1), timedelta(hours=1),
+                                    MINUTE_RETENTION_DAYS),
+    GRANULARITY_HOUR: Granularity(GRANULARITY_HOUR, MetricRollupHour, timedelta(hours=1), timedelta(days=1),
+                                  HOUR_RETENTION_DAYS),
+    GRANULARITY_DAY: Granularity(GRANULARITY_DAY, MetricRollupDay, timedelta(days=1), timedelta(days=1),
+                                 DAY_RETENTION_DAYS),
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """已排序序列的分位数（线性插值，与 numpy.percentile 的默认算法一致）"""
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _summarize(model, sn, metric, bucket_start, values: List[float]):
+    values.sort()
+    return model(
+        sn=sn,
+        metric=metric,
+        bucket_start=bucket_start,
+        count=len(values),
+        min_value=values[0],
+        max_value=values[-1],
+        avg_value=sum(values) / len(values),
+        p05_value=percentile(values, 0.05),
+        p50_value=percentile(values, 0.50),
+        p95_value=percentile(values, 0.95),
+    )
+
+
+def _rollup_sn(granularity: Granularity, sn, start, end) -> list:
+    """汇总单个端站在 [start, end) 内的上报，返回汇总表实例列表"""
+    bucket_seconds = granularity.bucket.total_seconds()
+    # 桶序号 -> 每个指标的样本列表
+    buckets: Dict[int, List[List[float]]] = {}
+    rows = (TerminalReport.objects
+            .filter(sn=sn, reported_at__gte=start, reported_at__lt=end)
+            .values_list('reported_at', *METRIC_FIELDS))
+    for reported_at, *values in rows.iterator(chunk_size=READ_CHUNK_SIZE):
+        index = int((reported_at - start).total_seconds() // bucket_seconds)
+        samples = buckets.get(index)
+        if samples is None:
+            samples = buckets[index] = [[] for _ in METRIC_FIELDS]
+        for metric_samples, value in zip(samples, values):
+            if value is not None:
+                metric_samples.append(value)
+
+    results = []
+    for index, samples in buckets.items():
+        bucket_start = start + granularity.bucket * index
+        for metric, values in zip(METRIC_FIELDS, samples):
+            if values:
+                results.append(_summarize(granularity.model, sn, metric, bucket_start, values))
+    return results
+
+
+def _write_rollups(model, rollups: list):
+    conflict_target = {}
+    if connection.features.supports_update_conflicts_with_target:
+        # MySQL 的 ON DUPLICATE KEY UPDATE 不支持指定冲突列，其余数据库需要指定
+        conflict_target['unique_fields'] = ['sn', 'metric', 'bucket_start']
+    for offset in range(0, len(rollups), WRITE_BATCH_SIZE):
+        model.objects.bulk_create(
+            rollups[offset:offset + WRITE_BATCH_SIZE],
+            update_conflicts=True,
+            update_fields=model.value_field_names(),
+            **conflict_target
+        )
+
+
+def rollup_window(granularity: Granularity, start, end) -> int:
+    """
+    汇总 [start, end) 内的全部时间桶并把高水位线推进到 end，返回写入的汇总行数。
+    start 和 end 必须对齐到该粒度的时间桶边界。
+    """
+    # 端站列表取自窗口内的上报本身：最新状态表可能缺少某些端站（0010 之前写入而未执行 backfill_latest_state 的数据、
+    # 绕过 upsert 的写入路径），以它为准会漏掉这些端站，而高水位线照样越过该窗口，留下永久的空缺
+    sns = list(TerminalReport.objects.filter(reported_at__gte=start, reported_at__lt=end)
+               .values_list('sn', flat=True).distinct().order_by())
+    rollups = []
+    for sn in sns:
+        rollups.extend(_rollup_sn(granularity, sn, start, end))
+    with transaction.atomic():
+        _write_rollups(granularity.model, rollups)
+        MetricRollupWatermark.objects.update_or_create(
+            granularity=granularity.name, defaults={'processed_until': end}
+        )
+    return len(rollups)
+
+
+def get_watermark(granularity: Granularity):
+    """返回该粒度已汇总到的时刻（服务器时区）；从未汇总过时从最早的上报开始，没有上报时返回 None"""
+    watermark = MetricRollupWatermark.objects.filter(granularity=granularity.name).first()
+    if watermark is not None:
+        return timezone.localtime(watermark.processed_until)
+    earliest = (TerminalReport.objects.filter(reported_at__isnull=False)
+                .order_by('reported_at').values_list('reported_at', flat=True).first())
+    return granularity.floor(earliest) if earliest is not None else None
+
+
+def reset_watermark(granularity: Granularity, since):
+    """把高水位线回退到 since 所在的时间桶，下次运行时从该处重新汇总（用于迟到的上报）"""
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    MetricRollupWatermark.objects.update_or_create(
+        granularity=granularity.name, defaults={'processed_until': granularity.floor(since)}
+    )
+
+
+def run_rollups(names: Optional[Iterable[str]] = None, now=None, lag_seconds=DEFAULT_ROLLUP_LAG) -> Dict[str, int]:
+    """
+    把各粒度的汇总推进到（now - lag）所在时间桶的起点，返回 {粒度: 写入的汇总行数}。
+    每个窗口单独提交，中途中断后下次运行从已提交的高水位线继续。
+    """
+    now = now or timezone.now()
+    written = {}
+    for name in names or GRANULARITIES:
+        granularity = GRANULARITIES[name]
+        target = granularity.floor(now - timedelta(seconds=lag_seconds))
+        start = get_watermark(granularity)
+        if start is not None and granularity.retention_days > 0:
+            # 超出保留期的时间桶汇总后也会被清理，直接跳过
+            start = max(start, granularity.floor(now - timedelta(days=granularity.retention_days)))
+        written[name] = 0
+        while start is not None and start < target:
+            # 跳过没有任何上报的时间段（端站离线、首次汇总历史数据时的空档）
+            next_at = (TerminalReport.objects.filter(reported_at__gte=start, reported_at__lt=target)
+                       .order_by('reported_at').values_list('reported_at', flat=True).first())
+            if next_at is None:
+                MetricRollupWatermark.objects.update_or_create(
+                    granularity=granularity.name, defaults={'processed_until': target}
+                )
+                break
+            start = max(start, granularity.floor(next_at))
+            end = min(granularity.floor(start + granularity.window), target)
+            written[name] += rollup_window(granularity, start, end)
+            start = end
+    return written
+
+
+def prune_rollups(now=None) -> Dict[str, int]:
+    """按保留期分块删除过期的汇总数据，返回 {粒度: 删除的行数}"""
+    now = now or timezone.now()
+    deleted = {}
+    for name, granularity in GRANULARITIES.items():
+        deleted[name] = 0
+        if granularity.retention_days <= 0:
+            continue
+        cutoff = now - timedelta(days=granularity.retention_days)
+        model = granularity.model
+        while True:
+            ids = list(model.objects.filter(bucket_start__lt=cutoff).values_list('id', flat=True)[:DELETE_CHUNK_SIZE])
+            if not ids:
+                break
+            with transaction.atomic():
+                count, _ = model.objects.filter(id__in=ids).delete()
+            deleted[name] += count
+    return deleted
+
+
+def choose_granularity(start, end, max_points=DEFAULT_MAX_POINTS, now=None) -> Granularity:
+    """选择时间桶数不超过 max_points、且在保留期内的最细粒度"""
+    now = now or timezone.now()
+    span = end - start
+    for granularity in GRANULARITIES.values():
+        if granularity.retention_days > 0 and start < now - timedelta(days=granularity.retention_days):
+            continue
+        if span / granularity.bucket <= max_points:
+            return granularity
+    return GRANULARITIES[GRANULARITY_DAY]
@@ -1,12 +1,15 @@
 # terminal_management/services.py
 
-from django.db import transaction, IntegrityError
+from django.db import connection, transaction, IntegrityError
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from .models import ShipInfo, TerminalInfo, BaseStationInfo, TerminalReport
+from .models import ShipInfo, TerminalInfo, BaseStationInfo, TerminalReport, TerminalLatestState, MetricRollupWatermark
+from . import outbox, rollups, report_archive, track_simplify
+from .registry import registry
+from .bts_index import bts_index
 from django.db.models import Q
 from django.utils import timezone
 from utils import gl_logger
-from datetime import datetime
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
 # -----------------------------------------------------------------------------
 # 统一的返回格式说明
@@ -18,6 +21,12 @@ from datetime import datetime
 # -----------------------------------------------------------------------------
 
 
+# 轨迹抽稀需要读取的字段：坐标，以及变化时必须保留的基站、PCI、系统状态
+SIMPLIFY_FIELDS = ('long', 'lat', 'bts_name', 'pci', 'system_stat')
+# 抽稀时上报时刻转为整数微秒的起点
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
 # =============================================================================
 # 船舶信息 (ShipInfo) 操作函数
 # =============================================================================
@@ -107,6 +116,19 @@ def get_terminal_by_sn(sn):
     except Exception as e:
         return (False, f"查询端站时发生未知错误: {e}")
 
+def get_cached_terminal_by_sn(sn):
+    """
+    从进程内的端站注册表获取端站（ship 已载入），不访问数据库。
+    返回的实例由多个调用方共享，只能读取；需要修改端站时请使用 get_terminal_by_sn。
+    """
+    try:
+        terminal = registry.get_terminal(sn)
+        if terminal is None:
+            return (False, f"SN码为 '{sn}' 的端站不存在。")
+        return (True, terminal)
+    except Exception as e:
+        return (False, f"查询端站时发生未知错误: {e}")
+
 def create_terminal(sn, ship_mmsi, ip_address=None, port_number=None):
     """创建一个新的端站。"""
     try:
@@ -150,12 +172,15 @@ def update_terminal(sn, new_ship_mmsi, new_ip_address=None, new_port_number=None
 def update_terminal_network_info(sn, ip_address, port):
     """
     根据SN码更新端站的网络信息（IP地址和端口号）。
-    使用事务以确保操作的原子性。
+    使用事务以确保操作的原子性。地址未变化时不保存：保存会使端站注册表失效并推送 terminal_update，
+    而同步 NM 服务在每个心跳和上报时都会调用这里。
     """
     try:
         with transaction.atomic():
             # 先获取对象
             terminal = TerminalInfo.objects.get(sn=sn)
+            if terminal.ip_address == ip_address and terminal.port_number == port:
+                return (True, f"SN '{sn}' 的网络信息未变化。")
             # 再更新字段并保存
             terminal.ip_address = ip_address
             terminal.port_number = port
@@ -167,6 +192,52 @@ def update_terminal_network_info(sn, ip_address, port):
     except Exception as e:
         return (False, f"更新SN '{sn}' 的网络信息时发生错误: {e}")
 
+def get_terminal_network_snapshot():
+    """
+    一次查询取出所有端站的网络信息，用于NM服务启动时预热缓存。
+    成功时返回 {sn: (ip_address, port_number, last_seen)}。
+    """
+    try:
+        rows = TerminalInfo.objects.values_list('sn', 'ip_address', 'port_number', 'last_seen')
+        return (True, {sn: (ip_address, port_number, last_seen) for sn, ip_address, port_number, last_seen in rows})
+    except Exception as e:
+        return (False, f"获取端站网络信息时发生错误: {e}")
+
+def sync_terminal_network_info(sn, ip_address, port, last_seen):
+    """
+    以数据库为准核对端站的网络信息：地址变化时更新 IP、端口和最后在线时间（触发 post_save 推送），
+    地址未变时只更新最后在线时间（不触发信号）。
+    成功时返回地址是否发生了变化。
+    """
+    try:
+        with transaction.atomic():
+            terminal = TerminalInfo.objects.select_for_update().get(sn=sn)
+            if terminal.ip_address == ip_address and terminal.port_number == port:
+                TerminalInfo.objects.filter(sn=sn).update(last_seen=last_seen)
+                return (True, False)
+            terminal.ip_address = ip_address
+            terminal.port_number = port
+            terminal.last_seen = last_seen
+            terminal.save(update_fields=['ip_address', 'port_number', 'last_seen'])
+        return (True, True)
+    except TerminalInfo.DoesNotExist:
+        return (False, f"更新失败：未找到SN为 '{sn}' 的端站。")
+    except Exception as e:
+        return (False, f"更新SN '{sn}' 的网络信息时发生错误: {e}")
+
+def bulk_update_terminal_last_seen(last_seen_by_sn, batch_size=500):
+    """
+    批量写入端站的最后在线时间 {sn: last_seen}，每批一条 UPDATE 语句，不触发信号。
+    已被删除的端站会被忽略。成功时返回提交的端站数。
+    """
+    try:
+        terminals = [TerminalInfo(sn=sn, last_seen=last_seen) for sn, last_seen in last_seen_by_sn.items()]
+        with transaction.atomic():
+            TerminalInfo.objects.bulk_update(terminals, ['last_seen'], batch_size=batch_size)
+        return (True, len(terminals))
+    except Exception as e:
+        return (False, f"批量更新端站最后在线时间时发生错误: {e}")
+
 def delete_terminal(sn):
     """根据 SN 码删除一个端站。"""
     try:
@@ -242,6 +313,37 @@ def delete_base_station(bts_id):
     except Exception as e:
         return (False, f"删除基站时发生未知错误: {e}")
 
+def get_covering_base_stations(long, lat):
+    """获取覆盖指定位置的基站列表 [(基站, 距离公里)]，按距离由近到远排列（进程内空间索引）。"""
+    try:
+        return (True, bts_index.covering(long, lat))
+    except Exception as e:
+        return (False, f"查询覆盖基站时发生错误: {e}")
+
+def get_nearest_base_stations(long, lat, k=1, max_distance=None):
+    """获取距指定位置最近的 k 个基站 [(基站, 距离公里)]，按距离由近到远排列（进程内空间索引）。"""
+    try:
+        return (True, bts_index.nearest(long, lat, k, max_distance))
+    except Exception as e:
+        return (False, f"查询最近基站时发生错误: {e}")
+
+def get_base_stations_in_bbox(min_long, min_lat, max_long, max_lat):
+    """获取经纬度矩形范围内的基站列表，按基站ID排序（进程内空间索引）。"""
+    try:
+        return (True, bts_index.in_bbox(min_long, min_lat, max_long, max_lat))
+    except Exception as e:
+        return (False, f"查询范围内基站时发生错误: {e}")
+
+def get_latest_position_by_sn(sn):
+    """根据SN码获取端站最新上报的经纬度 (long, lat)。"""
+    try:
+        position = TerminalLatestState.objects.filter(sn=sn).values_list('long', 'lat').first()
+        if position is None or None in position:
+            return (False, f"端站 '{sn}' 没有带经纬度的上报。")
+        return (True, position)
+    except Exception as e:
+        return (False, f"查询端站位置时发生错误: {e}")
+
 # =============================================================================
 # 端站上报信息 (TerminalReport) 操作函数
 # =============================================================================
@@ -255,17 +357,127 @@ def create_terminal_report(**kwargs):
         # 上报信息是日志型数据，单条写入，事务不是必须的，但使用无害
         with transaction.atomic():
             report = TerminalReport.objects.create(**kwargs)
+            # 与上报记录在同一事务中更新端站最新状态
+            upsert_latest_states([report])
             return (True, report)
     except IntegrityError:
         # 这会捕获违反 unique_together 约束的错误
-        return (False, "创建失败：在同一时间点，该设备已有上报记录（type, sn, date, time 组合重复）。")
+        return (False, "创建失败：在同一时间点，该设备已有上报记录（sn, 上报时刻 组合重复）。")
     except Exception as e:
         return (False, f"创建上报记录时发生未知错误: {e}")
 
+def bulk_create_terminal_reports(rows):
+    """
+    批量创建端站上报记录（供NM服务的批量写入器使用）。
+    rows 为字段字典的列表。批内 (sn, 上报时刻) 重复的行只保留第一条，库内已有的 (sn, 上报时刻) 先查询出来跳过，
+    只插入、统计和推送真正新增的行。插入不使用 ignore_conflicts：MySQL 的 INSERT IGNORE 会把非法值强制转换后写入，
+    数据错误（以及与其他进程并发写入造成的冲突）必须让整批失败，由调用方退化为逐行写入。
+    成功时返回 {'rows': 实际插入的行数, 'duplicates': 批内及与库内重复的行数, 'outbox': 推送事件（outbox.ReportOutbox）}。
+    bulk_create 不触发 post_save，实时推送由调用方在事务提交后发布 outbox（写入器在事件循环中调用 publish()）。
+    """
+    try:
+        unique_reports = {}
+        for row in rows:
+            report = TerminalReport(**row)
+            # bulk_create 不调用 save()，需要在这里合成 reported_at
+            report.fill_reported_at()
+            unique_reports.setdefault((report.sn, report.reported_at), report)
+
+        with transaction.atomic():
+            existing = _existing_report_keys(unique_reports)
+            reports = [report for key, report in unique_reports.items() if key not in existing]
+            TerminalReport.objects.bulk_create(reports)
+            # 与上报记录在同一事务中更新端站最新状态
+            latest = _upsert_latest_states(reports)
+
+        # 数据已经提交，构造推送事件失败只记录警告，不能让调用方误以为写入失败
+        try:
+            report_outbox = build_report_outbox(reports, latest)
+        except Exception as e:
+            gl_logger.warning(f"批量上报记录已写入，但构造实时推送时出错: {e}")
+            report_outbox = outbox.ReportOutbox()
+
+        return (True, {'rows': len(reports), 'duplicates': len(rows) - len(reports), 'outbox': report_outbox})
+    except Exception as e:
+        return (False, f"批量创建上报记录时发生未知错误: {e}")
+
+def _existing_report_keys(keys):
+    """一批 (sn, 上报时刻) 中库内已存在的键；按 (sn, reported_at) 唯一索引查询，没有上报时刻的行不会冲突"""
+    sns = {sn for sn, reported_at in keys if reported_at is not None}
+    moments = {reported_at for sn, reported_at in keys if reported_at is not None}
+    if not sns:
+        return set()
+    candidates = TerminalReport.objects.filter(sn__in=sns, reported_at__in=moments).values_list('sn', 'reported_at')
+    return {key for key in candidates if key in keys}
+
+def build_report_outbox(reports, latest_reports):
+    """
+    为一批已提交的上报构造推送事件。每条上报推送一次上报消息；antenna / GIS 页面数据每个端站只构造一次，
+    附在该端站最后一条上报之后。latest_reports 为成为端站最新状态的上报（_upsert_latest_states 的返回值），
+    这些端站不访问数据库，其余端站读取一次最新状态表。
+    """
+    latest_by_sn = {report.sn: report for report in latest_reports}
+    by_sn = {}
+    for report in reports:
+        by_sn.setdefault(report.sn, []).append(report)
+
+    report_outbox = outbox.ReportOutbox()
+    for sn, sn_reports in by_sn.items():
+        success, payloads = build_realtime_payloads(sn, latest_by_sn.get(sn))
+        if not success:
+            gl_logger.warning(f"构造实时推送数据失败 (SN: {sn}): {payloads}")
+            payloads = None
+        for index, report in enumerate(sn_reports):
+            last = index == len(sn_reports) - 1
+            report_outbox.add(sn, outbox.sn_frames(outbox.report_message(report), payloads if last else None))
+    return report_outbox
+
+def upsert_latest_states(reports):
+    """
+    用一批上报记录更新各端站的最新状态（TerminalLatestState），返回更新的端站数。
+    每个端站只取批内最新的一条，且只有比库中已有状态更新时才覆盖，乱序到达的旧上报不会回退状态。
+    应在写入上报记录的同一事务中调用；异常直接抛出，由调用方的事务回滚。
+    """
+    return len(_upsert_latest_states(reports))
+
+def _upsert_latest_states(reports):
+    """upsert_latest_states 的实现，返回成为各端站最新状态的上报记录列表"""
+    newest = {}
+    for report in reports:
+        if report.reported_at is None:
+            continue
+        current = newest.get(report.sn)
+        if current is None or report.reported_at > current.reported_at:
+            newest[report.sn] = report
+    if not newest:
+        return []
+
+    # 锁住已有的状态行，避免多个工作进程同时更新同一端站时后写入的旧数据覆盖新数据
+    existing = dict(
+        TerminalLatestState.objects.select_for_update().filter(sn__in=list(newest)).values_list('sn', 'reported_at')
+    )
+    updated = [
+        report for sn, report in newest.items()
+        if existing.get(sn) is None or report.reported_at > existing[sn]
+    ]
+    states = [TerminalLatestState.from_report(report) for report in updated]
+    if states:
+        conflict_target = {}
+        if connection.features.supports_update_conflicts_with_target:
+            # MySQL 的 ON DUPLICATE KEY UPDATE 不支持指定冲突列，其余数据库需要指定
+            conflict_target['unique_fields'] = ['sn']
+        TerminalLatestState.objects.bulk_create(
+            states,
+            update_conflicts=True,
+            update_fields=TerminalLatestState.state_field_names(),
+            **conflict_target
+        )
+    return updated
+
 def get_reports_by_sn(sn, limit=100):
     """根据 SN 码查询最新的 N 条上报记录。"""
     try:
-        reports = TerminalReport.objects.filter(sn=sn).order_by('-report_date', '-report_time')[:limit]
+        reports = TerminalReport.objects.filter(sn=sn).order_by('-reported_at')[:limit]
         return (True, reports)
     except Exception as e:
         return (False, f"按SN码查询上报记录时发生错误: {e}")
@@ -273,8 +485,10 @@ def get_reports_by_sn(sn, limit=100):
 def get_reports_by_date_range(start_date, end_date):
     """根据日期范围查询上报记录。"""
     try:
-        # __range 查询操作符用于范围查询
-        reports = TerminalReport.objects.filter(report_date__range=(start_date, end_date)).order_by('report_date', 'report_time')
+        # 换算成 [开始日期 00:00, 结束日期次日 00:00) 的时刻范围
+        start_at = TerminalReport.combine_reported_at(start_date, time.min)
+        end_at = TerminalReport.combine_reported_at(end_date + timedelta(days=1), time.min)
+        reports = TerminalReport.objects.filter(reported_at__gte=start_at, reported_at__lt=end_at).order_by('reported_at')
         return (True, reports)
     except Exception as e:
         return (False, f"按日期范围查询上报记录时发生错误: {e}")
@@ -294,15 +508,40 @@ def delete_report_by_id(report_id):
     except Exception as e:
         return (False, f"删除上报记录时发生未知错误: {e}")
 
+def delete_reports_before(cutoff, chunk_size=5000):
+    """
+    删除上报时刻早于 cutoff 的历史上报记录（数据保留策略）。
+    在 reported_at 索引上按范围取出主键后分块删除，每块单独提交，避免长时间锁表。
+    成功时返回删除的总行数。
+    """
+    try:
+        if timezone.is_naive(cutoff):
+            cutoff = timezone.make_aware(cutoff)
+        deleted = 0
+        while True:
+            ids = list(TerminalReport.objects.filter(reported_at__lt=cutoff).order_by('reported_at')
+                       .values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                count, _ = TerminalReport.objects.filter(id__in=ids).delete()
+            deleted += count
+        return (True, deleted)
+    except Exception as e:
+        return (False, f"清理历史上报记录时发生未知错误: {e}")
+
 # =============================================================================
 # 端站数据与状态页面 (Antenna) 操作函数
 # =============================================================================
 
 def get_latest_report_by_sn(sn):
-    """根据 SN 码查询最新的一条上报记录。"""
+    """
+    根据 SN 码查询最新的一条上报记录。
+    从端站最新状态表按主键读取，返回 TerminalLatestState 实例（字段与 TerminalReport 相同）。
+    """
     # 仅查询，无需使用atomic确保原子性
     try:
-        report = TerminalReport.objects.filter(sn=sn).order_by('-report_date', '-report_time').first()
+        report = TerminalLatestState.objects.filter(sn=sn).first()
         if report:
             return (True, report)
         else:
@@ -310,6 +549,14 @@ def get_latest_report_by_sn(sn):
     except Exception as e:
         return (False, f"按SN码查询最新上报记录时发生错误: {e}")
 
+def get_all_latest_states():
+    """获取所有端站的最新状态（船队总览），按 SN 排序。"""
+    try:
+        states = TerminalLatestState.objects.all().order_by('sn')
+        return (True, states)
+    except Exception as e:
+        return (False, f"获取端站最新状态列表时发生错误: {e}")
+
 # =============================================================================
 # GIS 页面相关操作函数
 # =============================================================================
@@ -351,35 +598,65 @@ def get_latest_report_by_sn(sn):
 #     except Exception as e:
 #         return (False, f"根据MMSI和时间查询轨迹数据时发生错误: {e}")
 
-def get_reports_by_sn_and_time(sn, start_time, end_time):
+def iter_track_chunks(sn, start_time, end_time, fields, chunk_size=2000, tolerance=None):
     """
-    根据船舶MMSI和时间范围，查询该船所有端站的上报记录。
-    结果按照上报时间倒序排列 (从新到旧)。
+    按上报时间倒序 (从新到旧) 分块产出端站在 [start_time, end_time] 内的上报，每块是字段名到值的字典列表，
+    每行都带有 reported_at。供轨迹接口流式输出，内存占用只与 chunk_size 有关，与时间范围无关。
+    - 数据库部分：在 (sn, reported_at) 唯一索引上做键集分页，每次取 chunk_size 行，
+      下一块从上一块最后一行的 reported_at 之前继续（MySQL 驱动会把整个结果集读入客户端，.iterator() 无法限制内存）
+    - 早于数据库中最早一条上报的部分从归档文件逐天读回（见 report_archive）
+    - tolerance（米）不为空时按 Douglas–Peucker 抽稀（见 track_simplify）：第一遍只读取坐标和
+      基站/PCI/系统状态，累积为紧凑数组（每点约25字节）计算保留的点，第二遍按上报时刻输出这些点的完整字段
+    这是生成器，查询出错时异常直接抛给调用方。
     """
-    try:
-        local_start_time = timezone.localtime(start_time)
-        local_end_time = timezone.localtime(end_time)
-        # 由于时间和日期是分开的字段，我们需要构造一个稍微复杂的查询
-        start_date = local_start_time.date()
-        start_t = local_start_time.time()
-        end_date = local_end_time.date()
-        end_t = local_end_time.time()
-
-        reports = TerminalReport.objects.filter(
-            sn=sn,
-            # 日期部分在此范围内
-            report_date__range=(start_date, end_date)
-        ).exclude(
-            # 排除掉开始日期里，时间早于开始时间的部分
-            Q(report_date=start_date, report_time__lt=start_t) |
-            # 排除掉结束日期里，时间晚于结束时间的部分
-            Q(report_date=end_date, report_time__gt=end_t)
-        ).order_by('-report_date', '-report_time') # 先按日期降序，再按时间降序
-
-        return (True, reports)
-
-    except Exception as e:
-        return (False, f"根据sn和时间查询轨迹数据时发生错误: {e}")
+    # 未带时区的时间按服务器时区解释
+    if timezone.is_naive(start_time):
+        start_time = timezone.make_aware(start_time)
+    if timezone.is_naive(end_time):
+        end_time = timezone.make_aware(end_time)
+
+    if tolerance is not None:
+        track = track_simplify.TrackAccumulator()
+        for chunk in iter_track_chunks(sn, start_time, end_time, SIMPLIFY_FIELDS, chunk_size):
+            for row in chunk:
+                track.add(_timestamp_us(row['reported_at']), row['long'], row['lat'],
+                          tuple(row[field] for field in SIMPLIFY_FIELDS[2:]))
+        kept = {track.stamps[i] for i in track_simplify.simplify_anchored(track.longs, track.lats, track.anchors, tolerance)}
+        del track
+        for chunk in iter_track_chunks(sn, start_time, end_time, fields, chunk_size):
+            chunk = [row for row in chunk if _timestamp_us(row['reported_at']) in kept]
+            if chunk:
+                yield chunk
+        return
+
+    columns = ['reported_at', *(field for field in fields if field != 'reported_at')]
+    earliest = (TerminalReport.objects.filter(sn=sn, reported_at__isnull=False)
+                .order_by('reported_at').values_list('reported_at', flat=True).first())
+
+    # 数据库中的上报
+    upper = {'reported_at__lte': end_time}
+    while earliest is not None:
+        chunk = list(TerminalReport.objects
+                     .filter(sn=sn, reported_at__gte=start_time, **upper)
+                     .order_by('-reported_at')
+                     .values(*columns)[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            break
+        upper = {'reported_at__lt': chunk[-1]['reported_at']}
+
+    # 已归档的上报
+    if earliest is None or start_time < earliest:
+        archived_end = end_time if earliest is None else min(end_time, earliest - timedelta(microseconds=1))
+        for rows in report_archive.iter_archived_rows(sn, start_time, archived_end, newest_first=True):
+            for offset in range(0, len(rows), chunk_size):
+                yield rows[offset:offset + chunk_size]
+
+def _timestamp_us(moment):
+    """带时区的时刻转为整数微秒（抽稀时用于在两遍读取之间对应同一行）"""
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
 
 def get_latest_report_for_gis_by_sn(sn):
     """
@@ -387,37 +664,127 @@ def get_latest_report_for_gis_by_sn(sn):
     此函数包含GIS实时更新所需的所有关联信息（MMSI, IP等）。
     """
     try:
-        terminal = TerminalInfo.objects.select_related('ship').get(sn=sn)
-        ship = terminal.ship
-        report_dict = {}
+        # 端站和船舶信息从进程内注册表读取
+        terminal = registry.get_terminal(sn)
+        if terminal is None:
+            raise TerminalInfo.DoesNotExist
+
+        # 从端站最新状态表按主键读取
+        latest_report = TerminalLatestState.objects.filter(sn=sn).first()
+        if not latest_report:
+            gl_logger.info(f"端站 (SN: {sn}) 暂无上报数据，GIS更新将只包含基本信息。")
+        return (True, _gis_report_dict(terminal, latest_report))
+    except TerminalInfo.DoesNotExist:
+        return (False, f"SN为 '{sn}' 的端站不存在。")
+    except Exception as e:
+        return (False, f"为GIS查询最新上报记录时发生错误: {e}")
 
-        try:
-            latest_report = TerminalReport.objects.filter(sn=sn).order_by('-report_date', '-report_time').first()
-            # 遍历模型的所有字段，将它们添加到字典中
-            for field in latest_report._meta.fields:
-                report_dict[field.name] = str(getattr(latest_report, field.name))
+def _state_dict(state):
+    """最新状态的全部字段转为字符串字典（antenna / GIS 页面使用的格式）"""
+    state_dict = {}
+    for field in state._meta.fields:
+        value = getattr(state, field.name)
+        if isinstance(value, datetime) and timezone.is_aware(value):
+            # 与从数据库读出的值一致，统一按UTC输出
+            value = value.astimezone(dt_timezone.utc)
+        state_dict[field.name] = str(value)
+    return state_dict
+
+def _gis_report_dict(terminal, state):
+    report_dict = _state_dict(state) if state else {}
+    # 无论有无上报，都附加必要的关联信息
+    ship = terminal.ship
+    report_dict['ship_name'] = ship.ship_name
+    report_dict['mmsi'] = ship.mmsi
+    report_dict['ip_address'] = terminal.ip_address
+    report_dict['port_number'] = terminal.port_number
+    if 'sn' not in report_dict:
+        report_dict['sn'] = terminal.sn
+    return report_dict
+
+def build_realtime_payloads(sn, latest_report=None, terminal=None):
+    """
+    为一次实时推送构造 antenna 页面和 GIS 页面的数据，每次广播只在信号处理器中构造一次，
+    各 DataConsumer 直接转发，不再逐连接查询数据库。
+    - latest_report: 已知是该端站最新状态的上报记录（批量写入时由 upsert_latest_states 确定），此时不访问数据库；
+      为 None 时按主键读取一次最新状态表
+    - terminal: 刚被修改的端站实例（注册表要到事务提交后才失效）；默认从注册表读取
+    返回 {'antenna': 最新状态字典或 None, 'gis': GIS 字典或 None}。
+    """
+    try:
+        if latest_report is not None:
+            state = TerminalLatestState.from_report(latest_report)
+        else:
+            state = TerminalLatestState.objects.filter(sn=sn).first()
+        if terminal is None:
+            terminal = registry.get_terminal(sn)
+        return (True, {
+            'antenna': _state_dict(state) if state else None,
+            'gis': _gis_report_dict(terminal, state) if terminal is not None else None,
+        })
+    except Exception as e:
+        return (False, f"构造实时推送数据时发生错误: {e}")
 
-            # 外键 sn 需要的是字符串值，而不是对象
-            # report_dict['sn'] = latest_report.sn.sn 
 
-        except TerminalReport.DoesNotExist:
-            gl_logger.info(f"端站 (SN: {sn}) 暂无上报数据，GIS更新将只包含基本信息。")
+# =============================================================================
+# 信号与链路指标趋势 (MetricRollup) 操作函数
+# =============================================================================
 
-        # 无论有无上报，都附加必要的关联信息
-        # report_dict['sn'] = terminal.sn
-        report_dict['ship_name'] = ship.ship_name
-        report_dict['mmsi'] = ship.mmsi
-        report_dict['ip_address'] = terminal.ip_address
-        report_dict['port_number'] = terminal.port_number
+def get_metric_trend(sn, start_time, end_time, metrics=None, granularity=None):
+    """
+    从汇总表查询端站在时间范围内的指标趋势，不扫描上报大表。
+    - metrics: 指标名列表，默认全部（rollups.METRIC_FIELDS）
+    - granularity: 'minute' / 'hour' / 'day'，默认按时间跨度自动选择（每个指标最多约 rollup_max_points 个时间桶）
+    成功时返回字典：{'sn', 'granularity', 'processed_until', 'series': {指标名: [时间桶统计, ...]}}，
+    processed_until 之后的数据尚未汇总。
+    """
+    try:
+        if timezone.is_naive(start_time):
+            start_time = timezone.make_aware(start_time)
+        if timezone.is_naive(end_time):
+            end_time = timezone.make_aware(end_time)
+
+        metrics = list(metrics or rollups.METRIC_FIELDS)
+        unknown = [metric for metric in metrics if metric not in rollups.METRIC_FIELDS]
+        if unknown:
+            return (False, f"不支持的指标: {', '.join(unknown)}")
+        if granularity is None:
+            rollup = rollups.choose_granularity(start_time, end_time)
+        elif granularity in rollups.GRANULARITIES:
+            rollup = rollups.GRANULARITIES[granularity]
+        else:
+            return (False, f"不支持的汇总粒度: {granularity}")
 
-        if 'sn' not in report_dict:
-            report_dict['sn'] = terminal.sn
-        
-        return (True, report_dict)
-    except TerminalInfo.DoesNotExist:
-        return (False, f"SN为 '{sn}' 的端站不存在。")
+        series = {metric: [] for metric in metrics}
+        rows = rollup.model.objects.filter(
+            sn=sn,
+            metric__in=metrics,
+            bucket_start__gte=rollup.floor(start_time),
+            bucket_start__lte=end_time,
+        ).order_by('metric', 'bucket_start').values_list(
+            'metric', 'bucket_start', 'count', 'min_value', 'max_value', 'avg_value', 'p05_value', 'p50_value', 'p95_value'
+        )
+        for metric, bucket_start, count, min_value, max_value, avg_value, p05, p50, p95 in rows:
+            series[metric].append({
+                'time': timezone.localtime(bucket_start).isoformat(),
+                'count': count,
+                'min': min_value,
+                'max': max_value,
+                'avg': avg_value,
+                'p05': p05,
+                'p50': p50,
+                'p95': p95,
+            })
+
+        watermark = MetricRollupWatermark.objects.filter(granularity=rollup.name).first()
+        return (True, {
+            'sn': sn,
+            'granularity': rollup.name,
+            'processed_until': timezone.localtime(watermark.processed_until).isoformat() if watermark else None,
+            'series': series,
+        })
     except Exception as e:
-        return (False, f"为GIS查询最新上报记录时发生错误: {e}")
+        return (False, f"查询指标趋势时发生错误: {e}")
 
 
 # =============================================================================
@@ -451,8 +818,8 @@ def get_terminals_with_ship_info():
     获取带船舶信息的端站列表，按船名和SN排序。
     """
     try:
-        # 使用 select_related 预加载 ship 外键关联的对象，避免N+1查询
-        terminals = TerminalInfo.objects.select_related('ship').all().order_by('ship__ship_name', 'sn')
+        # 从进程内注册表读取（已按船名、SN 排序，ship 已载入），返回的实例只能读取
+        terminals = registry.terminals()
         return (True, terminals)
     except Exception as e:
         return (False, f"获取端站列表时发生错误: {e}")
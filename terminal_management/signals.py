@@ -1,12 +1,49 @@
 # terminal_management/signals.py
 
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-import json
+from utils import gl_logger, json_codec
 
 from .models import ShipInfo, TerminalInfo, BaseStationInfo, TerminalReport
+from .registry import registry
+from .bts_index import bts_index
+from . import services
+from .groups import DATA_UPDATES_GROUP, TOPIC_INVENTORY
+from .outbox import group_events, report_message, sn_frames
+
+
+def broadcast_update(channel_layer, message, payloads=None):
+    """
+    广播一条更新消息。消息和 antenna / GIS 页面数据都在这里编码一次，各个 consumer 直接转发，
+    不再逐连接重复编码或查询数据库。帧格式见 outbox.py，consumer 只转发连接声明的主题（见 groups.py），
+    同一端站同一帧类型的帧按连接限速合并（见 coalescer.py）：
+    - 上报消息（latest_report_data，antenna 主题）和 payloads（services.build_realtime_payloads 构造）
+      发往该端站的订阅组和船队组
+    - 船舶/端站/基站的增删改（inventory 主题）发往 data_updates 组
+    """
+    sn = message.get('sn')
+    if message.get('type') != 'latest_report_data':
+        # 注意，这里的'type'是 'send_update', 它会调用 consumer 中的 send_update 方法
+        text = json_codec.dumps({'message': message})
+        async_to_sync(channel_layer.group_send)(
+            DATA_UPDATES_GROUP, {'type': 'send_update', 'frames': [[TOPIC_INVENTORY, message.get('type'), text, None]]}
+        )
+    frames = sn_frames(message, payloads)
+    if sn and frames:
+        for group, event in group_events([{'sn': sn, 'frames': frames}]).items():
+            async_to_sync(channel_layer.group_send)(group, event)
+
+
+def build_payloads(sn, latest_report=None, terminal=None):
+    """构造 antenna / GIS 页面数据，失败时只记录警告（仍然广播基本消息）"""
+    success, payloads = services.build_realtime_payloads(sn, latest_report, terminal)
+    if not success:
+        gl_logger.warning(f"构造实时推送数据失败 (SN: {sn}): {payloads}")
+        return None
+    return payloads
 
 
 # =============================================================================
@@ -19,6 +56,8 @@ def ship_update_handler(sender, instance, **kwargs):
     """
     当 船舶信息 被保存后，发送 WebSocket 消息。
     """
+    # 事务提交后使端站注册表失效（本进程及其他进程）
+    transaction.on_commit(registry.invalidate)
     channel_layer = get_channel_layer()
     message = {
         'type': 'ship_update',
@@ -27,16 +66,15 @@ def ship_update_handler(sender, instance, **kwargs):
         'call_sign': instance.call_sign,
         'ship_owner': instance.ship_owner
     }
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        {'type': 'send_update', 'message': message}
-    )
+    broadcast_update(channel_layer, message)
 
 @receiver(post_save, sender=TerminalInfo)
 def terminal_update_handler(sender, instance, **kwargs):
     """
     当 端站信息 被保存后，发送 WebSocket 消息。
     """
+    # 事务提交后使端站注册表失效（本进程及其他进程）
+    transaction.on_commit(registry.invalidate)
     channel_layer = get_channel_layer()
     message = {
         'type': 'terminal_update',
@@ -46,16 +84,16 @@ def terminal_update_handler(sender, instance, **kwargs):
         'ip_address': instance.ip_address,
         'port_number': instance.port_number
     }
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        {'type': 'send_update', 'message': message}
-    )
+    # 端站地址变化时 GIS 页面需要刷新，注册表尚未失效，直接用当前实例构造
+    broadcast_update(channel_layer, message, build_payloads(instance.sn, terminal=instance))
 
 @receiver(post_save, sender=BaseStationInfo)
 def basestation_update_handler(sender, instance, **kwargs):
     """
     当 基站信息 被保存后，发送 WebSocket 消息。
     """
+    # 事务提交后使基站空间索引失效（本进程及其他进程）
+    transaction.on_commit(bts_index.invalidate)
     channel_layer = get_channel_layer()
     message = {
         'type': 'basestation_update',
@@ -64,10 +102,7 @@ def basestation_update_handler(sender, instance, **kwargs):
         'longitude': instance.longitude,
         'latitude': instance.latitude
     }
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        {'type': 'send_update', 'message': message}
-    )
+    broadcast_update(channel_layer, message)
 
 # --- 删除信号处理器 ---
 
@@ -76,45 +111,42 @@ def ship_delete_handler(sender, instance, **kwargs):
     """
     当 船舶信息 被删除后，发送 WebSocket 消息。
     """
+    # 事务提交后使端站注册表失效（本进程及其他进程）
+    transaction.on_commit(registry.invalidate)
     channel_layer = get_channel_layer()
     message = {
         'type': 'ship_delete',
         'mmsi': instance.mmsi,
     }
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        {'type': 'send_update', 'message': message}
-    )
+    broadcast_update(channel_layer, message)
 
 @receiver(post_delete, sender=TerminalInfo)
 def terminal_delete_handler(sender, instance, **kwargs):
     """
     当 端站信息 被删除后，发送 WebSocket 消息。
     """
+    # 事务提交后使端站注册表失效（本进程及其他进程）
+    transaction.on_commit(registry.invalidate)
     channel_layer = get_channel_layer()
     message = {
         'type': 'terminal_delete',
         'sn': instance.sn,
     }
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        {'type': 'send_update', 'message': message}
-    )
+    broadcast_update(channel_layer, message)
 
 @receiver(post_delete, sender=BaseStationInfo)
 def basestation_delete_handler(sender, instance, **kwargs):
     """
     当 基站信息 被删除后，发送 WebSocket 消息。
     """
+    # 事务提交后使基站空间索引失效（本进程及其他进程）
+    transaction.on_commit(bts_index.invalidate)
     channel_layer = get_channel_layer()
     message = {
         'type': 'basestation_delete',
         'bts_id': instance.bts_id,
     }
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        {'type': 'send_update', 'message': message}
-    )
+    broadcast_update(channel_layer, message)
 
 # =============================================================================
 # antenna——端站数据与状态相关函数
@@ -125,36 +157,13 @@ def basestation_delete_handler(sender, instance, **kwargs):
 def terminal_report_handler(sender, instance, **kwargs):
     """
     当新的 端站上报信息 被保存后，发送 WebSocket 消息。
-    这个信号是“端站数据与状态”页面实时更新的核心。
+    这个信号只处理后台编辑、单条创建等 ORM 操作；采集服务的批量写入不触发 post_save，
+    由写入器在事务提交后从事件循环直接发布（见 outbox.py）。
     """
-    channel_layer = get_channel_layer()
-    
-    # 准备要发送的数据 (将模型实例转换为字典)
-    report_data = {
-        'type': instance.type, 'sn': instance.sn, 'report_date': str(instance.report_date),
-        'report_time': str(instance.report_time), 'op': instance.op, 'op_sub': instance.op_sub,
-        'long': instance.long, 'lat': instance.lat, 'theory_yaw': instance.theory_yaw,
-        'yaw': instance.yaw, 'pitch': instance.pitch, 'roll': instance.roll,
-        'yao_limit_state': instance.yao_limit_state, 'temp': instance.temp, 'humi': instance.humi,
-        'bts_name': instance.bts_name, 'bts_long': instance.bts_long, 'bts_lat': instance.bts_lat,
-        'bts_number': instance.bts_number, 'bts_group_number': instance.bts_group_number,
-        'bts_r': instance.bts_r, 'upstream_rate': instance.upstream_rate,
-        'downstream_rate': instance.downstream_rate, 'standard': instance.standard,
-        'plmn': instance.plmn, 'cellid': instance.cellid, 'pci': instance.pci,
-        'rsrp': instance.rsrp, 'sinr': instance.sinr, 'rssi': instance.rssi,
-        'system_stat': instance.system_stat, "wireless_network_stat": instance.wireless_network_stat,
-    }
+    transaction.on_commit(lambda: broadcast_report(instance))
 
-    # 封装成前端可识别的格式
-    message = {
-        'type': 'latest_report_data', # 与JS端获取最新数据时使用的类型一致
-        'sn': instance.sn,
-        'data': report_data
-    }
 
-    # 向组内广播消息
-    async_to_sync(channel_layer.group_send)(
-        'data_updates',
-        # 注意，这里的'type'是 'send_update', 它会调用 consumer 中的 send_update 方法
-        {'type': 'send_update', 'message': message}
-    )
\ No newline at end of file
+def broadcast_report(instance):
+    channel_layer = get_channel_layer()
+    # 只向订阅了该端站的连接和订阅了整个船队的连接广播，antenna / GIS 页面数据在这里构造一次
+    broadcast_update(channel_layer, report_message(instance), build_payloads(instance.sn))
@@ -1,3 +1,449 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from utils import json_codec
+
+# 测试使用进程内的 Channel Layer，不依赖 Redis
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+# =============================================================================
+# 控制指令应答的匹配与转发（acu.pending_requests / NM_Service_async）
+# =============================================================================
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ControlResponseForwardingTests(TestCase):
+
+    def test_pop_accepts_default(self):
+        from acu.pending_requests import PendingRequestTable
+        table = PendingRequestTable()
+        table.add('r1', 'udp-reply-r1', 5.0)
+        self.assertIsNone(table.pop('missing', None))
+        self.assertEqual(table.pop('r1', None)['reply_channel'], 'udp-reply-r1')
+        self.assertNotIn('r1', table)
+
+    async def test_reply_is_matched_and_forwarded(self):
+        from acu.NM_Service_async import NM_ServiceAsync
+        service = NM_ServiceAsync()
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add('udp-reply-r1', channel)
+        service.pending_requests.add('r1', 'udp-reply-r1', 5.0)
+
+        reply = {'request_id': 'r1', 'op': 'query_ans', 'op_sub': 'version', 'sn': 'sn0001'}
+        await service.dispatch_message(reply, ('127.0.0.1', 5000))
+
+        message = await asyncio.wait_for(channel_layer.receive(channel), timeout=1)
+        self.assertEqual(message['type'], 'udp.reply')
+        self.assertEqual(json_codec.loads(message['message']), reply)
+        self.assertNotIn('r1', service.pending_requests)
+
+    def test_sync_service_notifies_timeout(self):
+        import threading
+        import time
+        from acu.NM_Service import NM_Service
+        service = NM_Service()
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('udp-reply-r2', channel)
+        pending = service._NM_Service__pending_requests
+        pending.add('r2', 'udp-reply-r2', 0.05)
+
+        # 只运行超时检查线程（不绑定UDP端口、不连接Redis）
+        service._NM_Service__expiry_loop_active = True
+        thread = threading.Thread(target=service._NM_Service__expiry_loop)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while 'r2' in pending and time.monotonic() < deadline:
+                time.sleep(0.05)
+            time.sleep(0.1)
+        finally:
+            service._NM_Service__expiry_loop_active = False
+            thread.join(5)
+
+        self.assertNotIn('r2', pending)
+        message = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(message, {'type': 'udp.timeout', 'request_id': 'r2'})
+
+
+# =============================================================================
+# 下发给端站的消息编码（utils.json_codec）
+# =============================================================================
+
+class TerminalMessageEncodingTests(TestCase):
+
+    def test_downlink_bytes_are_unchanged(self):
+        import json
+        payload = {'op': 'cmd', 'op_sub': 'set_bts', 'sn': 'sn0001', 'request_id': 'r1',
+                   'bts_name': '1号基站', 'long': 120.5, 'values': [1, 2]}
+        self.assertEqual(json_codec.encode_terminal_message(payload), json.dumps(payload).encode('utf-8'))
+
+
+# =============================================================================
+# 上报接收流水线的溢出策略（acu.ingest_pipeline）
+# =============================================================================
+
+class IngestOverflowTests(TestCase):
+
+    def test_shed_heartbeat_matches_linear_scan(self):
+        import random
+        from acu.ingest_pipeline import IngestPipeline, OVERFLOW_SHED_HEARTBEAT
+
+        async def handler(*args):
+            pass
+
+        pipeline = IngestPipeline(handler, workers=1, queue_size=16, overflow_policy=OVERFLOW_SHED_HEARTBEAT)
+        partition = pipeline._partitions[0]
+        expected = []   # 原来的实现：线性查找最旧的心跳并从中间删除
+        rng = random.Random(0)
+        for index in range(5000):
+            if rng.random() < 0.3 and expected:
+                self.assertEqual(partition.popleft(), expected.pop(0)[1])
+                continue
+            heartbeat = rng.random() < 0.6
+            if len(expected) >= 16:
+                shed = next((i for i, (beat, _) in enumerate(expected) if beat), 0)
+                del expected[shed]
+            expected.append((heartbeat, (index,)))
+            self.assertTrue(pipeline.put_nowait('sn', (index,), heartbeat))
+            self.assertEqual(len(partition), len(expected))
+            self.assertLessEqual(len(partition.items), 2 * 16 + 1)
+        self.assertEqual([partition.popleft() for _ in range(len(partition))], [args for _, args in expected])
+        self.assertGreater(pipeline.stats['shed_heartbeats'], 0)
+        self.assertGreater(pipeline.stats['dropped_oldest'], 0)
+
+
+# =============================================================================
+# 上报消息到模型字段的转换（acu.report_mapping）
+# =============================================================================
+
+class ReportMappingTests(TestCase):
+
+    def test_null_markers_become_none(self):
+        from acu.report_mapping import map_report
+        model_data = map_report({'sn': 'sn0001', 'date': '2026-01-01', 'time': '08:00:00', 'rsrp': 'N/A', 'pci': ''})
+        self.assertIsNone(model_data['rsrp'])
+        self.assertIsNone(model_data['pci'])
+
+    def test_malformed_nullable_value_is_rejected(self):
+        from acu.report_mapping import map_report
+        with self.assertRaisesRegex(ValueError, r"rsrp.*'abc'.*sn0001"):
+            map_report({'sn': 'sn0001', 'date': '2026-01-01', 'time': '08:00:00', 'rsrp': 'abc'})
+
+
+# =============================================================================
+# 轨迹抽稀（services.iter_track_chunks / track_simplify）
+# =============================================================================
+
+class TrackSimplifyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ShipInfo, TerminalInfo, TerminalReport
+        ship = ShipInfo.objects.create(mmsi='412000901', ship_name='测试船', ship_owner='测试')
+        TerminalInfo.objects.create(sn='track0001', ship=ship, ip_address='127.0.0.1', port_number=5000)
+        cls.end = timezone.localtime().replace(microsecond=0)
+        cls.start = cls.end - timedelta(hours=2)
+        reports = []
+        for i in range(1000):
+            reported_at = timezone.localtime(cls.start + timedelta(seconds=5 * i))
+            reports.append(TerminalReport(
+                type='t', sn='track0001', op='report', op_sub='s',
+                report_date=reported_at.date(), report_time=reported_at.time(), reported_at=reported_at,
+                long=120.0 + i * 1e-4 + (i % 7) * 1e-6, lat=30.0 + (i % 50) * 1e-5 if i % 200 else None,
+                bts_name=f"{i // 300}号基站", pci=i // 300, system_stat=1,
+            ))
+        TerminalReport.objects.bulk_create(reports)
+
+    def test_chunked_simplify_matches_whole_track(self):
+        from . import services, track_simplify
+        rows = [row for chunk in services.iter_track_chunks('track0001', self.start, self.end,
+                                                             services.SIMPLIFY_FIELDS, chunk_size=64)
+                for row in chunk]
+        expected = track_simplify.simplify(
+            [row['long'] for row in rows], [row['lat'] for row in rows],
+            [[row[field] for row in rows] for field in services.SIMPLIFY_FIELDS[2:]], 5.0)
+
+        simplified = [row for chunk in services.iter_track_chunks('track0001', self.start, self.end, ('sn', 'pci'),
+                                                                   chunk_size=64, tolerance=5.0)
+                      for row in chunk]
+        self.assertEqual([row['reported_at'] for row in simplified], [rows[i]['reported_at'] for i in expected])
+        self.assertLess(len(simplified), len(rows))
+        # 基站切换前后的点和缺少经纬度的点都保留
+        kept = {row['reported_at'] for row in simplified}
+        for i in (0, 199, 299, 300, 400, len(rows) - 1):
+            self.assertIn(rows[i]['reported_at'], kept)
+
+    def test_track_view_rejects_invalid_tolerance_and_zoom(self):
+        from django.contrib.auth.models import User
+        from django.urls import reverse
+        self.client.force_login(User.objects.create_user('track_viewer'))
+        url = reverse('get_ship_track')
+        params = {'sn': 'track0001', 'start_time': self.start.isoformat(), 'end_time': self.end.isoformat()}
+        for name, value in (('tolerance', 'nan'), ('tolerance', 'inf'), ('tolerance', '-1'), ('tolerance', '0'),
+                            ('tolerance', 'abc'), ('zoom', 'nan'), ('zoom', '-inf')):
+            response = self.client.get(url, {**params, name: value})
+            self.assertEqual(response.status_code, 400, f"{name}={value}")
+
+        response = self.client.get(url, {**params, 'zoom': '12'})
+        self.assertEqual(response.status_code, 200)
+        points = json_codec.loads(b''.join(response.streaming_content))
+        self.assertGreater(len(points), 2)
+
+
+# =============================================================================
+# 实时推送的扇出（outbox.ReportOutbox / DataConsumer.send_update）
+# =============================================================================
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RealtimeFanOutTests(TestCase):
+
+    def _frames(self, sn):
+        """与 services.build_report_outbox 相同的方式构造一条上报的推送帧（在断言之外完成）"""
+        from django.utils import timezone
+        from . import outbox, services
+        from .models import ShipInfo, TerminalInfo, TerminalReport
+        now = timezone.localtime()
+        ship = ShipInfo(mmsi='412000902', ship_name='推送测试船', ship_owner='测试')
+        terminal = TerminalInfo(sn=sn, ship=ship, ip_address='127.0.0.1', port_number=5000)
+        report = TerminalReport(type='t', sn=sn, op='report', op_sub='s', report_date=now.date(), report_time=now.time(),
+                                long=120.0, lat=30.0, yaw=10.0, pci=1, bts_name='1号基站', system_stat=1)
+        report.fill_reported_at()
+        success, payloads = services.build_realtime_payloads(sn, report, terminal)
+        self.assertTrue(success, payloads)
+        return outbox.sn_frames(outbox.report_message(report), payloads)
+
+    async def _connect(self, path, subscription):
+        from channels.testing import WebsocketCommunicator
+        from .consumers import DataConsumer
+        communicator = WebsocketCommunicator(DataConsumer.as_asgi(), path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to(subscription)
+        state = await communicator.receive_json_from()
+        self.assertEqual(state['message']['type'], 'subscription_state')
+        return communicator
+
+    def test_fan_out_does_not_query_database(self):
+        frames_a = self._frames('fanout0001')
+        frames_b = self._frames('fanout0002')
+        # 连接、订阅、发布和接收全部在断言内完成，consumer 的任何数据库访问都会被计入
+        with self.assertNumQueries(0):
+            received, fleet_received = async_to_sync(self._fan_out)(frames_a, frames_b)
+
+        # 只订阅 fanout0001 的 antenna 连接收到该端站的 report 和 antenna 帧
+        self.assertEqual([message['message']['kind'] for message in received], ['report', 'antenna'])
+        self.assertTrue(all(message['message']['data']['sn'] == 'fanout0001' for message in received))
+        # 船队订阅的 gis 连接收到两个端站的 GIS 帧
+        self.assertEqual([message['message']['kind'] for message in fleet_received], ['gis', 'gis'])
+
+    async def _fan_out(self, frames_a, frames_b):
+        from .outbox import ReportOutbox
+        subscriber = await self._connect('/ws/data/?topics=antenna', {'type': 'subscribe', 'sns': ['fanout0001']})
+        fleet = await self._connect('/ws/data/?topics=gis&deltas=1', {'type': 'subscribe', 'fleet': True})
+
+        pending = ReportOutbox()
+        pending.add('fanout0001', frames_a)
+        pending.add('fanout0002', frames_b)
+        await pending.publish()
+        received = [await subscriber.receive_json_from() for _ in range(2)]
+        fleet_received = [await fleet.receive_json_from() for _ in range(2)]
+        self.assertTrue(await subscriber.receive_nothing())
+        self.assertTrue(await fleet.receive_nothing())
+        await subscriber.disconnect()
+        await fleet.disconnect()
+        return received, fleet_received
+
+
+# =============================================================================
+# 端站网络信息更新（services.update_terminal_network_info，同步 NM 服务使用）
+# =============================================================================
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TerminalNetworkInfoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import ShipInfo, TerminalInfo
+        ship = ShipInfo.objects.create(mmsi='412000903', ship_name='网络测试船', ship_owner='测试')
+        TerminalInfo.objects.create(sn='net0001', ship=ship, ip_address='10.0.0.1', port_number=5000)
+
+    def test_unchanged_address_is_not_saved(self):
+        from django.db.models.signals import post_save
+        from . import services
+        from .models import TerminalInfo
+        saved = []
+
+        def receiver(sender, instance, **kwargs):
+            saved.append(instance.sn)
+
+        post_save.connect(receiver, sender=TerminalInfo)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(services.update_terminal_network_info('net0001', '10.0.0.1', 5000)[0])
+            self.assertEqual(saved, [])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(services.update_terminal_network_info('net0001', '10.0.0.2', 5001)[0])
+            self.assertEqual(saved, ['net0001'])
+        finally:
+            post_save.disconnect(receiver, sender=TerminalInfo)
+        terminal = TerminalInfo.objects.get(sn='net0001')
+        self.assertEqual((terminal.ip_address, terminal.port_number), ('10.0.0.2', 5001))
+
+
+# =============================================================================
+# 端站网络信息缓存（acu.terminal_network_cache）
+# =============================================================================
+
+class TerminalNetworkCacheTests(TestCase):
+
+    async def test_unknown_sns_are_capped_and_pruned(self):
+        from acu.terminal_network_cache import TerminalNetworkCache
+        cache = TerminalNetworkCache(unknown_retry=0.05, unknown_max=3)
+        for index in range(5):
+            success, _ = await cache.touch(f'unknown{index}', '10.0.0.1', 5000)
+            self.assertFalse(success)
+        self.assertEqual(list(cache._unknown), ['unknown2', 'unknown3', 'unknown4'])
+        self.assertEqual(cache.stats['unknown_evicted'], 2)
+
+        # 再次出现的SN排到末尾，不会因为最早加入而先被丢弃
+        await asyncio.sleep(0.06)
+        await cache.touch('unknown2', '10.0.0.1', 5000)
+        self.assertEqual(list(cache._unknown)[-1], 'unknown2')
+
+        await cache.flush()
+        self.assertEqual(list(cache._unknown), ['unknown2'])
+        await asyncio.sleep(0.06)
+        await cache.flush()
+        self.assertEqual(len(cache._unknown), 0)
+
+
+# =============================================================================
+# 上报批量写入（services.bulk_create_terminal_reports / acu.report_writer）
+# =============================================================================
+
+def _report_row(sn, reported_at, **fields):
+    from django.utils import timezone
+    local = timezone.localtime(reported_at)
+    row = {'type': 't', 'sn': sn, 'op': 'report', 'op_sub': 's', 'report_date': local.date(),
+           'report_time': local.time(), 'long': 120.0, 'lat': 30.0, 'system_stat': 1}
+    row.update(fields)
+    return row
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BulkReportWriteTests(TestCase):
+
+    def setUp(self):
+        from django.utils import timezone
+        self.now = timezone.localtime().replace(microsecond=0)
+
+    def test_conflicting_rows_are_not_counted_or_published(self):
+        from datetime import timedelta
+        from . import services
+        from .models import TerminalReport
+        first = self.now - timedelta(seconds=10)
+        services.create_terminal_report(**_report_row('bulk0001', first))
+
+        rows = [_report_row('bulk0001', first, yaw=1.0),         # 与库内已有记录冲突
+                _report_row('bulk0001', self.now),
+                _report_row('bulk0001', self.now, yaw=2.0),      # 批内重复
+                _report_row('bulk0002', self.now)]
+        success, result = services.bulk_create_terminal_reports(rows)
+        self.assertTrue(success, result)
+        self.assertEqual((result['rows'], result['duplicates']), (2, 2))
+        self.assertEqual(len(result['outbox']), 2)
+        self.assertEqual(TerminalReport.objects.filter(sn='bulk0001').count(), 2)
+        self.assertIsNone(TerminalReport.objects.get(sn='bulk0001', reported_at=first).yaw)
+
+    def test_invalid_row_fails_the_batch(self):
+        from . import services
+        from .models import TerminalReport
+        rows = [_report_row('bulk0003', self.now), _report_row('bulk0004', self.now, pci='not-a-number')]
+        success, _ = services.bulk_create_terminal_reports(rows)
+        self.assertFalse(success)
+        self.assertFalse(TerminalReport.objects.filter(sn__in=['bulk0003', 'bulk0004']).exists())
+
+    async def test_stop_waits_for_the_batch_in_progress(self):
+        from acu.report_writer import ReportBatchWriter
+        writer = ReportBatchWriter(batch_size=2, flush_interval=60)
+        started = asyncio.Event()
+        bulk_create = writer.bulk_create_terminal_reports_async
+
+        async def slow_bulk_create(rows):
+            started.set()
+            await asyncio.sleep(0.05)
+            return await bulk_create(rows)
+
+        writer.bulk_create_terminal_reports_async = slow_bulk_create
+        await writer.start()
+        await writer.submit(_report_row('bulk0005', self.now))
+        await writer.submit(_report_row('bulk0006', self.now))
+        await writer.submit(_report_row('bulk0007', self.now))
+        await asyncio.wait_for(started.wait(), timeout=1)
+        await writer.stop()
+
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(writer.stats['rows'], 3)
+        self.assertEqual(writer.stats['batches'], 2)
+        self.assertEqual(writer.stats['published_updates'], 3)
+
+
+# =============================================================================
+# 上报归档（report_archive）
+# =============================================================================
+
+class ReportArchivePathTests(TestCase):
+
+    def test_unsafe_sn_is_rejected_before_building_paths(self):
+        from datetime import date
+        from . import report_archive
+        day = date(2026, 1, 1)
+        self.assertEqual(report_archive.day_path('sn000001', day, 'csv').parent.parent,
+                         report_archive.archive_dir() / 'sn000001')
+        for sn in ('', '..', '../etc', 'a/b', 'a\\b', 'sn..1'):
+            self.assertFalse(report_archive.is_safe_sn(sn))
+            with self.assertRaises(ValueError):
+                report_archive.day_path(sn, day, 'csv')
+        with self.assertRaises(ValueError):
+            next(report_archive.iter_archived_rows('../x', *report_archive.day_bounds(day)))
+
+
+# =============================================================================
+# 指标汇总（rollups）
+# =============================================================================
+
+class MetricRollupTests(TestCase):
+
+    def test_window_includes_sns_without_latest_state(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from . import rollups
+        from .models import MetricRollupHour, MetricRollupWatermark, TerminalLatestState, TerminalReport
+        granularity = rollups.GRANULARITIES[rollups.GRANULARITY_HOUR]
+        start = granularity.floor(timezone.now() - timedelta(hours=3))
+        end = start + timedelta(hours=1)
+
+        # 直接写入上报表、没有最新状态行的端站（如 0010 之前写入且未回填的数据）
+        reports = []
+        for minute in range(0, 60, 10):
+            reported_at = timezone.localtime(start + timedelta(minutes=minute))
+            reports.append(TerminalReport(type='t', sn='rollup0001', op='report', op_sub='s',
+                                          report_date=reported_at.date(), report_time=reported_at.time(),
+                                          reported_at=reported_at, rsrp=-90.0 - minute))
+        TerminalReport.objects.bulk_create(reports)
+        self.assertFalse(TerminalLatestState.objects.filter(sn='rollup0001').exists())
+
+        written = rollups.rollup_window(granularity, start, end)
+        self.assertGreater(written, 0)
+        rollup = MetricRollupHour.objects.get(sn='rollup0001', metric='rsrp', bucket_start=start)
+        self.assertEqual(rollup.count, 6)
+        self.assertEqual(MetricRollupWatermark.objects.get(granularity=granularity.name).processed_until, end)
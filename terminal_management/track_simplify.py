@@ -0,0 +1,183 @@
+# terminal_management/track_simplify.py
+
+# 轨迹抽稀
+# 高频上报时一段时间内的轨迹有数万个点，而地图上只有几百像素长。轨迹接口带 tolerance（米）或 zoom（百度地图缩放级别）
+# 参数时，先用 Douglas–Peucker 算法抽稀，只返回偏离折线超过容差的点：
+#   - 基站（bts_name）、PCI 或系统状态（system_stat）发生变化的位置（变化前后两个点）始终保留，
+#     作为分段的锚点，Douglas–Peucker 在相邻锚点之间分别进行
+#   - 经纬度按轨迹的平均纬度投影为平面米坐标后计算点到线段的距离
+#   - 缺少经纬度的点同样保留（前端按原样显示）
+# 安装了 numpy 时投影和每一段的距离计算都对整段数组向量化执行，否则退回纯 Python 实现，结果相同。
+# 长轨迹由 TrackAccumulator 逐行累积：经纬度和上报时刻存入紧凑的 array，属性变化在累积时即转为锚点标记，
+# 每个点约 25 字节，不保留每行的字典。
+
+import math
+from array import array
+from typing import List, Optional, Sequence
+
+from config import get_config
+
+try:
+    import numpy
+except ImportError:     # 可选依赖，未安装时使用纯 Python 实现
+    numpy = None
+
+config = get_config()
+
+# 抽稀配置
+DEFAULT_SIMPLIFY_PIXELS = config.get('function_config.track_simplify_pixels', 2.0)     # 按缩放级别抽稀时，允许的偏差（屏幕像素）
+
+EARTH_RADIUS = 6378137.0    # 米
+MIN_ZOOM = 3
+MAX_ZOOM = 19
+
+
+def zoom_to_tolerance(zoom: float, pixels: float = DEFAULT_SIMPLIFY_PIXELS) -> float:
+    """百度地图缩放级别对应的容差（米）：该级别下每像素约 2^(18-zoom) 米；zoom 不是有限数时抛出 ValueError"""
+    if not math.isfinite(zoom):
+        raise ValueError(f"缩放级别必须是有限的数字: {zoom}")
+    zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+    return pixels * 2.0 ** (18 - zoom)
+
+
+def simplify(longs: Sequence[Optional[float]], lats: Sequence[Optional[float]], attributes: Sequence[Sequence],
+             tolerance: float) -> List[int]:
+    """
+    Douglas–Peucker 抽稀，返回保留的点的下标（升序）。
+    attributes 为若干列（如 bts_name、pci、system_stat），任一列在相邻两点间变化时两点都保留；首尾两点始终保留。
+    """
+    accumulator = TrackAccumulator()
+    for i in range(len(longs)):
+        accumulator.add(0, longs[i], lats[i], tuple(column[i] for column in attributes))
+    return simplify_anchored(accumulator.longs, accumulator.lats, accumulator.anchors, tolerance)
+
+
+def simplify_anchored(longs: Sequence[float], lats: Sequence[float], anchors: bytearray, tolerance: float) -> List[int]:
+    """
+    Douglas–Peucker 抽稀，返回保留的点的下标（升序）。
+    经纬度缺失时为 nan；anchors 中非零的点（属性变化点、缺少经纬度的点）始终保留，首尾两点也始终保留。
+    """
+    count = len(longs)
+    if count <= 2 or tolerance <= 0:
+        return list(range(count))
+    if numpy is not None:
+        return _simplify_numpy(longs, lats, anchors, tolerance)
+    return _simplify_python(longs, lats, anchors, tolerance)
+
+
+class TrackAccumulator:
+    """
+    逐点累积轨迹，供 simplify_anchored 使用
+    - longs / lats：array('d')，缺少经纬度时为 nan
+    - stamps：array('q')，调用方给出的整数时间戳（如 reported_at 的微秒数），用于第二遍按时间戳取回保留的点
+    - anchors：bytearray，属性与前一点不同的点及其前一点、缺少经纬度的点为 1
+    """
+
+    def __init__(self):
+        self.longs = array('d')
+        self.lats = array('d')
+        self.stamps = array('q')
+        self.anchors = bytearray()
+        self._last_attributes = None
+
+    def __len__(self):
+        return len(self.longs)
+
+    def add(self, stamp: int, long: Optional[float], lat: Optional[float], attributes: tuple):
+        missing = long is None or lat is None
+        self.longs.append(math.nan if missing else long)
+        self.lats.append(math.nan if missing else lat)
+        self.stamps.append(stamp)
+        self.anchors.append(1 if missing else 0)
+        if self._last_attributes is not None and attributes != self._last_attributes:
+            self.anchors[-2] = 1
+            self.anchors[-1] = 1
+        self._last_attributes = attributes
+
+
+# -----------------------------------------------------------------------------
+# numpy 实现
+# -----------------------------------------------------------------------------
+
+def _simplify_numpy(longs, lats, anchor_flags, tolerance) -> List[int]:
+    long_array = numpy.asarray(longs, dtype=float)   # array('d') 不复制
+    lat_array = numpy.asarray(lats, dtype=float)
+    missing = numpy.isnan(long_array) | numpy.isnan(lat_array)
+
+    # 锚点：首尾、缺少经纬度的点、属性变化前后的点
+    anchors = numpy.frombuffer(bytes(anchor_flags), dtype=numpy.uint8).astype(bool) | missing
+    anchors[0] = anchors[-1] = True
+
+    # 等距圆柱投影为平面米坐标，缺少经纬度的点不参与计算（它们都是锚点）
+    lat0 = numpy.radians(numpy.nanmean(lat_array)) if not missing.all() else 0.0
+    x = numpy.where(missing, 0.0, numpy.radians(long_array) * EARTH_RADIUS * math.cos(lat0))
+    y = numpy.where(missing, 0.0, numpy.radians(lat_array) * EARTH_RADIUS)
+
+    keep = anchors.copy()
+    anchor_indices = numpy.flatnonzero(anchors)
+    stack = [(int(start), int(end)) for start, end in zip(anchor_indices[:-1], anchor_indices[1:]) if end - start > 1]
+    while stack:
+        start, end = stack.pop()
+        xs, ys = x[start], y[start]
+        dx, dy = x[end] - xs, y[end] - ys
+        px, py = x[start + 1:end] - xs, y[start + 1:end] - ys
+        length2 = dx * dx + dy * dy
+        if length2 > 0:
+            # 点到线段（而不是直线）的距离：船舶掉头、原地漂移时不会丢掉线段之外的点
+            t = numpy.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+            px = px - t * dx
+            py = py - t * dy
+        distances = numpy.hypot(px, py)
+        index = int(distances.argmax())
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            if middle - start > 1:
+                stack.append((start, middle))
+            if end - middle > 1:
+                stack.append((middle, end))
+    return numpy.flatnonzero(keep).tolist()
+
+
+# -----------------------------------------------------------------------------
+# 纯 Python 实现
+# -----------------------------------------------------------------------------
+
+def _simplify_python(longs, lats, anchor_flags, tolerance) -> List[int]:
+    count = len(longs)
+    missing = [math.isnan(longs[i]) or math.isnan(lats[i]) for i in range(count)]
+
+    anchors = [bool(flag) or skip for flag, skip in zip(anchor_flags, missing)]
+    anchors[0] = anchors[-1] = True
+
+    valid_lats = [lat for lat, skip in zip(lats, missing) if not skip]
+    lat0 = math.radians(sum(valid_lats) / len(valid_lats)) if valid_lats else 0.0
+    scale_x = EARTH_RADIUS * math.cos(lat0)
+    x = [0.0 if skip else math.radians(long) * scale_x for long, skip in zip(longs, missing)]
+    y = [0.0 if skip else math.radians(lat) * EARTH_RADIUS for lat, skip in zip(lats, missing)]
+
+    keep = list(anchors)
+    anchor_indices = [i for i in range(count) if anchors[i]]
+    stack = [(start, end) for start, end in zip(anchor_indices[:-1], anchor_indices[1:]) if end - start > 1]
+    while stack:
+        start, end = stack.pop()
+        xs, ys = x[start], y[start]
+        dx, dy = x[end] - xs, y[end] - ys
+        length2 = dx * dx + dy * dy
+        best_index, best_distance = start + 1, -1.0
+        for i in range(start + 1, end):
+            px, py = x[i] - xs, y[i] - ys
+            if length2 > 0:
+                t = min(max((px * dx + py * dy) / length2, 0.0), 1.0)
+                px -= t * dx
+                py -= t * dy
+            distance = math.hypot(px, py)
+            if distance > best_distance:
+                best_index, best_distance = i, distance
+        if best_distance > tolerance:
+            keep[best_index] = True
+            if best_index - start > 1:
+                stack.append((start, best_index))
+            if end - best_index > 1:
+                stack.append((best_index, end))
+    return [i for i in range(count) if keep[i]]
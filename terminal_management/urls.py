@@ -35,6 +35,7 @@ urlpatterns = [
     # --- 端站数据与状态 ---
     path('antenna/', views.antenna, name='antenna'),
     path('stationimport/', views.stationimport, name='stationimport'),
+    path('api/get_nearby_base_stations/', views.get_nearby_base_stations, name='get_nearby_base_stations'),
 
     # --- 端站系统管理 ---
     path('systemmanage/', views.systemmanage, name='systemmanage'),
@@ -42,6 +43,7 @@ urlpatterns = [
     # --- GIS ---
     path('gis/', views.gis_page, name='gis_page'),
     path('api/get_track/', views.get_ship_track, name='get_ship_track'),
+    path('api/get_metric_trend/', views.get_metric_trend, name='get_metric_trend'),
     
     # --- 服务器升级文件列表 ---
     path('api/get_server_upgrade_files/', views.get_server_upgrade_files, name='get_server_upgrade_files'),
@@ -4,12 +4,15 @@ from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required
-from . import services
+from . import services, track_simplify
 from .forms import ShipInfoForm
 from .forms import TerminalInfoForm
 from .forms import BaseStationInfoForm
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from datetime import datetime
+import math
 import os
 import glob
 from pathlib import Path
@@ -20,10 +23,14 @@ import os
 # 将项目根目录添加到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from utils import gl_logger, json_codec
 
 # 创建全局Config实例
 config = Config()
 
+# 轨迹接口每次从数据库读取并输出的上报条数
+TRACK_CHUNK_SIZE = config.get('function_config.track_chunk_size', 2000)
+
 def home(request):
     """
     首页的视图函数。
@@ -304,11 +311,12 @@ def base_station_delete(request, bts_id):
 @login_required
 def antenna(request):
     """渲染端站数据与状态页面"""
-    success, terminals_or_error = services.get_all_terminals()
+    # 端站列表来自进程内注册表，已按船名和SN排序
+    success, terminals_or_error = services.get_terminals_with_ship_info()
 
     terminals_list = []
     if success:
-        terminals_list = terminals_or_error.select_related('ship').order_by('ship__ship_name', 'sn')
+        terminals_list = terminals_or_error
 
     context = {
         'terminals': terminals_list,
@@ -321,11 +329,12 @@ def antenna(request):
 @login_required
 def systemmanage(request):
     """渲染端站系统管理页面"""
-    success, terminals_or_error = services.get_all_terminals()
+    # 端站列表来自进程内注册表，已按船名和SN排序
+    success, terminals_or_error = services.get_terminals_with_ship_info()
 
     terminals_list = []
     if success:
-        terminals_list = terminals_or_error.select_related('ship').order_by('ship__ship_name', 'sn')
+        terminals_list = terminals_or_error
 
     # 从配置文件中获取chunk_size
     chunk_size = config.get('function_config.chunk_size', 1024)  # 默认1KB
@@ -341,14 +350,12 @@ def systemmanage(request):
 @login_required
 def gis_page(request):
     # 1. 查询所有端站 (TerminalInfo) 而不是船舶 (ShipInfo)
-    success, terminals_or_error = services.get_all_terminals()
+    success, terminals_or_error = services.get_terminals_with_ship_info()
 
     terminals_list = []
     if success:
-        # 2. 按照“船名”和“SN号”排序，确保同一艘船的端站相邻
-        #    我们使用 'ship__ship_name' 来访问外键关联的 ShipInfo 模型的 ship_name 字段
-        # terminals_list = terminals_or_error.order_by('ship__ship_name', 'sn')
-        terminals_list = terminals_or_error.select_related('ship').order_by('ship__ship_name', 'sn')
+        # 2. 端站列表来自进程内注册表，已按“船名”和“SN号”排序，确保同一艘船的端站相邻
+        terminals_list = terminals_or_error
 
     context = {
         # 3. 关键：我们仍然使用 'ships' 作为模板上下文的变量名。
@@ -432,9 +439,19 @@ def stationimport(request):
     }
     return render(request, 'stationimport.html', context)
 
+# 轨迹接口输出的字段
+TRACK_FIELDS = (
+    'sn', 'report_date', 'report_time', 'long', 'lat', 'yaw', 'bts_name', 'standard', 'pci', 'rsrp', 'sinr', 'rssi'
+)
+
 @login_required
 def get_ship_track(request):
-    """获取指定【端站】在特定时间范围内的轨迹点数据API"""
+    """
+    获取指定【端站】在特定时间范围内的轨迹点数据API
+    返回按上报时间倒序排列的JSON数组。多天的轨迹可能有数十万个点，
+    因此按块从数据库读取、逐块序列化并流式输出，内存占用与时间范围无关。
+    带 tolerance / zoom 参数时只返回抽稀后的点（见 track_simplify）。
+    """
     
     # 1. 接收 'sn' 而不是 'mmsi'
     sn = request.GET.get('sn')
@@ -451,8 +468,24 @@ def get_ship_track(request):
     except ValueError:
         return JsonResponse({'error': '时间格式无效，请使用ISO 8601格式'}, status=400)
 
-    # 步骤 1: 首先获取端站信息
-    term_success, term_or_error = services.get_terminal_by_sn(sn)
+    # 可选参数：tolerance=容差（米）或 zoom=地图缩放级别，带其中之一时返回抽稀后的轨迹
+    # float() 接受 nan / inf 和负数：nan、inf 会只剩首尾两点，负数等于不抽稀，都按参数错误处理
+    tolerance_str = request.GET.get('tolerance')
+    zoom_str = request.GET.get('zoom')
+    try:
+        if tolerance_str:
+            tolerance = float(tolerance_str)
+        elif zoom_str:
+            tolerance = track_simplify.zoom_to_tolerance(float(zoom_str))
+        else:
+            tolerance = None
+        if tolerance is not None and not (math.isfinite(tolerance) and tolerance > 0):
+            raise ValueError(tolerance)
+    except ValueError:
+        return JsonResponse({'error': 'tolerance 和 zoom 参数必须是有限的数字，且 tolerance 必须大于0'}, status=400)
+
+    # 步骤 1: 首先获取端站信息（进程内注册表，不访问数据库）
+    term_success, term_or_error = services.get_cached_terminal_by_sn(sn)
     if not term_success:
         return JsonResponse({'error': str(term_or_error)}, status=404)
     
@@ -460,27 +493,136 @@ def get_ship_track(request):
     terminal = term_or_error
     ship = terminal.ship 
 
-    # 步骤 2: 调用您提供的、现在位于 services.py 中的新函数
-    success, reports_or_error = services.get_reports_by_sn_and_time(sn, start_time, end_time)
-    
+    # 步骤 2: 先读取第一块，查询出错时仍可返回 500；开始输出后无法再修改状态码
+    chunks = services.iter_track_chunks(sn, start_time, end_time, TRACK_FIELDS, TRACK_CHUNK_SIZE, tolerance)
+    try:
+        first_chunk = next(chunks, None)
+    except Exception as e:
+        return JsonResponse({'error': f"根据sn和时间查询轨迹数据时发生错误: {e}"}, status=500)
+
+    # 步骤 3: 逐块序列化，附加船舶信息并格式化时间
+    ship_fields = {'ship_name': ship.ship_name, 'mmsi': ship.mmsi, 'ship_owner': ship.ship_owner}
+
+    def serialize(chunk):
+        rows = []
+        for report in chunk:
+            row = {field: report[field] for field in TRACK_FIELDS}
+            row['report_date'] = row['report_date'].isoformat()
+            row['report_time'] = row['report_time'].isoformat()
+            row.update(ship_fields)
+            rows.append(row)
+        # 去掉数组的方括号，块之间用逗号连接
+        return json_codec.dumps_bytes(rows)[1:-1]
+
+    def stream():
+        yield b'['
+        if first_chunk is not None:
+            yield serialize(first_chunk)
+            try:
+                for chunk in chunks:
+                    yield b',' + serialize(chunk)
+            except Exception as e:
+                # 响应已经开始输出，只能记录错误并截断（客户端会得到不完整的JSON）
+                gl_logger.error(f"流式输出端站 {sn} 的轨迹时发生错误: {e}")
+                return
+        yield b']'
+
+    content = stream()
+    if isinstance(request, ASGIRequest):
+        # ASGI 下同步迭代器会被整个读入内存后才发送，改为异步迭代器，每块在线程中读取
+        content = _iterate_in_thread(content)
+    return StreamingHttpResponse(content, content_type='application/json')
+
+async def _iterate_in_thread(iterator):
+    """把同步迭代器包装为异步迭代器，每次取值在线程中执行（与同步视图使用同一个数据库连接线程）"""
+    next_part = sync_to_async(next)
+    while True:
+        part = await next_part(iterator, None)
+        if part is None:
+            return
+        yield part
+
+def _base_station_dict(station, distance=None):
+    data = {
+        'bts_id': station.bts_id,
+        'bts_name': station.bts_name,
+        'region_code': station.region_code,
+        'coverage_distance': station.coverage_distance,
+        'longitude': station.longitude,
+        'latitude': station.latitude,
+    }
+    if distance is not None:
+        data['distance_km'] = round(distance, 3)
+    return data
+
+@login_required
+def get_nearby_base_stations(request):
+    """
+    基站空间查询API（进程内空间索引，不访问基站表）
+    - bbox=最小经度,最小纬度,最大经度,最大纬度：返回范围内的基站
+    - 否则按 sn（端站最新位置）或 long、lat 指定位置，返回覆盖该位置的基站和最近的 k 个基站（默认5个）
+    """
+    bbox_str = request.GET.get('bbox')
+    if bbox_str:
+        try:
+            min_long, min_lat, max_long, max_lat = (float(value) for value in bbox_str.split(','))
+        except ValueError:
+            return JsonResponse({'error': 'bbox 参数格式应为 最小经度,最小纬度,最大经度,最大纬度'}, status=400)
+        success, stations_or_error = services.get_base_stations_in_bbox(min_long, min_lat, max_long, max_lat)
+        if not success:
+            return JsonResponse({'error': stations_or_error}, status=500)
+        return JsonResponse({'stations': [_base_station_dict(station) for station in stations_or_error]})
+
+    sn = request.GET.get('sn')
+    try:
+        k = int(request.GET.get('k', 5))
+        if sn:
+            success, position_or_error = services.get_latest_position_by_sn(sn)
+            if not success:
+                return JsonResponse({'error': position_or_error}, status=404)
+            long, lat = position_or_error
+        else:
+            long, lat = float(request.GET['long']), float(request.GET['lat'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': '缺少必要的参数(sn 或 long、lat)，或参数不是数字'}, status=400)
+
+    success, covering_or_error = services.get_covering_base_stations(long, lat)
+    if not success:
+        return JsonResponse({'error': covering_or_error}, status=500)
+    success, nearest_or_error = services.get_nearest_base_stations(long, lat, k)
+    if not success:
+        return JsonResponse({'error': nearest_or_error}, status=500)
+    return JsonResponse({
+        'long': long,
+        'lat': lat,
+        'covering': [_base_station_dict(station, distance) for station, distance in covering_or_error],
+        'nearest': [_base_station_dict(station, distance) for station, distance in nearest_or_error],
+    })
+
+@login_required
+def get_metric_trend(request):
+    """获取指定端站在特定时间范围内的信号与链路指标趋势（汇总数据）API"""
+    sn = request.GET.get('sn')
+    start_time_str = request.GET.get('start_time')
+    end_time_str = request.GET.get('end_time')
+    if not all([sn, start_time_str, end_time_str]):
+        return JsonResponse({'error': '缺少必要的参数(sn, start_time, end_time)'}, status=400)
+
+    try:
+        start_time = datetime.fromisoformat(start_time_str)
+        end_time = datetime.fromisoformat(end_time_str)
+    except ValueError:
+        return JsonResponse({'error': '时间格式无效，请使用ISO 8601格式'}, status=400)
+
+    # 可选参数：metrics=rsrp,sinr（默认全部）；granularity=minute/hour/day（默认按时间跨度自动选择）
+    metrics_str = request.GET.get('metrics')
+    metrics = [metric.strip() for metric in metrics_str.split(',') if metric.strip()] if metrics_str else None
+    granularity = request.GET.get('granularity') or None
+
+    success, trend_or_error = services.get_metric_trend(sn, start_time, end_time, metrics, granularity)
     if not success:
-        return JsonResponse({'error': str(reports_or_error)}, status=500)
-
-    # 步骤 3: 序列化数据 (与之前相同)
-    track_data = list(reports_or_error.values(
-        'sn', 'report_date', 'report_time', 'long', 'lat', 'yaw', 'bts_name', 'standard', 'pci', 'rsrp', 'sinr', 'rssi'
-    ))
-
-    # 步骤 4: 手动附加船舶信息并格式化时间
-    for report in track_data:
-        report['report_date'] = report['report_date'].isoformat()
-        report['report_time'] = report['report_time'].isoformat()
-        # 将从步骤1获取的船舶信息附加到每条记录中
-        report['ship_name'] = ship.ship_name
-        report['mmsi'] = ship.mmsi
-        report['ship_owner'] = ship.ship_owner
-
-    return JsonResponse(track_data, safe=False)
+        return JsonResponse({'error': str(trend_or_error)}, status=400)
+    return JsonResponse(trend_or_error)
 
 # 添加获取服务器升级文件列表的API端点
 @login_required
@@ -8,6 +8,7 @@ QUIC客户端测试脚本
 import asyncio
 import json
 import logging
+import sys
 import uuid
 from typing import Dict, Any
 
@@ -17,6 +18,10 @@ from aioquic.quic.configuration import QuicConfiguration
 from aioquic.quic.events import StreamDataReceived, ConnectionTerminated
 from aioquic.asyncio.protocol import QuicConnectionProtocol
 
+# 项目内部
+from acu.stream_framing import StreamFrameDecoder, encode_frame, FRAMING_LENGTH_PREFIX
+from acu import compact_codec
+
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -25,14 +30,20 @@ logger = logging.getLogger(__name__)
 TEST_SERVER_HOST = "192.168.3.28"
 TEST_SERVER_PORT = 39999
 TEST_SN = "sn111111"
+TEST_BINARY = "--binary" in sys.argv  # 使用紧凑二进制编码（MessagePack + 整数键）的ALPN
+JSON_ALPN_PROTOCOL = "comdi-nm-protocol"
+UPLINK_STREAM_ID = 0    # 上报、心跳、应答都在这条长期不关闭的流上按换行分帧发送
 
 class QUICTestClient:
     """QUIC测试客户端"""
     
-    def __init__(self, server_host=TEST_SERVER_HOST, server_port=TEST_SERVER_PORT, sn=TEST_SN):
+    def __init__(self, server_host=TEST_SERVER_HOST, server_port=TEST_SERVER_PORT, sn=TEST_SN, binary=TEST_BINARY):
         self.server_host = server_host
         self.server_port = server_port
         self.sn = sn
+        self.binary = binary
+        self.bytes_sent = 0     # 已发送的消息字节数（含分帧），用于对比JSON与二进制编码
+        self.messages_sent = 0
         self.client_id = None
         self.connection = None
         self.transport = None
@@ -41,7 +52,7 @@ class QUICTestClient:
         # QUIC配置
         self.configuration = QuicConfiguration(
             is_client=True,
-            alpn_protocols=["comdi-nm-protocol"],
+            alpn_protocols=[compact_codec.DEFAULT_BINARY_ALPN_PROTOCOL if binary else JSON_ALPN_PROTOCOL],
             idle_timeout=200.0,  # 调整为200秒，与服务器保持一致
         )
         
@@ -138,10 +149,8 @@ class QUICTestClient:
             }
             
             logger.info(f"📤 发送上报数据建立SN映射: {self.sn}")
-            # 直接发送JSON数据，不关闭流以允许后续心跳
-            data = json.dumps(report_data).encode('utf-8')
-            self.connection._quic.send_stream_data(0, data, end_stream=False)
-            self.connection.transmit()
+            # 换行分帧发送，不关闭流以允许后续心跳
+            self.connection.send_framed(report_data)
             
         except Exception as e:
             logger.error(f"❌ 发送上报数据失败: {e}")
@@ -174,9 +183,7 @@ class QUICTestClient:
             }
             
             logger.info(f"💓 发送心跳包")
-            data = json.dumps(heartbeat_data).encode('utf-8')
-            self.connection._quic.send_stream_data(0, data, end_stream=False)
-            self.connection.transmit()
+            self.connection.send_framed(heartbeat_data)
             
         except Exception as e:
             logger.error(f"❌ 发送心跳包失败: {e}")
@@ -206,75 +213,107 @@ class TestClientProtocol(QuicConnectionProtocol):
     def __init__(self, client: QUICTestClient, quic=None, *args, **kwargs):
         self.client = client
         self.pending_requests = {}  # 跟踪客户端的请求
+        self._stream_decoders = {}  # 服务器下发的指令可能分多次到达：{stream_id: StreamFrameDecoder}
         super().__init__(quic=quic, *args, **kwargs)
         
     def quic_event_received(self, event):
         """处理QUIC事件"""
         if isinstance(event, StreamDataReceived):
+            decoder = self._stream_decoders.get(event.stream_id)
+            if decoder is None:
+                decoder = self._stream_decoders[event.stream_id] = StreamFrameDecoder(
+                    framing=FRAMING_LENGTH_PREFIX if self.client.binary else None
+                )
             try:
-                msg_str = event.data.decode('utf-8')
-                msg = json.loads(msg_str)
-                logger.info(f"📥 收到服务器消息: {msg}")
+                frames = decoder.feed(event.data, event.end_stream)
+            except ValueError as e:
+                logger.error(f"分帧错误: {e}")
+                frames = []
+            if event.end_stream:
+                self._stream_decoders.pop(event.stream_id, None)
+            for frame in frames:
+                self.handle_message(frame)
                 
-                # 检查是否为控制指令（包含request_id）
-                request_id = msg.get('request_id')
-                op = msg.get('op')
-                op_sub = msg.get('op_sub')
-                if request_id:
-                    if op == 'query' and op_sub == 'equipment_status':
-                        # 回复状态查询指令
-                        reply_msg = {
-                            "sn": self.client.sn,
-                            "op":"query_ans",
-                            "op_sub":"equipment_status",
-                            "request_id":request_id,
-                            "IMU_stat":0,
-                            "DGPS_stat":0,
-                            "storage_stat":0,
-                            "yaw_moto_stat":0,
-                            "pitch_moto_stat":0,
-                            "yaw_lim_stat":0,
-                            "pitch_lim_stat":0
-                        }
-                        self.send_reply(reply_msg)
-                        logger.info(f"📤 回复状态查询指令: {reply_msg}")
-                    else:
-                        # 其他查询指令，默认回复成功
-                        reply_msg = {
-                            "sn": self.client.sn,
-                            "op":"ans",
-                            "op_sub":op_sub,
-                            "status": "success",
-                            "message": f"成功收到查询指令：{json.dumps(msg, ensure_ascii=False)}"
-                        }
-                        self.send_reply(reply_msg)
+        elif isinstance(event, ConnectionTerminated):
+            logger.info(f"🔌 服务器断开连接: {event.reason_phrase}")
+            self.client.running = False
+
+    def handle_message(self, data: bytes):
+        """处理服务器下发的一条完整消息"""
+        try:
+            if self.client.binary:
+                msg = compact_codec.decode(data)
+            else:
+                msg = json.loads(data.decode('utf-8'))
+            logger.info(f"📥 收到服务器消息: {msg}")
+            
+            # 检查是否为控制指令（包含request_id）
+            request_id = msg.get('request_id')
+            op = msg.get('op')
+            op_sub = msg.get('op_sub')
+            if request_id:
+                if op == 'query' and op_sub == 'equipment_status':
+                    # 回复状态查询指令
+                    reply_msg = {
+                        "sn": self.client.sn,
+                        "op":"query_ans",
+                        "op_sub":"equipment_status",
+                        "request_id":request_id,
+                        "IMU_stat":0,
+                        "DGPS_stat":0,
+                        "storage_stat":0,
+                        "yaw_moto_stat":0,
+                        "pitch_moto_stat":0,
+                        "yaw_lim_stat":0,
+                        "pitch_lim_stat":0
+                    }
+                    self.send_reply(reply_msg)
+                    logger.info(f"📤 回复状态查询指令: {reply_msg}")
                 else:
-                    # 普通消息，直接回复确认
+                    # 其他查询指令，默认回复成功
                     reply_msg = {
-                        "type": "response",
                         "sn": self.client.sn,
+                        "op":"ans",
+                        "op_sub":op_sub,
                         "status": "success",
-                        "message": f"成功收到消息：{json.dumps(msg, ensure_ascii=False)}"
+                        "message": f"成功收到查询指令：{json.dumps(msg, ensure_ascii=False)}"
                     }
-                    
-                    logger.info(f"📤 回复普通消息: {reply_msg}")
                     self.send_reply(reply_msg)
+            else:
+                # 普通消息，直接回复确认
+                reply_msg = {
+                    "type": "response",
+                    "sn": self.client.sn,
+                    "status": "success",
+                    "message": f"成功收到消息：{json.dumps(msg, ensure_ascii=False)}"
+                }
                 
-            except json.JSONDecodeError:
-                logger.error(f"收到非JSON数据: {event.data}")
-            except Exception as e:
-                logger.error(f"处理消息异常: {e}")
-                
-        elif isinstance(event, ConnectionTerminated):
-            logger.info(f"🔌 服务器断开连接: {event.reason_phrase}")
-            self.client.running = False
+                logger.info(f"📤 回复普通消息: {reply_msg}")
+                self.send_reply(reply_msg)
+            
+        except ValueError:
+            logger.error(f"收到无法解析的数据: {data}")
+        except Exception as e:
+            logger.error(f"处理消息异常: {e}")
+
+    def send_framed(self, msg_dict):
+        """在上行流上分帧发送一条消息，不关闭流：JSON按换行分帧，二进制编码按长度前缀分帧"""
+        if self.client.binary:
+            data = encode_frame(compact_codec.encode(msg_dict), FRAMING_LENGTH_PREFIX)
+        else:
+            data = encode_frame(json.dumps(msg_dict).encode('utf-8'))
+        self._quic.send_stream_data(UPLINK_STREAM_ID, data, end_stream=False)
+        self.transmit()
+        self.client.bytes_sent += len(data)
+        self.client.messages_sent += 1
+        logger.info(f"📦 本条 {len(data)} 字节，累计 {self.client.messages_sent} 条 / {self.client.bytes_sent} 字节"
+                    f" ({'二进制' if self.client.binary else 'JSON'})")
     
     def send_reply(self, msg_dict):
         """发送回复消息"""
         try:
-            data = json.dumps(msg_dict).encode('utf-8')
-            self._quic.send_stream_data(0, data, end_stream=True)
-            self.transmit()
+            # 与上报、心跳共用上行流，不能关闭流，否则之后的心跳无法再发送
+            self.send_framed(msg_dict)
             logger.info(f"📤 已发送回复到服务器")
         except Exception as e:
             logger.error(f"❌ 发送回复失败: {e}")
@@ -282,7 +321,7 @@ class TestClientProtocol(QuicConnectionProtocol):
 
 async def main():
     """主函数"""
-    client = QUICTestClient(TEST_SERVER_HOST, TEST_SERVER_PORT, TEST_SN)
+    client = QUICTestClient(TEST_SERVER_HOST, TEST_SERVER_PORT, TEST_SN, TEST_BINARY)
     
     try:
         # 启动客户端
@@ -305,6 +344,7 @@ if __name__ == "__main__":
     print("🚀 启动QUIC测试客户端")
     print(f"📱 SN: {TEST_SN}")
     print(f"🌐 服务器: {TEST_SERVER_HOST}:{TEST_SERVER_PORT}")
+    print(f"🧩 编码: {'MessagePack (' + compact_codec.DEFAULT_BINARY_ALPN_PROTOCOL + ')' if TEST_BINARY else 'JSON'}")
     print("=" * 50)
     
     try:
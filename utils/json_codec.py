@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# 统一的JSON编解码
+# NM服务（UDP/QUIC）、Redis指令总线、WebSocket推送都通过本模块编解码JSON。
+# 安装了 orjson 时使用 orjson，否则退回标准库 json；可通过配置 codec_config.json_backend 强制指定。
+# 端站上报的原始数据先按UTF-8解析，失败时再按GBK解码（兼容旧版端站）。
+
+import json
+from typing import Any, Union
+
+from config import get_config
+
+config = get_config()
+
+# 编解码配置："auto"（有 orjson 时使用 orjson）/ "orjson" / "json"
+DEFAULT_JSON_BACKEND = config.get('codec_config.json_backend', "auto")
+
+try:
+    import orjson
+except ImportError:     # 可选依赖
+    orjson = None
+
+if DEFAULT_JSON_BACKEND == "json" or orjson is None:
+    BACKEND = "json"
+else:
+    BACKEND = "orjson"
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两种后端都可以用它捕获解析错误
+JSONDecodeError = json.JSONDecodeError
+
+# 端站旧版固件使用的备用编码
+LEGACY_ENCODING = 'gbk'
+
+
+if BACKEND == "orjson":
+    _orjson_dumps = orjson.dumps
+    _orjson_loads = orjson.loads
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8字节串；orjson 不支持的类型（如超过64位的整数）退回标准库"""
+        try:
+            return _orjson_dumps(obj)
+        except TypeError:
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(obj: Any) -> str:
+        """编码为字符串（WebSocket文本帧、Redis发布、Channel Layer消息）"""
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """解析字符串或UTF-8字节串"""
+        return _orjson_loads(data)
+
+else:
+    _json_loads = json.loads
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(obj: Any) -> str:
+        """编码为字符串（WebSocket文本帧、Redis发布、Channel Layer消息）"""
+        return _encoder.encode(obj)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """编码为紧凑的UTF-8字节串"""
+        return _encoder.encode(obj).encode('utf-8')
+
+    def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+        """解析字符串或UTF-8字节串"""
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return _json_loads(data)
+
+
+def decode_terminal_message(raw_data: Union[bytes, bytearray, memoryview]) -> Any:
+    """
+    解析端站发来的原始数据：先按UTF-8解析，失败时再按GBK解码后解析。
+    两种编码都无法解析时抛出 ValueError（JSONDecodeError / UnicodeDecodeError 均为其子类）。
+    """
+    try:
+        return loads(raw_data)
+    except ValueError:
+        # orjson 遇到非UTF-8字节时同样抛出 JSONDecodeError，统一按GBK重试
+        return loads(bytes(raw_data).decode(LEGACY_ENCODING))
+
+
+# 下发给端站的消息使用标准库默认格式（", " / ": " 分隔符，ensure_ascii），与改用本模块前逐字节相同
+_terminal_encoder = json.JSONEncoder()
+
+
+def encode_terminal_message(obj: Any) -> bytes:
+    """
+    编码下发给端站的消息。
+    与改用本模块前的下发格式逐字节一致（json.dumps 的默认参数）：分隔符带空格，非ASCII字符转义为 \\uXXXX，
+    避免按GBK解析的旧版端站收到乱码，也不依赖端站固件对紧凑格式的解析。下发的只有控制指令，不走 orjson。
+    """
+    return _terminal_encoder.encode(obj).encode('ascii')